@@ -0,0 +1,226 @@
+import argparse
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from GraphGenerator import run_random_graph, spring_positions, generate_road_network, ROAD_FAMILIES
+from RoadImporter import import_road_network, FILE_FORMATS
+from MapSnapshot import save_map
+from ResultsStore import ResultsStore
+from TickProfiler import TickProfiler, TRACE_FILE
+from NavigationLogics import NavigationLogics, RESULTS_FILE, QLEARNING_TRAINING_FILE, DEFAULT_AGENT_TYPES, \
+    add_rows_to_csv
+
+# an episode that didn't reach the destination after this many ticks per node is stopped
+MAX_TICKS_PER_NODE = 10
+
+
+def run_episode(seed, agent_types=None, agent_enum=0, graph=None, hooks=None, qlearning_options=None):
+    """
+    Run one simulation without the gui: step NavigationLogics.update until the car gets to the destination.
+
+    :param seed: Seed of the episode, both the graph and the traffic are drawn from it.
+    :param agent_types: The agents to run and record, defaults to DEFAULT_AGENT_TYPES.
+    :param agent_enum: Index in agent_types of the agent that drives the car.
+    :param graph: (nodes, edges, src_node, dest_node, nodes_positions[, speed_classes[, speed_limits, road_lengths]])
+                  to run on (the speed limits and lengths of an imported map), or the path of a map snapshot (see
+                  MapSnapshot.save_map), a random graph if None.
+    :param hooks: TickHooks of the ticks (see NavigationLogics), e.g. a TickProfiler.
+    :param qlearning_options: QLearningAgent keyword arguments of the Q-learning agents (see NavigationLogics).
+    :return: Dictionary with the results records (see NavigationLogics.get_results_records), the Q-learning
+             training row and the episode info.
+    """
+    np.random.seed(seed)
+    random.seed(seed)
+    logics = create_logics(graph, agent_enum=agent_enum, agent_types=agent_types, hooks=hooks,
+                           qlearning_options=qlearning_options)
+    dest = logics.dest_node
+    num_of_nodes = len(logics.nodes)
+    ticks = 0
+    max_ticks = MAX_TICKS_PER_NODE * max(num_of_nodes, 1)
+    while logics.current_node != dest and ticks < max_ticks:
+        logics.update()
+        ticks += 1
+        if logics.current_d_path is None:
+            break  # no path to the destination
+
+    return {'seed': seed, 'num_of_nodes': num_of_nodes, 'ticks': ticks, 'arrived': logics.current_node == dest,
+            'records': logics.get_results_records(seed=seed, ticks=ticks),
+            'qlearning_row': logics.get_qlearning_training_row()}
+
+
+def create_logics(graph, **kwargs):
+    """
+    The NavigationLogics of a map, without recording results.
+
+    :param graph: The map (see run_episode), a random graph if None.
+    :param kwargs: The other NavigationLogics arguments.
+    """
+    if isinstance(graph, str):
+        # every worker maps the snapshot itself, they all share its pages
+        return NavigationLogics.from_snapshot(graph, record_results=False, **kwargs)
+    if graph is None:
+        nodes, edges, src, dest = run_random_graph()
+        positions = spring_positions(nodes, edges)
+        speed_classes, speed_limits, road_lengths = None, None, None
+    else:
+        nodes, edges, src, dest, positions = graph[:5]
+        speed_classes = graph[5] if len(graph) > 5 else None
+        speed_limits, road_lengths = graph[6:8] if len(graph) > 7 else (None, None)
+    return NavigationLogics(nodes, edges, src, dest, positions, record_results=False,
+                            road_speed_classes=speed_classes, road_speed_limits=speed_limits,
+                            road_lengths=road_lengths, **kwargs)
+
+
+def _run_episodes(args):
+    # worker entry point - runs a chunk of episodes
+    seeds, agent_types, agent_enum, graphs, hooks, qlearning_options = args
+    results = []
+    for i, seed in seeds:
+        graph = graphs[i % len(graphs)] if graphs else None
+        results.append((i, run_episode(seed, agent_types, agent_enum, graph, hooks, qlearning_options)))
+    return results
+
+
+def episode_seeds(num_of_episodes, seed):
+    """
+    Independent seeds for the episodes, derived from one seed, so a batch is reproducible regardless of how the
+    episodes are spread over the workers.
+    """
+    return [int(child.generate_state(1)[0]) for child in np.random.SeedSequence(seed).spawn(num_of_episodes)]
+
+
+def run_batch(num_of_episodes, workers=None, seed=0, agent_types=None, agent_enum=0, graphs=None, chunk_size=16,
+              results_file=RESULTS_FILE, training_file=QLEARNING_TRAINING_FILE, hooks=None,
+              qlearning_options=None):
+    """
+    Run independent episodes over a process pool and merge their results.
+
+    :param num_of_episodes: Number of episodes to run.
+    :param workers: Number of worker processes, defaults to the number of cpus. 1 runs in this process.
+    :param seed: Seed of the batch.
+    :param agent_types: The agents to run and record, defaults to DEFAULT_AGENT_TYPES.
+    :param agent_enum: Index in agent_types of the agent that drives the car.
+    :param graphs: List of maps or map snapshot paths (see run_episode) used round robin by the episodes, random
+                   graphs if None.
+    :param chunk_size: Number of episodes sent to a worker at once.
+    :param results_file: Results database (see ResultsStore) the records of the arrived episodes are added to,
+                         None - don't write.
+    :param training_file: Csv file the Q-learning training rows of the arrived episodes are appended to,
+                          None - don't write.
+    :param hooks: TickHooks of the ticks of all the episodes, e.g. a TickProfiler. The episodes then run in this
+                  process, so the hooks see them all and the workers don't skew each other's timings.
+    :param qlearning_options: QLearningAgent keyword arguments of the Q-learning agents (see NavigationLogics).
+    :return: List of the episodes results (see run_episode), in episode order.
+    """
+    workers = 1 if hooks is not None else workers or os.cpu_count() or 1
+    seeds = list(enumerate(episode_seeds(num_of_episodes, seed)))
+    chunks = [(seeds[i:i + chunk_size], agent_types, agent_enum, graphs, hooks, qlearning_options)
+              for i in range(0, len(seeds), chunk_size)]
+
+    results = [None] * num_of_episodes
+    store = ResultsStore(results_file) if results_file is not None else None
+    try:
+        if workers == 1:
+            _merge_chunks(map(_run_episodes, chunks), results, store)
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                _merge_chunks(executor.map(_run_episodes, chunks), results, store)
+    finally:
+        if store is not None:
+            store.close()
+
+    if training_file is not None:
+        add_rows_to_csv([result['qlearning_row'] for result in results
+                         if result['arrived'] and result['qlearning_row']], training_file)
+    return results
+
+
+def _merge_chunks(chunk_results, results, store):
+    # put the episodes results in episode order, the records are stored as the chunks come in
+    for chunk in chunk_results:
+        for i, result in chunk:
+            results[i] = result
+            if store is not None and result['arrived']:
+                store.add(result['records'])
+
+
+def save_snapshot(file_path, graph, seed):
+    """
+    Save a map snapshot of a map, its edge attributes drawn the way an episode of seed draws them.
+
+    :param graph: The map (see run_episode), a random graph if None.
+    """
+    np.random.seed(seed)
+    random.seed(seed)
+    logics = create_logics(graph, agent_types=[])
+    save_map(file_path, logics)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run many navigation simulations without the gui.')
+    parser.add_argument('-n', type=int, default=1000, help='Number of episodes')
+    parser.add_argument('-w', type=int, default=None, help='Number of worker processes (default: number of cpus)')
+    parser.add_argument('-s', type=int, default=0, help='Seed of the batch')
+    parser.add_argument('-a', type=int, nargs='+', default=DEFAULT_AGENT_TYPES,
+                        help='Agent numbers to run (default: the agents of the gui, 0-5)')
+    parser.add_argument('-g', choices=ROAD_FAMILIES, default=None,
+                        help='Run on a synthetic road network of this family (default: small random graphs)')
+    parser.add_argument('-m', type=int, default=10000, help='Number of nodes of the synthetic road network')
+    parser.add_argument('-f', default=None,
+                        help='Run on a road network imported from this file (OSM csv, GeoJSON or an edge list)')
+    parser.add_argument('--nodes', default=None, help='Nodes csv (id, x / lon, y / lat) of the imported network')
+    parser.add_argument('--format', choices=FILE_FORMATS, default=None,
+                        help='Format of the imported file (default: by the file extension)')
+    parser.add_argument('--snapshot', default=None,
+                        help='Map snapshot file to run on, saved from the chosen map first if it does not exist, '
+                             'so the experiment can be replayed on the same map')
+    parser.add_argument('-o', default=RESULTS_FILE, help='Results database the results are added to')
+    parser.add_argument('--patience', type=int, default=None,
+                        help='Stop the Q-learning training once the greedy path has not changed for this many '
+                             'episodes (default: train all the episodes)')
+    parser.add_argument('--max-steps', type=int, default=None,
+                        help='Cap the Q-learning episodes at this many steps (default: no cap)')
+    parser.add_argument('--profile', nargs='?', const=TRACE_FILE, default=None,
+                        help=f'Time the phases of every tick into this json lines trace (default: {TRACE_FILE}) and '
+                             'print the per phase latencies, the episodes run in this process')
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='With --profile, trace the memory allocations of every tick with tracemalloc')
+    parser.add_argument('--cprofile', default=None,
+                        help='With --profile, dump the cProfile stats of the profiled ticks to this file')
+    parser.add_argument('--profile-every', type=int, default=1,
+                        help='With --cprofile, profile every this many ticks (default: every tick)')
+    args = parser.parse_args()
+
+    start_time = time.time()
+    graphs = None
+    if args.f is not None:
+        graphs = [import_road_network(args.f, nodes_path=args.nodes, file_format=args.format, seed=args.s)]
+    elif args.g is not None:
+        graphs = [generate_road_network(args.g, args.m, seed=args.s)]
+    if args.snapshot is not None:
+        if not os.path.exists(args.snapshot):
+            save_snapshot(args.snapshot, graphs[0] if graphs else None, args.s)
+        graphs = [args.snapshot]
+    qlearning_options = {'patience': args.patience, 'max_steps': args.max_steps}
+    profiler = None
+    if args.profile is not None:
+        profiler = TickProfiler(args.profile, trace_memory=args.trace_memory, profile_file=args.cprofile,
+                                profile_every=args.profile_every)
+    try:
+        results = run_batch(args.n, workers=args.w, seed=args.s, agent_types=args.a, graphs=graphs,
+                            results_file=args.o, hooks=profiler, qlearning_options=qlearning_options)
+    finally:
+        if profiler is not None:
+            profiler.close()
+    arrived = sum(result['arrived'] for result in results)
+    print(f"{len(results)} episodes ({arrived} arrived) in {round(time.time() - start_time, 2)} seconds, "
+          f"results added to {args.o}")
+    if profiler is not None:
+        print(profiler.report())
+        print(f"{profiler.tick} ticks traced to {args.profile}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,233 @@
+import argparse
+import json
+import os
+import platform
+import random
+import time
+import tracemalloc
+import numpy as np
+import scipy
+from agents.agent import AGENT_NAMES, SEARCH_STATS, ASTAR__ZERO_H, ASTAR__AERIAL_DIST_H, ASTAR__DIJKSTRA_H, \
+    ASTAR__COMBINATION_H, ASTAR__NONADMISSIBLE_H, ASTAR__LANDMARK_H, QLEARNING, DSTAR_LITE, CONTRACTION_HIERARCHY, \
+    CSGRAPH_DIJKSTRA
+from agents.HeuristicCache import compute_dijkstra_costs, heuristic_cache
+from agents.Landmarks import clear_landmark_tables
+from agents.ContractionHierarchyAgent import clear_contraction_hierarchies
+from GraphGenerator import generate_road_network, component_endpoints, ROAD_FAMILIES
+from NavigationLogics import NavigationLogics
+
+BENCHMARK_FILE = 'benchmark.json'
+# version of the benchmark file layout
+BENCHMARK_VERSION = 2
+
+# the graph sizes, about this many nodes
+SIZES = {'small': 100, 'medium': 1000, 'large': 10000, 'xlarge': 100000}
+DEFAULT_SIZES = ('small', 'medium', 'large')
+# every search engine: all the A* heuristics, Q-learning and the other agents
+BENCHMARK_AGENTS = (ASTAR__ZERO_H, ASTAR__AERIAL_DIST_H, ASTAR__DIJKSTRA_H, ASTAR__COMBINATION_H,
+                    ASTAR__NONADMISSIBLE_H, ASTAR__LANDMARK_H, QLEARNING, DSTAR_LITE, CONTRACTION_HIERARCHY,
+                    CSGRAPH_DIJKSTRA)
+# Q-learning trains episodes over the whole graph on every query, it's skipped on larger graphs
+QLEARNING_MAX_NODES = 1000
+NUM_OF_QUERIES = 10
+# a time change of more than this fraction is reported by compare_benchmarks
+REGRESSION_THRESHOLD = 0.1
+
+
+def benchmark_graph(family, num_of_nodes, seed):
+    """
+    The NavigationLogics (without agents) of a seeded synthetic road network, its edge attributes drawn from the
+    seed too, so every run of the suite sees the same graphs and costs.
+    """
+    nodes, edges, src, dest, positions, speed_classes = generate_road_network(family, num_of_nodes, seed=seed)
+    np.random.seed(seed)
+    random.seed(seed)
+    return NavigationLogics(nodes, edges, src, dest, positions, agent_types=[], record_results=False,
+                            road_speed_classes=speed_classes)
+
+
+def benchmark_queries(logics, num_of_queries, seed):
+    # seeded (start node, goal node) pairs of the largest connected component
+    graph = logics.graph
+    rng = np.random.default_rng(seed)
+    queries = []
+    for _ in range(num_of_queries):
+        src, dest = component_endpoints(graph.num_nodes, graph.edge_sources, graph.edge_targets, rng)
+        queries.append((graph.nodes[src], graph.nodes[dest]))
+    return queries
+
+
+def run_query(logics, agent_type, start_node, goal_node, edge_costs, trace_memory=False):
+    """
+    Create an agent heading to goal_node and search a path from start_node.
+
+    :return: Dictionary of the setup time (creating the agent, including the heuristic preprocessing), the query
+             time (find_path), the search stats (see agents.agent.SearchStats), the path cost and the peak memory
+             if trace_memory.
+    """
+    if trace_memory:
+        tracemalloc.start()
+    start_time = time.perf_counter()
+    agent = logics.create_agent(agent_type, goal_node)
+    setup_time = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    path = agent.find_path(start_node, edge_costs)
+    query_time = time.perf_counter() - start_time
+    result = {'setup_time': setup_time, 'query_time': query_time, **agent.stats.as_dict(), 'cost': None}
+    if trace_memory:
+        result['peak_memory'] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    if path:
+        edge_index = logics.graph.edge_index
+        result['cost'] = float(sum(edge_costs[edge_index[edge]] for edge in path))
+    return result
+
+
+def clear_preprocessing_caches():
+    # the per graph and per goal preprocessing the agents share: the Dijkstra heuristic tables, the landmark
+    # tables and the contraction hierarchy
+    heuristic_cache.clear()
+    clear_landmark_tables()
+    clear_contraction_hierarchies()
+
+
+def benchmark_agent(logics, agent_type, queries, edge_costs, optimal_costs):
+    """
+    Run the queries with one agent and aggregate them.
+
+    Every query is timed once, on a new agent, as some agents keep state between find_path calls. The peak memory
+    is measured in a second run of the first query, as tracing slows the code it traces. The preprocessing caches
+    are cleared before it, so the peak covers the setup (e.g. building the contraction hierarchy) and the query.
+    """
+    results = [run_query(logics, agent_type, start, goal, edge_costs) for start, goal in queries]
+    start, goal = queries[0]
+    clear_preprocessing_caches()
+    peak_memory = run_query(logics, agent_type, start, goal, edge_costs, trace_memory=True)['peak_memory']
+
+    query_times = np.array([result['query_time'] for result in results])
+    setup_times = np.array([result['setup_time'] for result in results])
+    # rounded, the float error of summing the path in another order isn't a gap
+    gaps = [round(result['cost'] / optimal - 1, 9) for result, optimal in zip(results, optimal_costs)
+            if result['cost'] is not None and optimal > 0]
+    return {
+        'agent': AGENT_NAMES[agent_type],
+        'agent_type': agent_type,
+        'queries': len(results),
+        'failures': sum(result['cost'] is None for result in results),
+        'time_per_query': float(np.median(query_times)),
+        'mean_time_per_query': float(query_times.mean()),
+        'max_time_per_query': float(query_times.max()),
+        'setup_time': float(np.median(setup_times)),
+        'first_setup_time': float(setup_times[0]),
+        # mean work per query
+        **{name: float(np.mean([result[name] for result in results])) for name in SEARCH_STATS},
+        'peak_memory': int(peak_memory),
+        'mean_optimality_gap': float(np.mean(gaps)) if gaps else None,
+        'max_optimality_gap': float(np.max(gaps)) if gaps else None,
+    }
+
+
+def run_benchmarks(families=ROAD_FAMILIES, sizes=DEFAULT_SIZES, agent_types=BENCHMARK_AGENTS,
+                   num_of_queries=NUM_OF_QUERIES, seed=0, log=print):
+    """
+    Run every agent on the queries of every graph family and size.
+
+    The edge costs are the mean traffic time costs. The optimality gap of a path is its cost over the cost of the
+    shortest path minus 1. The times are medians over the queries, in seconds (time.perf_counter), the first
+    setup also pays for the per graph preprocessing that's cached for the next queries (e.g. the contraction
+    hierarchy or the landmarks).
+
+    :return: Dictionary of the environment, the configuration and one result per graph and agent.
+    """
+    results = []
+    for family in families:
+        for size in sizes:
+            logics = benchmark_graph(family, SIZES[size], seed)
+            queries = benchmark_queries(logics, num_of_queries, seed)
+            edge_costs = logics.mean_time_cost
+            optimal_costs = [compute_dijkstra_costs(logics.graph, goal, edge_costs)[logics.graph.node_index[start]]
+                             for start, goal in queries]
+            for agent_type in agent_types:
+                if agent_type == QLEARNING and logics.graph.num_nodes > QLEARNING_MAX_NODES:
+                    continue
+                result = benchmark_agent(logics, agent_type, queries, edge_costs, optimal_costs)
+                result = {'family': family, 'size': size, 'num_of_nodes': logics.graph.num_nodes,
+                          'num_of_roads': len(logics.undirected_edges), **result}
+                results.append(result)
+                if log is not None:
+                    log(f"{family} {size} {result['agent']}: {result['time_per_query']:.6f} s per query")
+
+    return {
+        'version': BENCHMARK_VERSION,
+        'environment': {'python': platform.python_version(), 'numpy': np.__version__, 'scipy': scipy.__version__,
+                        'platform': platform.platform(), 'processor': platform.processor(),
+                        'cpu_count': os.cpu_count()},
+        'config': {'families': list(families), 'sizes': {size: SIZES[size] for size in sizes},
+                   'agents': [AGENT_NAMES[agent_type] for agent_type in agent_types],
+                   'num_of_queries': num_of_queries, 'seed': seed},
+        'results': results,
+    }
+
+
+def save_benchmarks(benchmarks, file_path=BENCHMARK_FILE):
+    # one result per line, in a fixed order, so two files diff line by line
+    with open(file_path, 'w') as file:
+        file.write('{\n')
+        for key in ('version', 'environment', 'config'):
+            file.write(f'"{key}": {json.dumps(benchmarks[key], sort_keys=True)},\n')
+        file.write('"results": [\n')
+        file.write(',\n'.join(json.dumps(result) for result in benchmarks['results']))
+        file.write('\n]\n}\n')
+
+
+def compare_benchmarks(old, new, threshold=REGRESSION_THRESHOLD):
+    """
+    The changes between two benchmark runs, of the results of the same family, size and agent.
+
+    :return: List of (family, size, agent, old time per query, new time per query, new / old time) of the results
+             whose time changed by more than threshold, slowest first.
+    """
+    old_results = {(result['family'], result['size'], result['agent']): result for result in old['results']}
+    changes = []
+    for result in new['results']:
+        key = (result['family'], result['size'], result['agent'])
+        if key not in old_results or not old_results[key]['time_per_query']:
+            continue
+        old_time, new_time = old_results[key]['time_per_query'], result['time_per_query']
+        ratio = new_time / old_time
+        if abs(ratio - 1) > threshold:
+            changes.append((*key, old_time, new_time, ratio))
+    return sorted(changes, key=lambda change: -change[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the agents on seeded synthetic road networks.')
+    parser.add_argument('-g', choices=ROAD_FAMILIES, nargs='+', default=list(ROAD_FAMILIES),
+                        help='Graph families (default: all)')
+    parser.add_argument('-m', choices=list(SIZES), nargs='+', default=list(DEFAULT_SIZES),
+                        help=f'Graph sizes (default: {" ".join(DEFAULT_SIZES)})')
+    parser.add_argument('-a', type=int, nargs='+', default=list(BENCHMARK_AGENTS),
+                        help='Agent numbers to benchmark (default: all)')
+    parser.add_argument('-n', type=int, default=NUM_OF_QUERIES, help='Number of queries per graph')
+    parser.add_argument('-s', type=int, default=0, help='Seed of the graphs and the queries')
+    parser.add_argument('-o', default=BENCHMARK_FILE, help='Json file the results are written to')
+    parser.add_argument('-c', default=None, help='Benchmark json file of a previous version to compare with')
+    args = parser.parse_args()
+
+    start_time = time.time()
+    benchmarks = run_benchmarks(args.g, args.m, args.a, args.n, args.s)
+    save_benchmarks(benchmarks, args.o)
+    print(f"{len(benchmarks['results'])} benchmarks in {round(time.time() - start_time, 2)} seconds, "
+          f"results written to {args.o}")
+
+    if args.c is not None:
+        with open(args.c) as file:
+            old = json.load(file)
+        for family, size, agent, old_time, new_time, ratio in compare_benchmarks(old, benchmarks):
+            change = 'slower' if ratio > 1 else 'faster'
+            print(f"{family} {size} {agent}: {old_time:.6f} -> {new_time:.6f} s per query "
+                  f"({ratio:.2f}x, {change})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,309 @@
+import hashlib
+import os
+import numpy as np
+import networkx as nx
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components, shortest_path
+from scipy.spatial import Delaunay, cKDTree
+
+# speed classes of the synthetic road networks, indices into NavigationLogics.speed_limits (20, 40, 80, 90, 120)
+LOCAL = 0
+COLLECTOR = 1
+ARTERIAL = 2
+EXPRESSWAY = 3
+HIGHWAY = 4
+
+# road_length is 100 times the distance between the positions, at this spacing neighboring intersections are
+# about 1 (km) apart
+NODES_SPACING = 0.01
+
+ROAD_FAMILIES = ('grid', 'geometric', 'delaunay', 'hierarchical')
+
+# directory of the cached node layouts, None - the layout is computed on every start
+LAYOUT_DIR = 'layouts'
+# the spring layout is O(n^2) per iteration, larger graphs get the pivot MDS layout
+SPRING_LAYOUT_MAX_NODES = 1000
+NUM_OF_LAYOUT_PIVOTS = 50
+
+
+def run_random_graph():
+    i = np.random.choice(25) + 2
+    nodes = [j for j in range(i)]
+    # a coin for every ordered pair of nodes, drawn at once (the same draws as one by one, row by row)
+    coins = np.random.choice([0, 1], size=(len(nodes), len(nodes)))
+    edges = [(nodes[i], nodes[j]) for i, j in zip(*np.nonzero(np.triu(coins == 0, k=1)))]
+
+    src = np.random.choice(nodes)
+    nodes.remove(src)
+    dest = np.random.choice(nodes)
+    nodes.append(src)
+
+    if (src, dest) not in edges:
+        edges.append((src, dest))
+
+    return nodes, edges, src, dest
+
+
+def spring_positions(nodes, edges):
+    """
+    Compute the positions of the nodes using a spring layout, in the (-1, 1) range.
+
+    :return: Dictionary of node positions {node: (x, y)}.
+    """
+    graph = nx.Graph()
+    graph.add_nodes_from(nodes)
+    graph.add_edges_from(edges)
+    return nx.spring_layout(graph, seed=42)
+
+
+def pivot_mds_positions(nodes, edges, num_of_pivots=NUM_OF_LAYOUT_PIVOTS):
+    """
+    Compute the positions of the nodes using pivot MDS (Brandes & Pich), in the (-1, 1) range: the hop distances
+    from a few far apart pivot nodes are embedded in the plane by classical MDS. It takes a BFS per pivot, so it
+    scales to millions of nodes.
+
+    :return: Dictionary of node positions {node: (x, y)}.
+    """
+    n = len(nodes)
+    node_index = {node: i for i, node in enumerate(nodes)}
+    sources = np.array([node_index[n1] for n1, _ in edges], dtype=np.int64)
+    targets = np.array([node_index[n2] for _, n2 in edges], dtype=np.int64)
+    adjacency = coo_matrix((np.ones(len(edges)), (sources, targets)), shape=(n, n)).tocsr()
+
+    # farthest point pivots, every pivot is the node farthest from the pivots selected so far
+    num_of_pivots = min(num_of_pivots, n)
+    dist = np.empty((num_of_pivots, n))
+    min_dist = np.full(n, np.inf)
+    pivot = 0
+    for i in range(num_of_pivots):
+        dist[i] = shortest_path(adjacency, directed=False, unweighted=True, indices=pivot)
+        # other connected components are placed just beyond the farthest node
+        dist[i][np.isinf(dist[i])] = np.max(dist[i][np.isfinite(dist[i])]) + 1
+        np.minimum(min_dist, dist[i], out=min_dist)
+        pivot = int(np.argmax(min_dist))
+
+    # classical MDS of the (nodes x pivots) squared distances
+    squared = dist.T ** 2
+    centered = squared - squared.mean(axis=0) - squared.mean(axis=1, keepdims=True) + squared.mean()
+    u, singular_values, _ = np.linalg.svd(-0.5 * centered, full_matrices=False)
+    positions = np.zeros((n, 2))
+    dims = min(2, len(singular_values))
+    positions[:, :dims] = u[:, :dims] * singular_values[:dims]
+
+    # same scaling as the spring layout
+    positions -= positions.mean(axis=0)
+    scale = np.abs(positions).max()
+    if scale > 0:
+        positions /= scale
+    return dict(zip(nodes, map(tuple, positions.tolist())))
+
+
+def graph_hash(nodes, edges):
+    # hash of the nodes and the edges, in order, it keys the cached layouts
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(str(list(nodes)).encode())
+    digest.update(str(list(edges)).encode())
+    return digest.hexdigest()
+
+
+def layout_positions(nodes, edges, layout_dir=None):
+    """
+    The positions of the nodes for drawing and for the road lengths: the spring layout for small graphs, pivot MDS
+    for large graphs. Layouts are cached in layout_dir (defaults to LAYOUT_DIR) by the graph hash, so a map that
+    was shown before starts at once.
+
+    :return: Dictionary of node positions {node: (x, y)}, in the (-1, 1) range.
+    """
+    layout_dir = LAYOUT_DIR if layout_dir is None else layout_dir
+    file_path = None
+    if layout_dir:
+        file_path = os.path.join(layout_dir, f'{graph_hash(nodes, edges)}.npy')
+        if os.path.exists(file_path):
+            return dict(zip(nodes, map(tuple, np.load(file_path).tolist())))
+
+    if len(nodes) <= SPRING_LAYOUT_MAX_NODES:
+        positions = spring_positions(nodes, edges)
+    else:
+        positions = pivot_mds_positions(nodes, edges)
+    positions = np.array([positions[node] for node in nodes], dtype=float).reshape(-1, 2)
+
+    if file_path is not None:
+        os.makedirs(layout_dir, exist_ok=True)
+        np.save(file_path, positions)
+    return dict(zip(nodes, map(tuple, positions.tolist())))
+
+
+def component_endpoints(num_of_nodes, sources, targets, rng):
+    """
+    Draw a source and a destination from the largest connected component of the roads (sources[i], targets[i]).
+
+    :return: (src_node, dest_node).
+    """
+    n = num_of_nodes
+    _, labels = connected_components(coo_matrix((np.ones(len(sources)), (sources, targets)), shape=(n, n)),
+                                     directed=False)
+    component = np.flatnonzero(labels == np.argmax(np.bincount(labels)))
+    if len(component) > 1:
+        return tuple(int(node) for node in rng.choice(component, size=2, replace=False))
+    return 0, min(1, n - 1)
+
+
+def _road_network(positions, sources, targets, classes, rng):
+    """
+    Build the network from arrays: undirected roads are deduplicated (a road given twice keeps its fastest class)
+    and the source and destination are drawn from the largest connected component.
+
+    :param positions: Array of shape (num_of_nodes, 2).
+    :param sources: Array with the first node of every road.
+    :param targets: Array with the second node of every road.
+    :param classes: Array with the speed class of every road.
+    :param rng: numpy Generator.
+    :return: (nodes, edges, src_node, dest_node, nodes_positions, speed_classes), speed_classes is an array with
+             the speed class of every edge in edges.
+    """
+    n = len(positions)
+    keep = sources != targets
+    low = np.minimum(sources, targets)[keep].astype(np.int64)
+    high = np.maximum(sources, targets)[keep].astype(np.int64)
+    classes = np.asarray(classes)[keep]
+    # sort by road, fastest class first, and keep the first of every road
+    order = np.lexsort((-classes, high, low))
+    low, high, classes = low[order], high[order], classes[order]
+    first = np.ones(len(low), dtype=bool)
+    first[1:] = (low[1:] != low[:-1]) | (high[1:] != high[:-1])
+    low, high, classes = low[first], high[first], classes[first]
+
+    src, dest = component_endpoints(n, low, high, rng)
+
+    nodes = list(range(n))
+    edges = list(zip(low.tolist(), high.tolist()))
+    nodes_positions = dict(zip(nodes, map(tuple, positions.tolist())))
+    return nodes, edges, src, dest, nodes_positions, classes.astype(np.int64)
+
+
+def _classes_by_length(lengths, rng):
+    # longer roads are faster: the longest 5% are expressways, the next 15% arterials, the rest local or collector
+    classes = rng.choice([LOCAL, COLLECTOR], size=len(lengths))
+    if len(lengths) > 0:
+        arterial, expressway = np.quantile(lengths, [0.8, 0.95])
+        classes[lengths > arterial] = ARTERIAL
+        classes[lengths > expressway] = EXPRESSWAY
+    return classes
+
+
+def _uniform_positions(num_of_nodes, spacing, rng):
+    # uniform in a square sized so that the mean distance to the nearest nodes is about spacing
+    side = spacing * np.sqrt(num_of_nodes)
+    return rng.uniform(0, side, size=(num_of_nodes, 2))
+
+
+def _delaunay_roads(positions, max_length_factor):
+    # the edges of the Delaunay triangulation, without the ones longer than max_length_factor times the median
+    triangles = Delaunay(positions).simplices
+    pairs = np.concatenate([triangles[:, [0, 1]], triangles[:, [1, 2]], triangles[:, [0, 2]]])
+    # an inner edge is on two triangles
+    n = len(positions)
+    keys = np.unique(np.min(pairs, axis=1).astype(np.int64) * n + np.max(pairs, axis=1))
+    pairs = np.column_stack(np.divmod(keys, n))
+    lengths = np.hypot(*(positions[pairs[:, 0]] - positions[pairs[:, 1]]).T)
+    keep = lengths <= max_length_factor * np.median(lengths)
+    return pairs[keep, 0], pairs[keep, 1], lengths[keep]
+
+
+def perturbed_grid(rows, cols=None, spacing=NODES_SPACING, jitter=0.25, drop_rate=0.1, arterial_every=8,
+                   seed=None):
+    """
+    A city grid: the intersections are moved at random by up to jitter * spacing and a drop_rate fraction of the
+    blocks' roads is missing. Every arterial_every-th street in each direction is an arterial.
+
+    :return: See _road_network.
+    """
+    rng = np.random.default_rng(seed)
+    cols = rows if cols is None else cols
+    r, c = np.divmod(np.arange(rows * cols), cols)
+    positions = np.column_stack([c, r]) * spacing + rng.uniform(-jitter, jitter, size=(rows * cols, 2)) * spacing
+
+    node = r * cols + c
+    horizontal = c < cols - 1
+    vertical = r < rows - 1
+    sources = np.concatenate([node[horizontal], node[vertical]])
+    targets = np.concatenate([node[horizontal] + 1, node[vertical] + cols])
+    # a horizontal road is on row r, a vertical road on column c
+    street = np.concatenate([r[horizontal], c[vertical]])
+    classes = rng.choice([LOCAL, COLLECTOR], size=len(sources))
+    classes[street % arterial_every == 0] = ARTERIAL
+
+    keep = rng.random(len(sources)) >= drop_rate
+    return _road_network(positions, sources[keep], targets[keep], classes[keep], rng)
+
+
+def random_geometric(num_of_nodes, mean_degree=5, spacing=NODES_SPACING, seed=None):
+    """
+    Random geometric graph: uniform random intersections, a road between every two within the radius giving
+    the mean degree.
+
+    :return: See _road_network.
+    """
+    rng = np.random.default_rng(seed)
+    positions = _uniform_positions(num_of_nodes, spacing, rng)
+    radius = spacing * np.sqrt(mean_degree / np.pi)
+    pairs = cKDTree(positions).query_pairs(radius, output_type='ndarray')
+    lengths = np.hypot(*(positions[pairs[:, 0]] - positions[pairs[:, 1]]).T)
+    return _road_network(positions, pairs[:, 0], pairs[:, 1], _classes_by_length(lengths, rng), rng)
+
+
+def delaunay_network(num_of_nodes, spacing=NODES_SPACING, max_length_factor=2.5, seed=None):
+    """
+    Planar network: the Delaunay triangulation of uniform random intersections, without its longest edges.
+
+    :return: See _road_network.
+    """
+    rng = np.random.default_rng(seed)
+    positions = _uniform_positions(num_of_nodes, spacing, rng)
+    sources, targets, lengths = _delaunay_roads(positions, max_length_factor)
+    return _road_network(positions, sources, targets, _classes_by_length(lengths, rng), rng)
+
+
+def hierarchical_network(num_of_nodes, highway_fraction=0.01, spacing=NODES_SPACING, max_length_factor=2.5,
+                         seed=None):
+    """
+    Two layers: a local planar network (see delaunay_network) and highways joining a highway_fraction of the
+    intersections (the interchanges) by their own Delaunay triangulation.
+
+    :return: See _road_network.
+    """
+    rng = np.random.default_rng(seed)
+    positions = _uniform_positions(num_of_nodes, spacing, rng)
+    sources, targets, lengths = _delaunay_roads(positions, max_length_factor)
+    classes = _classes_by_length(lengths, rng)
+
+    interchanges = rng.choice(num_of_nodes, size=min(num_of_nodes, max(2, int(num_of_nodes * highway_fraction))),
+                              replace=False)
+    if len(interchanges) >= 4:
+        highway_sources, highway_targets, _ = _delaunay_roads(positions[interchanges], max_length_factor)
+        highway_sources, highway_targets = interchanges[highway_sources], interchanges[highway_targets]
+    else:
+        highway_sources, highway_targets = interchanges[:-1], interchanges[1:]
+
+    return _road_network(positions, np.concatenate([sources, highway_sources]),
+                         np.concatenate([targets, highway_targets]),
+                         np.concatenate([classes, np.full(len(highway_sources), HIGHWAY)]), rng)
+
+
+def generate_road_network(family, num_of_nodes, seed=None, **kwargs):
+    """
+    Generate a synthetic road network of one of the ROAD_FAMILIES with about num_of_nodes intersections.
+
+    :return: (nodes, edges, src_node, dest_node, nodes_positions, speed_classes), the arguments of NavigationLogics
+             (speed_classes is its road_speed_classes).
+    """
+    if family == 'grid':
+        side = max(2, int(round(np.sqrt(num_of_nodes))))
+        return perturbed_grid(side, side, seed=seed, **kwargs)
+    if family == 'geometric':
+        return random_geometric(num_of_nodes, seed=seed, **kwargs)
+    if family == 'delaunay':
+        return delaunay_network(num_of_nodes, seed=seed, **kwargs)
+    if family == 'hierarchical':
+        return hierarchical_network(num_of_nodes, seed=seed, **kwargs)
+    raise ValueError(f"unknown road network family: {family}")
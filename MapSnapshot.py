@@ -0,0 +1,129 @@
+import json
+import os
+import numpy as np
+from RoadGraph import RoadGraph
+
+# first bytes of every snapshot file
+MAGIC = b'NAVMAP\0\0'
+# version of the file layout, bumped whenever it changes - older readers refuse newer files
+SNAPSHOT_VERSION = 1
+# the arrays start at multiples of this many bytes
+ALIGNMENT = 64
+# magic, version and manifest length
+_PREAMBLE_SIZE = len(MAGIC) + 8
+
+# the per directed edge attributes NavigationLogics draws
+EDGE_ATTRIBUTES = ('edge_traffic_mean', 'edge_traffic_std', 'speed_limit', 'road_length')
+
+
+def save_map(file_path, logics):
+    """
+    Save the map of a NavigationLogics - the topology, the node positions, the edge attributes and the adjacency
+    arrays - into one snapshot file that load_map memory maps.
+
+    The file is a preamble (MAGIC, SNAPSHOT_VERSION, manifest length), a json manifest of the arrays (dtype, shape,
+    offset) and of the map (src_node, dest_node), then the raw arrays, ALIGNMENT aligned. It's written to a
+    temporary file and renamed, so readers never see half a snapshot.
+
+    :param file_path: The snapshot file.
+    :param logics: The NavigationLogics of the map.
+    """
+    graph = logics.graph
+    arrays = {name: getattr(graph, name) for name in RoadGraph.ARRAYS}
+    arrays.update({name: getattr(logics, name) for name in EDGE_ATTRIBUTES})
+    meta = {'src_node': logics.src_node, 'dest_node': logics.dest_node,
+            'num_of_roads': len(logics.undirected_edges)}
+    if all(isinstance(node, (int, np.integer)) for node in graph.nodes):
+        arrays['nodes'] = np.asarray(graph.nodes, dtype=np.int64)
+    else:
+        meta['nodes'] = list(graph.nodes)
+    if logics.nodes_positions is not None:
+        arrays['positions'] = np.array([logics.nodes_positions[node] for node in graph.nodes],
+                                       dtype=float).reshape(-1, 2)
+
+    arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        layout[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+        offset += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+    manifest = json.dumps({'arrays': layout, 'meta': meta}, default=_json_scalar).encode()
+    # the data section starts aligned too
+    data_start = -(-(_PREAMBLE_SIZE + len(manifest)) // ALIGNMENT) * ALIGNMENT
+    manifest += b' ' * (data_start - _PREAMBLE_SIZE - len(manifest))
+
+    temp_path = f'{file_path}.{os.getpid()}.tmp'
+    with open(temp_path, 'wb') as file:
+        file.write(MAGIC)
+        file.write(np.array([SNAPSHOT_VERSION, len(manifest)], dtype='<u4').tobytes())
+        file.write(manifest)
+        for name, array in arrays.items():
+            file.seek(data_start + layout[name]['offset'])
+            file.write(array.tobytes())
+        file.truncate(data_start + offset)
+    os.replace(temp_path, file_path)
+
+
+def _json_scalar(value):
+    # numpy scalars (e.g. numpy integer nodes) aren't json serializable
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not json serializable")
+
+
+def load_map(file_path):
+    """
+    Open a snapshot written by save_map. The arrays are read only views of one memory map of the file, nothing is
+    read until it's used and the processes that open the same snapshot share its pages.
+
+    :param file_path: The snapshot file.
+    :return: A MapSnapshot.
+    """
+    with open(file_path, 'rb') as file:
+        preamble = file.read(_PREAMBLE_SIZE)
+        if len(preamble) < _PREAMBLE_SIZE or preamble[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{file_path} is not a map snapshot")
+        version, manifest_size = np.frombuffer(preamble[len(MAGIC):], dtype='<u4').tolist()
+        if version > SNAPSHOT_VERSION:
+            raise ValueError(f"{file_path} is a version {version} map snapshot, "
+                             f"this version reads up to version {SNAPSHOT_VERSION}")
+        manifest = json.loads(file.read(manifest_size))
+
+    memory_map = np.memmap(file_path, dtype=np.uint8, mode='r')
+    data_start = _PREAMBLE_SIZE + manifest_size
+    arrays = {name: np.ndarray(tuple(spec['shape']), dtype=np.dtype(spec['dtype']), buffer=memory_map,
+                               offset=data_start + spec['offset'])
+              for name, spec in manifest['arrays'].items()}
+    return MapSnapshot(arrays, manifest['meta'])
+
+
+class MapSnapshot:
+    def __init__(self, arrays, meta):
+        """
+        A map loaded by load_map.
+
+        :param arrays: Dictionary of the (memory mapped) arrays of the snapshot.
+        :param meta: Dictionary of the map info of the manifest.
+        """
+        self.arrays = arrays
+        if 'nodes' in arrays:
+            self.nodes = arrays['nodes'].tolist()
+        else:
+            self.nodes = [tuple(node) if isinstance(node, list) else node for node in meta['nodes']]
+        self.src_node = meta['src_node']
+        self.dest_node = meta['dest_node']
+        self.num_of_roads = meta['num_of_roads']
+        self.graph = RoadGraph.from_arrays(self.nodes, arrays)
+        self._nodes_positions = None
+
+    @property
+    def nodes_positions(self):
+        # dictionary of node positions {node: (x, y)}, None if the map has no positions
+        if self._nodes_positions is None and 'positions' in self.arrays:
+            self._nodes_positions = dict(zip(self.nodes, map(tuple, self.arrays['positions'].tolist())))
+        return self._nodes_positions
+
+    @property
+    def undirected_edges(self):
+        # the roads are the first num_of_roads directed edges
+        return self.graph.edges[:self.num_of_roads]
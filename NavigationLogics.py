@@ -1,18 +1,46 @@
 import numpy as np
 from agents.AStarAgent import AStarAgent
+from agents import QLearningAgent as qlearning
 from agents.QLearningAgent import QLearningAgent
+from agents.DStarLiteAgent import DStarLiteAgent
+from agents.ContractionHierarchyAgent import ContractionHierarchyAgent
+from agents.CSGraphAgent import CSGraphAgent
+from RoadGraph import RoadGraph
+from MapSnapshot import load_map
+from ResultsStore import ResultsStore, RESULTS_DB, SCENARIOS, new_run_id
+from TickProfiler import TickHooks
 import csv
-from agents.agent import ASTAR__ZERO_H, ASTAR__AERIAL_DIST_H, ASTAR__DIJKSTRA_H, ASTAR__COMBINATION_H, ASTAR__NONADMISSIBLE_H, QLEARNING
+from agents.agent import ASTAR__ZERO_H, ASTAR__AERIAL_DIST_H, ASTAR__DIJKSTRA_H, ASTAR__COMBINATION_H, ASTAR__NONADMISSIBLE_H, QLEARNING, \
+    DSTAR_LITE, CONTRACTION_HIERARCHY, CSGRAPH_DIJKSTRA, AGENT_NAMES, SearchStats
 import time
 
-RESULTS_FILE = 'results_recording.csv'
+RESULTS_FILE = RESULTS_DB
 QLEARNING_RESULT_FILE = 'Qlearning_parameter_results.csv'
+QLEARNING_TRAINING_FILE = 'Qlearning_training_results.csv'
 speed_limits = [20, 40, 80, 90, 120]
 max_speed_limit = max(speed_limits)
 
 MAX_TRAFFIC_INDEX = 0.99
 MIN_TRAFFIC_INDEX = 0.01
 
+# the agents recorded into RESULTS_FILE by default
+DEFAULT_AGENT_TYPES = [ASTAR__ZERO_H, ASTAR__AERIAL_DIST_H, ASTAR__DIJKSTRA_H, ASTAR__COMBINATION_H,
+                       ASTAR__NONADMISSIBLE_H, QLEARNING]
+
+# the Q-learning agents of the analysis mode, they differ in the learning rate
+QLEARNING_ANALYSIS_PARAMS = [{'learning_rate': learning_rate} for learning_rate in (0.4, 0.5, 0.6, 0.7, 0.8, 0.9)]
+
+
+def add_rows_to_csv(rows, file_path):
+    # all the rows must have the same keys
+    if not rows:
+        return
+    with open(file_path, mode='a', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=rows[0].keys())
+        if file.tell() == 0:
+            writer.writeheader()
+        writer.writerows(rows)
+
 
 def add_row_to_csv(row, file_path):
     with open(file_path, mode='a', newline='') as file:
@@ -26,9 +54,47 @@ def add_row_to_csv(row, file_path):
 
 class NavigationLogics:
     def __init__(self, nodes, edges, src_node, dest_node, nodes_positions, agent_enum=0,
-                 run_all_algos=True, Qlearning_analysis=False):
+                 run_all_algos=True, Qlearning_analysis=False, agent_types=None, record_results=True,
+                 qlearning_params=None, qlearning_options=None, road_speed_classes=None, road_speed_limits=None,
+                 road_lengths=None, map_snapshot=None, hooks=None):
+        """
+        Initialize the simulation of a car driving from src_node to dest_node.
+
+        :param agent_enum: Index in agent_types of the agent whose path is shown on the gui.
+        :param agent_types: The agents to run and record (constants from agents.agent), defaults to
+                            DEFAULT_AGENT_TYPES.
+        :param record_results: Whether to add the results to the results store and the csv files when the car gets
+                               to dest_node.
+        :param qlearning_params: The QLearningAgent keyword arguments of every agent of the Qlearning_analysis mode,
+                                 defaults to QLEARNING_ANALYSIS_PARAMS.
+        :param qlearning_options: The QLearningAgent keyword arguments of the QLEARNING agents of the other modes,
+                                  e.g. {'warm_start': True} to start from the snapshots in QTABLE_DIR or
+                                  {'patience': CONVERGENCE_PATIENCE} to stop training on convergence. None - the
+                                  defaults, a cold start that trains all the episodes.
+        :param road_speed_classes: Index in speed_limits of the speed limit of every edge in edges, drawn at random
+                                   if None.
+        :param road_speed_limits: The speed limit (km/h) of every edge in edges, of an imported map, overrides
+                                  road_speed_classes.
+        :param road_lengths: The length (km) of every edge in edges, of an imported map, 100 times the distance
+                             between the nodes positions if None.
+        :param map_snapshot: A MapSnapshot of the map (see from_snapshot), its graph and edge attributes are used
+                             instead of building the graph and drawing the attributes.
+        :param hooks: TickHooks update calls around every tick and its phases, e.g. a TickProfiler, None - no
+                      hooks.
+        """
         self.nodes = nodes
-        self.undirected_edges = edges
+        # undirected edges, a road given in both orientations is kept once
+        if map_snapshot is not None:
+            self.undirected_edges = map_snapshot.undirected_edges
+        else:
+            self.undirected_edges = []
+            roads = set()
+            kept_edges = []  # index in edges of every undirected edge
+            for i, (n1, n2) in enumerate(edges):
+                if (n1, n2) not in roads and (n2, n1) not in roads:
+                    roads.add((n1, n2))
+                    self.undirected_edges.append((n1, n2))
+                    kept_edges.append(i)
         self.src_node = src_node
         self.dest_node = dest_node
         self.nodes_positions = nodes_positions
@@ -39,66 +105,62 @@ class NavigationLogics:
         # this holds the current path - sorted list of DIRECTED edges from current_node to dest_node
         self.current_d_path = []
 
+        # DIRECTED edges: the undirected edges followed by their opposite direction, so the undirected edge i
+        # is the directed edge ids i and i + len(self.undirected_edges)
+        if map_snapshot is not None:
+            self.graph = map_snapshot.graph
+            self.edges = self.graph.edges
+        else:
+            self.edges = self.undirected_edges + [(n2, n1) for n1, n2 in self.undirected_edges]
+            # adjacency index of the directed edges, built once and shared by all agents
+            self.graph = RoadGraph(self.nodes, self.edges)
+
+        # edge state - arrays indexed by the directed edge id, both directions of a road share the same values
+        n = len(self.undirected_edges)
+        # traffic mean, traffic std and speed limit index, drawn per edge in one call. A snapshot's attributes
+        # are drawn already, but the draw is still made so the traffic that follows is the same as on the saved map
+        edge_draws = np.random.uniform([0.001, 0.1, 0], [0.9, 0.9, 5], size=(n, 3))
+        if map_snapshot is not None:
+            # read only views of the snapshot, the undirected edge i is the first of the two directions
+            self.edge_traffic_mean = map_snapshot.arrays['edge_traffic_mean']
+            self.edge_traffic_std = map_snapshot.arrays['edge_traffic_std']
+            self.undirected_traffic_mean = self.edge_traffic_mean[:n]
+            self.undirected_traffic_std = self.edge_traffic_std[:n]
+            self.speed_limit = map_snapshot.arrays['speed_limit']
+            self.road_length = map_snapshot.arrays['road_length']
+        else:
+            self.set_edge_attributes(edge_draws, kept_edges, road_speed_classes, road_speed_limits, road_lengths)
+
         # this holds the traffic index for each edge (0-no traffic, 1-full traffic), should be in (0, 1) - NOT 0, 1
-        self.edges = []
-        self.traffic_index = {edge: 0 for edge in edges}
-        self.edge_traffic_mean = {}
-        self.edge_traffic_std = {}
-        self.speed_limit = {}
-        self.road_length = {}
-
-        for edge in self.undirected_edges:
-            self.edges.append(edge)
-            self.edge_traffic_mean[edge] = np.random.uniform(0.001, 0.9)
-            self.edge_traffic_std[edge] = np.random.uniform(0.1, 0.9)
-            self.speed_limit[edge] = speed_limits[int(np.random.uniform(0, 5))]
-            self.road_length[edge] = round(100 * self.get_edge_dist(edge), 4)
-
-        # add the opposite direction to all edges
-        for edge in self.undirected_edges:
-            n1, n2 = edge
-            opposite_edge = (n2, n1)
-            self.edges.append(opposite_edge)
-            self.edge_traffic_mean[opposite_edge] = self.edge_traffic_mean[edge]
-            self.edge_traffic_std[opposite_edge] = self.edge_traffic_std[edge]
-            self.speed_limit[opposite_edge] = self.speed_limit[edge]
-            self.road_length[opposite_edge] = self.road_length[edge]
-            self.traffic_index[opposite_edge] = self.traffic_index[edge]
+        self.traffic_index = np.zeros(2 * n)
+        self.edge_traffic_min = np.maximum(MIN_TRAFFIC_INDEX, self.edge_traffic_mean - 2 * self.edge_traffic_std)
+        self.edge_traffic_max = np.minimum(MAX_TRAFFIC_INDEX, self.edge_traffic_mean + 2 * self.edge_traffic_std)
+
+        # the mean, min and max traffic never change - their time cost vectors are computed once
+        self.mean_time_cost = self.get_time_cost(self.edge_traffic_mean)
+        self.min_time_cost = self.get_time_cost(self.edge_traffic_min)
+        self.max_time_cost = self.get_time_cost(self.edge_traffic_max)
 
         self.Qlearning_analysis = Qlearning_analysis
+        self.qlearning_options = {} if qlearning_options is None else qlearning_options
 
         if not self.Qlearning_analysis:
             # all agents will be recorded,
             # but only the path according to agent_enum will be shown on gui and forwarded to manager
-            agents = [AStarAgent(dest_node, self.edges, nodes_positions, self.road_length, self.speed_limit,
-                           ASTAR__ZERO_H),
-                AStarAgent(dest_node, self.edges, nodes_positions, self.road_length, self.speed_limit,
-                           ASTAR__AERIAL_DIST_H),
-                AStarAgent(dest_node, self.edges, nodes_positions, self.road_length, self.speed_limit,
-                           ASTAR__DIJKSTRA_H),
-                AStarAgent(dest_node, self.edges, nodes_positions, self.road_length, self.speed_limit,
-                         ASTAR__COMBINATION_H),
-                AStarAgent(dest_node, self.edges, nodes_positions, self.road_length, self.speed_limit,
-                         ASTAR__NONADMISSIBLE_H),
-                QLearningAgent(dest_node, self.edges, nodes_positions, max_speed_limit)]
+            self.agent_types = DEFAULT_AGENT_TYPES if agent_types is None else agent_types
 
             # *** agents for changing costs, mean costs, min costs, max costs ***
-            self.agents = agents + \
-                          agents + \
-                          agents + \
-                          agents
-            self.num_of_different_agents = 6
+            # every scenario gets its own instances, as some agents keep state between find_path calls
+            self.agents = [self.create_agent(agent_type) for _ in range(4) for agent_type in self.agent_types]
+            self.num_of_different_agents = len(self.agent_types)
 
         else:
-            self.agents = [
-                QLearningAgent(dest_node, self.edges, nodes_positions, max_speed_limit, learning_rate=0.4),
-                QLearningAgent(dest_node, self.edges, nodes_positions, max_speed_limit, learning_rate=0.5),
-                QLearningAgent(dest_node, self.edges, nodes_positions, max_speed_limit, learning_rate=0.6),
-                QLearningAgent(dest_node, self.edges, nodes_positions, max_speed_limit, learning_rate=0.7),
-                QLearningAgent(dest_node, self.edges, nodes_positions, max_speed_limit, learning_rate=0.8),
-                QLearningAgent(dest_node, self.edges, nodes_positions, max_speed_limit, learning_rate=0.9)
-            ]
-            self.num_of_different_agents = 6
+            if qlearning_params is None:
+                qlearning_params = QLEARNING_ANALYSIS_PARAMS
+            self.agents = [QLearningAgent(dest_node, self.graph, nodes_positions, max_speed_limit, **params)
+                           for params in qlearning_params]
+            self.num_of_different_agents = len(self.agents)
+            self.agent_types = [QLEARNING] * self.num_of_different_agents
 
         self.agent_enum = agent_enum
 
@@ -110,10 +172,11 @@ class NavigationLogics:
                 # *** agents for mean costs ***
                 self.agents[self.agent_enum + self.num_of_different_agents],
                 # *** agents for min costs ***
-                self.agents[self.agent_enum + self.num_of_different_agents],
+                self.agents[self.agent_enum + 2 * self.num_of_different_agents],
                 # *** agents for max costs ***
-                self.agents[self.agent_enum + self.num_of_different_agents]
+                self.agents[self.agent_enum + 3 * self.num_of_different_agents]
             ]
+            self.agent_types = [self.agent_types[self.agent_enum]]
             self.agent_enum = 0
             self.num_of_different_agents = 1
 
@@ -121,15 +184,67 @@ class NavigationLogics:
         self.agent_current_node = [self.src_node for _ in self.agents]
         self.agent_total_path_cost = [0 for _ in self.agents]
         self.agent_total_running_time = [0 for _ in range(self.num_of_different_agents)]
+        self.agent_total_cpu_time = [0 for _ in range(self.num_of_different_agents)]
+        # the work of all the searches of every agent (see agents.agent.SearchStats)
+        self.agent_search_stats = [SearchStats() for _ in self.agents]
         self.results_file = RESULTS_FILE
         self.qlearning_results_file = QLEARNING_RESULT_FILE
+        self.qlearning_training_file = QLEARNING_TRAINING_FILE
         self.calculate_paths_only_once = True
-        self.edge_traffic_min = {
-            edge: max(MIN_TRAFFIC_INDEX, self.edge_traffic_mean[edge] - 2 * self.edge_traffic_std[edge]) for edge in
-            self.edges}
-        self.edge_traffic_max = {
-            edge: min(MAX_TRAFFIC_INDEX, self.edge_traffic_mean[edge] + 2 * self.edge_traffic_std[edge]) for edge in
-            self.edges}
+        self.record_results = record_results
+        self.hooks = TickHooks() if hooks is None else hooks
+        # the hooks phase of every agent's search, e.g. search.astar_zero.changing
+        agent_names = [AGENT_NAMES[agent_type] for agent_type in self.agent_types]
+        if len(set(agent_names)) < len(agent_names):
+            agent_names = [f'{name}_{i}' for i, name in enumerate(agent_names)]
+        self.search_phases = [f'search.{name}.{scenario}' for scenario in SCENARIOS for name in agent_names]
+
+    @classmethod
+    def from_snapshot(cls, file_path, **kwargs):
+        """
+        The simulation of a map saved by MapSnapshot.save_map, its arrays are memory mapped and not copied.
+
+        :param file_path: The snapshot file.
+        :param kwargs: The other NavigationLogics arguments.
+        """
+        snapshot = load_map(file_path)
+        return cls(snapshot.nodes, None, snapshot.src_node, snapshot.dest_node, snapshot.nodes_positions,
+                   map_snapshot=snapshot, **kwargs)
+
+    def set_edge_attributes(self, edge_draws, kept_edges, road_speed_classes, road_speed_limits, road_lengths):
+        # the traffic distribution, speed limit and length of every edge, from the draws and the given attributes
+        self.undirected_traffic_mean = edge_draws[:, 0]
+        self.undirected_traffic_std = edge_draws[:, 1]
+        self.edge_traffic_mean = np.concatenate([self.undirected_traffic_mean, self.undirected_traffic_mean])
+        self.edge_traffic_std = np.concatenate([self.undirected_traffic_std, self.undirected_traffic_std])
+        if road_speed_limits is not None:
+            undirected_speed_limit = np.asarray(road_speed_limits, dtype=float)[kept_edges]
+        elif road_speed_classes is None:
+            undirected_speed_limit = np.array(speed_limits)[edge_draws[:, 2].astype(int)]
+        else:
+            undirected_speed_limit = np.array(speed_limits)[np.asarray(road_speed_classes)[kept_edges]]
+        self.speed_limit = np.concatenate([undirected_speed_limit, undirected_speed_limit])
+        if road_lengths is not None:
+            undirected_road_length = np.round(np.asarray(road_lengths, dtype=float)[kept_edges], 4)
+        else:
+            undirected_road_length = np.round(100 * self.get_edges_dist(self.undirected_edges), 4)
+        self.road_length = np.concatenate([undirected_road_length, undirected_road_length])
+
+    def create_agent(self, agent_type, goal_node=None):
+        # a new agent of agent_type heading to goal_node, defaults to dest_node
+        goal_node = self.dest_node if goal_node is None else goal_node
+        if agent_type == QLEARNING:
+            return QLearningAgent(goal_node, self.graph, self.nodes_positions, max_speed_limit,
+                                  **self.qlearning_options)
+        if agent_type == DSTAR_LITE:
+            return DStarLiteAgent(goal_node, self.graph, self.nodes_positions, max_speed_limit)
+        if agent_type == CSGRAPH_DIJKSTRA:
+            return CSGraphAgent(goal_node, self.graph, self.nodes_positions, max_speed_limit)
+        if agent_type == CONTRACTION_HIERARCHY:
+            return ContractionHierarchyAgent(goal_node, self.graph, self.nodes_positions, max_speed_limit,
+                                             self.road_length, self.speed_limit)
+        return AStarAgent(goal_node, self.graph, self.nodes_positions, self.road_length, self.speed_limit,
+                          agent_type)
 
     def get_edge_dist(self, edge):
         n1, n2 = edge
@@ -137,6 +252,14 @@ class NavigationLogics:
         pos2 = self.nodes_positions[n2]
         return np.sqrt((pos1[0] - pos2[0]) ** 2 + (pos1[1] - pos2[1]) ** 2)
 
+    def get_edges_dist(self, edges):
+        # vectorized get_edge_dist, returns an array with the distance of every edge
+        if len(edges) == 0:
+            return np.zeros(0)
+        pos1 = np.array([self.nodes_positions[n1] for n1, _ in edges], dtype=float)
+        pos2 = np.array([self.nodes_positions[n2] for _, n2 in edges], dtype=float)
+        return np.sqrt((pos1[:, 0] - pos2[:, 0]) ** 2 + (pos1[:, 1] - pos2[:, 1]) ** 2)
+
     def get_first_edge(self, path):
         if path is None:
             return None
@@ -149,28 +272,70 @@ class NavigationLogics:
             return 0
         if traffic_index is None:
             traffic_index = self.traffic_index
-        v = (1 - traffic_index[edge]) * self.speed_limit[edge]
-        x = self.road_length[edge]
+        edge_id = self.graph.edge_index[edge]
+        v = (1 - traffic_index[edge_id]) * self.speed_limit[edge_id]
+        x = self.road_length[edge_id]
         return x / v
 
     def get_mean_time_for_crossing_edge(self, edge):
-        if edge is None:
-            return 0
-        v = (1 - self.edge_traffic_mean[edge]) * self.speed_limit[edge]
-        x = self.road_length[edge]
-        return x / v
-
-    def record_agents_results(self):
+        return self.get_time_for_crossing_edge(edge, self.edge_traffic_mean)
+
+    def get_time_cost(self, traffic_index):
+        """
+        Vectorized get_time_for_crossing_edge.
+
+        :param traffic_index: Array with the traffic index of every edge id.
+        :return: Array with the time it takes to cross every edge id.
+        """
+        return self.road_length / ((1 - traffic_index) * self.speed_limit)
+
+    def get_results_records(self, **run_info):
+        """
+        The results of the agents, one record (see ResultsStore.RESULTS_COLUMNS) per agent and scenario.
+
+        :param run_info: Values of the other columns, e.g. seed and ticks.
+        """
+        run = {'run_id': new_run_id(), 'recorded_at': time.time(), 'graph': self.graph.fingerprint(),
+               'num_of_nodes': len(self.nodes), 'num_of_roads': len(self.undirected_edges),
+               'src_node': str(self.src_node), 'dest_node': str(self.dest_node),
+               'arrived': int(self.current_node == self.dest_node), **run_info}
+        records = []
+        for j, cost in enumerate(self.agent_total_path_cost):
+            scenario, i = divmod(j, self.num_of_different_agents)
+            agent_type = self.agent_types[i]
+            records.append({**run, 'agent_type': agent_type, 'agent': AGENT_NAMES[agent_type],
+                            'scenario': SCENARIOS[scenario], 'cost': round(60 * float(cost), 2),
+                            'running_time': self.agent_total_running_time[i] if scenario == 0 else None,
+                            'cpu_time': self.agent_total_cpu_time[i] if scenario == 0 else None,
+                            **self.agent_search_stats[j].as_dict()})
+        return records
+
+    def get_qlearning_training_row(self):
+        """
+        How the Q-learning agents trained, the columns are prefixed by the agent column in the results row:
+        episodes - training episodes used, trainings - number of find_path calls, converged - trainings stopped
+        early by convergence, capped - episodes stopped by the step cap, stop_reason - why the last training
+        stopped, final_max_delta_q - the max |delta Q| of the last episode of the last training (None if it had no
+        episodes).
+        """
         row = {}
-        n = len(self.agents)
-        # fill row with agents results
-        for i in range(n):
-            row[str(i)] = round(60 * self.agent_total_path_cost[i], 2)
+        for i, agent in enumerate(self.agents):
+            if isinstance(agent, QLearningAgent):
+                row[f'{i}_episodes'] = agent.episodes_trained - agent.warm_start_episodes
+                row[f'{i}_trainings'] = agent.num_of_trainings
+                row[f'{i}_converged'] = agent.num_of_converged
+                row[f'{i}_capped'] = agent.capped_episodes
+                row[f'{i}_stop_reason'] = agent.stop_reason
+                row[f'{i}_final_max_delta_q'] = agent.max_delta_q[-1] if agent.max_delta_q else None
+        return row
 
-        for i in range(self.num_of_different_agents):
-            row[str(i + n)] = self.agent_total_running_time[i]
+    def record_agents_results(self):
+        with ResultsStore(self.results_file) as store:
+            store.add(self.get_results_records())
 
-        add_row_to_csv(row, self.results_file)
+        training_row = self.get_qlearning_training_row()
+        if training_row:
+            add_row_to_csv(training_row, self.qlearning_training_file)
 
         # record Q learning for different parameters
         self.record_Q_learning()
@@ -201,91 +366,87 @@ class NavigationLogics:
             row[str(i + n)] = self.agent_total_running_time[i]
         add_row_to_csv(row, self.qlearning_results_file)
 
-    def find_path_of_all_agents(self, changing_time_cost, mean_time_cost, min_time_cost, max_time_cost):
-
-        for i in range(self.num_of_different_agents):
+    def save_q_tables(self):
+        # snapshot the Q-tables learned on the changing costs, so the next run on this map starts warm
+        if qlearning.QTABLE_DIR is None:
+            return
+        for agent in self.agents[:self.num_of_different_agents]:
+            if isinstance(agent, QLearningAgent):
+                agent.save_snapshot()
+
+    def find_path_of_agent(self, agent_index, edge_costs):
+        """
+        Find the path of one agent from its current node.
+
+        :return: (path, elapsed nanoseconds, cpu seconds). The elapsed time is the wall time of the search
+                 (time.perf_counter_ns), the running time of the results, the cpu time is time.process_time.
+        """
+        start_ns = time.perf_counter_ns()
+        start_cpu_time = time.process_time()
+        path = self.agents[agent_index].find_path(self.agent_current_node[agent_index], edge_costs)
+        return path, time.perf_counter_ns() - start_ns, time.process_time() - start_cpu_time
 
-            # ****** changing costs ******
+    def find_path_of_all_agents(self, changing_time_cost, mean_time_cost, min_time_cost, max_time_cost):
+        # (agent index, edge costs, traffic index the crossed edge is charged by) of every search of this tick
+        scenarios = [(0, changing_time_cost, None)]
+        if self.calculate_paths_only_once and not self.Qlearning_analysis:
+            scenarios += [(1, mean_time_cost, self.edge_traffic_mean),
+                          (2, min_time_cost, self.edge_traffic_min),
+                          (3, max_time_cost, self.edge_traffic_max)]
+        searches = [(i + scenario * self.num_of_different_agents, edge_costs, traffic_index)
+                    for i in range(self.num_of_different_agents)
+                    for scenario, edge_costs, traffic_index in scenarios]
+
+        for j, edge_costs, traffic_index in searches:
+            path, elapsed_ns, cpu_time = self.find_path_of_agent(j, edge_costs)
+            self.hooks.add_phase(self.search_phases[j], elapsed_ns)
             # update path
-            start_time = time.time()  # Start time
-            self.agent_current_d_paths[i] = \
-                self.agents[i].find_path(self.agent_current_node[i], changing_time_cost)
-            end_time = time.time()
+            self.agent_current_d_paths[j] = path
+            self.agent_search_stats[j].add(self.agents[j].stats)
 
             # update cost
-            self.agent_total_path_cost[i] += self.get_time_for_crossing_edge(
-                self.get_first_edge(self.agent_current_d_paths[i]))
-
-            # update current node
-            if self.agent_current_d_paths[i]:
-                self.agent_current_node[i] = self.agent_current_d_paths[i][0][1]
-
-            # update algo running time
-            self.agent_total_running_time[i] += end_time - start_time
-
-            if self.calculate_paths_only_once and not self.Qlearning_analysis:
-                # ****** mean costs ******
-                shift = self.num_of_different_agents
-                # update path
-                self.agent_current_d_paths[i + shift] = \
-                    self.agents[i + shift].find_path(
-                        self.agent_current_node[i + shift], mean_time_cost)
-
-                # update cost
-                self.agent_total_path_cost[i + shift] += self.get_time_for_crossing_edge(
-                    self.get_first_edge(self.agent_current_d_paths[i + shift]), self.edge_traffic_mean)
-
-                # ****** min costs ******
-                shift = 2 * self.num_of_different_agents
-                # update path
-                self.agent_current_d_paths[i + shift] = \
-                    self.agents[i + shift].find_path(
-                        self.agent_current_node[i + shift], min_time_cost)
-
-                # update cost
-                self.agent_total_path_cost[i + shift] += self.get_time_for_crossing_edge(
-                    self.get_first_edge(self.agent_current_d_paths[i + shift]), self.edge_traffic_min)
-
-                # ****** max costs ******
-                shift = 3 * self.num_of_different_agents
-                # update path
-                self.agent_current_d_paths[i + shift] = \
-                    self.agents[i + shift].find_path(
-                        self.agent_current_node[i + shift], max_time_cost)
-
-                # update cost
-                self.agent_total_path_cost[i + shift] += self.get_time_for_crossing_edge(
-                    self.get_first_edge(self.agent_current_d_paths[i + shift]), self.edge_traffic_max)
+            self.agent_total_path_cost[j] += self.get_time_for_crossing_edge(self.get_first_edge(path), traffic_index)
+
+            if j < self.num_of_different_agents:
+                # ****** changing costs ******
+                # update current node
+                if path:
+                    self.agent_current_node[j] = path[0][1]
+
+                # update algo running time
+                self.agent_total_running_time[j] += elapsed_ns / 1e9
+                self.agent_total_cpu_time[j] += cpu_time
 
         self.calculate_paths_only_once = False
 
     def update(self):
         # called in each iteration by manager::run
-        # update traffic index: draw from normal distribution
-        for edge in self.undirected_edges:
-            mean = self.edge_traffic_mean[edge]
-            std = self.edge_traffic_std[edge]
-            index = np.random.normal(mean, std)
-            index = min(MAX_TRAFFIC_INDEX, index)
-            index = max(MIN_TRAFFIC_INDEX, index)
-            self.traffic_index[edge] = index
-            n1, n2 = edge
-            opposite_edge = (n2, n1)
-            self.traffic_index[opposite_edge] = index
-
-        # find the current_d_path: self.current_node->self.dest_node, using agent
-        changing_time_cost = {edge: self.get_time_for_crossing_edge(edge) for edge in self.edges}
-        mean_time_cost = {edge: self.get_time_for_crossing_edge(edge, self.edge_traffic_mean) for edge in self.edges}
-        min_time_cost = {edge: self.get_time_for_crossing_edge(edge, self.edge_traffic_min) for edge in self.edges}
-        max_time_cost = {edge: self.get_time_for_crossing_edge(edge, self.edge_traffic_max) for edge in self.edges}
-
-        # calculate paths by each one of the agents
-        self.find_path_of_all_agents(changing_time_cost, mean_time_cost, min_time_cost, max_time_cost)
+        hooks = self.hooks
+        hooks.start_tick()
+        with hooks.phase('traffic'):
+            # update traffic index: draw from normal distribution, one draw per road for all the roads at once
+            index = np.random.normal(self.undirected_traffic_mean, self.undirected_traffic_std)
+            index = np.clip(index, MIN_TRAFFIC_INDEX, MAX_TRAFFIC_INDEX)
+            # both directions of a road share the traffic index
+            self.traffic_index = np.concatenate([index, index])
+
+        with hooks.phase('costs'):
+            # find the current_d_path: self.current_node->self.dest_node, using agent
+            changing_time_cost = self.get_time_cost(self.traffic_index)
+
+        with hooks.phase('searches'):
+            # calculate paths by each one of the agents
+            self.find_path_of_all_agents(changing_time_cost, self.mean_time_cost, self.min_time_cost,
+                                         self.max_time_cost)
 
         # save path and current node according to the requested agent (this will be forwarded to manager - shown on gui)
         self.current_d_path = self.agent_current_d_paths[self.agent_enum]
         self.current_node = self.agent_current_node[self.agent_enum]
 
         if self.current_node == self.dest_node:
-            # record all agents results into csv file
-            self.record_agents_results()
+            with hooks.phase('recording'):
+                self.save_q_tables()
+                if self.record_results:
+                    # record all agents results into csv file
+                    self.record_agents_results()
+        hooks.end_tick()
@@ -3,12 +3,52 @@ import pygame
 import networkx as nx
 import math
 from NavigationLogics import NavigationLogics
+from GraphGenerator import layout_positions
+from SpatialIndex import GridIndex
 import sys
 import time
 
+# the main loop runs at most this many frames per second
+FRAME_RATE = 30
+# when more regions than this changed, the whole frame is redrawn at once
+MAX_DIRTY_RECTS = 64
+BACKGROUND_COLOR = (255, 255, 255)
+# room in pixels around an edge for its arrowhead and info image, and around a node for its marker and label.
+# A click within EDGE_MARGIN of an edge picks it
+EDGE_MARGIN = 30
+NODE_MARGIN = 80
+# zoom factor of a mouse wheel step, the zoom range, and the pan of an arrow key in pixels
+ZOOM_STEP = 1.25
+MIN_ZOOM, MAX_ZOOM = 0.5, 64
+PAN_STEP = 50
+
+
+def point_segment_distances(point, starts, ends):
+    """
+    The distance from a point to every segment (starts[i], ends[i]), (n, 2) arrays: to the nearest point along the
+    segment, a segment with equal ends is a point.
+    """
+    point = np.asarray(point, dtype=float)
+    starts = np.asarray(starts, dtype=float)
+    directions = np.asarray(ends, dtype=float) - starts
+    lengths = np.einsum('ij,ij->i', directions, directions)
+    # where the point projects on the segment, clipped to its ends
+    t = np.einsum('ij,ij->i', point - starts, directions) / np.where(lengths > 0, lengths, 1)
+    nearest = starts + np.clip(t, 0, 1)[:, None] * directions
+    return np.hypot(*(point - nearest).T)
+
 
 class NavigationManager:
-    def __init__(self, nodes, edges, src_node, dest_node, agent_enum):
+    def __init__(self, nodes, edges, src_node, dest_node, agent_enum, nodes_positions=None, road_speed_classes=None,
+                 frame_rate=FRAME_RATE, road_speed_limits=None, road_lengths=None):
+        """
+        :param nodes_positions: Dictionary of node positions {node: (x, y)} of a map that has coordinates,
+                                None - use the (cached) layout of the graph.
+        :param road_speed_classes: Index in speed_limits of the speed limit of every edge, drawn at random if None.
+        :param frame_rate: Maximal number of frames per second of the main loop.
+        :param road_speed_limits: The speed limit (km/h) of every edge, of an imported map.
+        :param road_lengths: The length (km) of every edge, of an imported map.
+        """
         self.nodes = nodes
         self.edges = edges
         self.src_node = src_node
@@ -27,8 +67,17 @@ class NavigationManager:
         self.graph.add_nodes_from(nodes)
         self.graph.add_edges_from(edges)
 
-        # Compute the positions of the nodes using a spring layout
-        self.positions = nx.spring_layout(self.graph, seed=42)
+        # the positions of the nodes: the map's coordinates, or the layout of the graph (cached on disk)
+        if nodes_positions is None:
+            self.positions = layout_positions(nodes, edges)
+            self.layout_box = (-1, -1, 1, 1)
+        else:
+            self.positions = nodes_positions
+            coordinates = np.array(list(nodes_positions.values()), dtype=float).reshape(-1, 2)
+            self.layout_box = (*coordinates.min(axis=0), *coordinates.max(axis=0))
+        self.road_speed_classes = road_speed_classes
+        self.road_speed_limits = road_speed_limits
+        self.road_lengths = road_lengths
 
         # images
         self.car_image = pygame.image.load('images/car.png')
@@ -40,6 +89,8 @@ class NavigationManager:
         self.info_image = pygame.image.load('images/info.png')
         self.info_image = pygame.transform.scale(self.info_image, (34, 34))
 
+        # bumped whenever the visited edges change, so the edges are restyled
+        self.visited_version = 0
         self.restart_game_logics()
 
         self.next_button = pygame.Rect(10, 10, 80, 50)  # (x, y, width, height)
@@ -47,8 +98,19 @@ class NavigationManager:
         self.restart_button = pygame.Rect(410, 10, 100, 50)
         self.quit_button = pygame.Rect(520, 10, 80, 50)
 
+        self.frame_rate = frame_rate
+        # the view: screen position = layout position on the screen * zoom + pan
+        self.zoom = 1.0
+        self.pan = (0, 0)
+        self.drag_pos = None
+        self.clock = pygame.time.Clock()
+        self.button_font = pygame.font.SysFont(None, 36)
+        self.text_font = pygame.font.SysFont(None, 24)
+        self.build_render_cache()
+
     def restart_game_logics(self):
         self.visited_edges = set()
+        self.visited_version += 1
         self.colors = {edge: (0, 0, 0) for edge in self.edges}
         self.current_d_path = None
         self.current_d_edge = None
@@ -56,15 +118,18 @@ class NavigationManager:
         self.est_time = None
         self.prev_est_time = None
         self.prev_d_path = None
-        self.logics = NavigationLogics(self.nodes, self.edges, self.src_node, self.dest_node, self.positions, agent_enum=self.agent_enum)
+        self.logics = NavigationLogics(self.nodes, self.edges, self.src_node, self.dest_node, self.positions, agent_enum=self.agent_enum,
+                                       road_speed_classes=self.road_speed_classes,
+                                       road_speed_limits=self.road_speed_limits, road_lengths=self.road_lengths)
         self.popup_edge = None
         self.speed_limit = self.logics.speed_limit
         self.edge_info = {edge: "" for edge in self.edges}
 
     def update_edge_info(self):
         for edge in self.edges:
-            speed = self.speed_limit[edge]
-            practical_speed = (1 - self.logics.traffic_index[edge]) * speed
+            edge_id = self.logics.graph.edge_index[edge]
+            speed = self.speed_limit[edge_id]
+            practical_speed = (1 - self.logics.traffic_index[edge_id]) * speed
             time = self.logics.get_time_for_crossing_edge(edge)
             self.edge_info[
                 edge] = f"Speed Limit: {speed}km/h, Actual Speed: {round(practical_speed, 2)}km/h, Time to cross: {round(time * 60, 2)} min"
@@ -102,13 +167,98 @@ class NavigationManager:
                         continue
                     self.prev_est_time += self.logics.get_time_for_crossing_edge(edge)
 
-    def draw_car_on_edge(self, edge):
-        if edge is None:
-            return
-        start_pos = self.positions[edge[0]]
-        end_pos = self.positions[edge[1]]
-        start_screen_pos = self.to_screen(start_pos)
-        end_screen_pos = self.to_screen(end_pos)
+    def build_render_cache(self):
+        """
+        Pre-render what never changes and set up the dirty regions rendering.
+
+        The frame is kept in an off-screen surface. The nodes, which are drawn over the edges and only change with
+        the view, are pre-rendered to a transparent layer. On every frame only the regions that changed (edges with a
+        new color / width / arrow, the car, the buttons and the texts) are rendered again, and only they are copied
+        to the display.
+        """
+        self.frame = pygame.Surface((self.width, self.height))
+        # regions are rendered here and then copied into the frame. Clipping the drawing itself would move the
+        # pixels of the lines cut by the region's border
+        self.scratch = pygame.Surface((self.width, self.height))
+        # spatial indexes of the edges' segments and of the nodes in layout coordinates, built once per layout.
+        # Drawing only goes over what's inside the view, and clicks only test the edges near the mouse
+        self.node_ids = {node: i for i, node in enumerate(self.nodes)}
+        self.layout_xy = np.array([self.positions[node] for node in self.nodes], dtype=float).reshape(-1, 2)
+        self.edge_ends = np.array([(self.node_ids[n1], self.node_ids[n2]) for n1, n2 in self.edges],
+                                  dtype=int).reshape(-1, 2)
+        self.edges_index = GridIndex(self.layout_xy[self.edge_ends[:, 0]], self.layout_xy[self.edge_ends[:, 1]])
+        self.nodes_index = GridIndex(self.layout_xy, self.layout_xy)
+        self.nodes_layer = pygame.Surface((self.width, self.height), pygame.SRCALPHA)
+
+        # what is currently rendered into the frame
+        self.edge_styles = [self.edge_style(edge, self.colors, None) for edge in self.edges]
+        # the rendered objects themselves are kept, an id could be reused once the object is freed
+        self.rendered_state = (self.colors, None, self.visited_version, self.popup_edge)
+        self.rendered_ui = None
+        self.car = None  # (edge, rotated image, rect)
+        self.apply_view()
+        self.render_region(self.frame.get_rect())
+        self.screen.blit(self.frame, (0, 0))
+        pygame.display.flip()
+
+    def set_view(self, zoom, pan):
+        # the view is applied once, on the next frame
+        self.zoom = min(max(zoom, MIN_ZOOM), MAX_ZOOM)
+        self.pan = pan
+        self.view_changed = True
+
+    def zoom_at(self, pos, factor):
+        # zoom keeping the layout point under pos in place
+        zoom = min(max(self.zoom * factor, MIN_ZOOM), MAX_ZOOM)
+        scale = zoom / self.zoom
+        self.set_view(zoom, (pos[0] - (pos[0] - self.pan[0]) * scale, pos[1] - (pos[1] - self.pan[1]) * scale))
+
+    def apply_view(self):
+        """
+        Move everything to the current view: the screen positions of the nodes, the nodes layer (only the nodes in
+        view) and the car. The whole frame is redrawn on the next draw_graph.
+        """
+        self.screen_xy = self.to_screen(self.layout_xy)
+        self.nodes_layer.fill((0, 0, 0, 0))
+        self.draw_nodes(self.nodes_layer, self.in_view(self.nodes_index, self.frame.get_rect().inflate(
+            2 * NODE_MARGIN, 2 * NODE_MARGIN)))
+        if self.car is not None:
+            self.car = self.car_on_edge(self.car[0])
+        self.view_changed = False
+        self.full_redraw = True
+
+    def in_view(self, index, rect):
+        """The ids of the items of a spatial index that are inside a screen region."""
+        corners = self.from_screen([rect.topleft, rect.bottomright])
+        return index.query(corners.min(axis=0), corners.max(axis=0))
+
+    def screen_pos(self, node):
+        x, y = self.screen_xy[self.node_ids[node]]
+        return int(x), int(y)
+
+    def edge_rect(self, i):
+        # the screen region of an edge, with room for its arrowhead and the info image
+        (x1, y1), (x2, y2) = self.screen_pos(self.edges[i][0]), self.screen_pos(self.edges[i][1])
+        return pygame.Rect(min(x1, x2), min(y1, y2), abs(x1 - x2), abs(y1 - y2)).inflate(2 * EDGE_MARGIN,
+                                                                                         2 * EDGE_MARGIN)
+
+    def edge_at(self, mouse_pos):
+        """The edge that was clicked: the nearest edge within EDGE_MARGIN pixels of the mouse, None if there's none."""
+        if self.view_changed:
+            self.apply_view()
+        edge_ids = self.in_view(self.edges_index, pygame.Rect(mouse_pos[0] - EDGE_MARGIN, mouse_pos[1] - EDGE_MARGIN,
+                                                              2 * EDGE_MARGIN, 2 * EDGE_MARGIN))
+        if not len(edge_ids):
+            return None
+        ends = self.edge_ends[edge_ids]
+        distances = point_segment_distances(mouse_pos, self.screen_xy[ends[:, 0]], self.screen_xy[ends[:, 1]])
+        nearest = int(np.argmin(distances))
+        return self.edges[edge_ids[nearest]] if distances[nearest] <= EDGE_MARGIN else None
+
+    def car_on_edge(self, edge):
+        # the car image rotated along the edge and its screen region
+        start_screen_pos = self.screen_pos(edge[0])
+        end_screen_pos = self.screen_pos(edge[1])
 
         # Calculate the midpoint of the edge
         midpoint = ((start_screen_pos[0] + end_screen_pos[0]) // 2,
@@ -121,10 +271,7 @@ class NavigationManager:
         # Rotate the car image based on the calculated angle
         rotated_car = pygame.transform.rotate(self.car_image,
                                               angle)  # Negative angle to adjust for Pygame's rotation direction
-
-        # Blit (draw) the rotated car image at the midpoint of the edge
-        rotated_rect = rotated_car.get_rect(center=midpoint)
-        self.screen.blit(rotated_car, rotated_rect)
+        return edge, rotated_car, rotated_car.get_rect(center=midpoint)
 
     def edge_in_d_edge_list(self, edge, d_edge_list):
         if d_edge_list is not None:
@@ -135,9 +282,9 @@ class NavigationManager:
                 return n2, n1
         return None
 
-    def draw_d_arrow(self, d_edge, color):
-        start_pos = self.to_screen(self.positions[d_edge[0]])
-        end_pos = self.to_screen(self.positions[d_edge[1]])
+    def draw_d_arrow(self, surface, d_edge, color):
+        start_pos = self.screen_pos(d_edge[0])
+        end_pos = self.screen_pos(d_edge[1])
         angle = math.atan2(end_pos[1] - start_pos[1], end_pos[0] - start_pos[0])
         arrowhead_length = 15
 
@@ -148,147 +295,200 @@ class NavigationManager:
                         end_pos[1] - (arrowhead_length + 8) * math.sin(angle + math.pi / 6))
 
         # Draw the arrowhead using a polygon
-        pygame.draw.polygon(self.screen, color, [end_pos, arrow_point1, arrow_point2])
-
-    def point_near_line(point, start, end, tolerance=5):
-        """Check if a point is near a line segment with a given tolerance."""
-        line_rect = pygame.Rect(min(start[0], end[0]), min(start[1], end[1]),
-                                abs(start[0] - end[0]), abs(start[1] - end[1]))
-        if line_rect.collidepoint(point):
-            # Calculate distance from the point to the line segment
-            line_vec = pygame.Vector2(end) - pygame.Vector2(start)
-            point_vec = pygame.Vector2(point) - pygame.Vector2(start)
-            line_len = line_vec.length()
-            if line_len == 0:
-                return False
-            proj_length = line_vec.dot(point_vec) / line_len
-            if 0 <= proj_length <= line_len:
-                closest_point = start + line_vec * (proj_length / line_len)
-                distance = pygame.Vector2(point).distance_to(closest_point)
-                return distance <= tolerance
-        return False
-
-    def draw_edges(self, colors, current_d_path):
-        for edge in self.edges:
-            start_pos = self.to_screen(self.positions[edge[0]])
-            end_pos = self.to_screen(self.positions[edge[1]])
+        pygame.draw.polygon(surface, color, [end_pos, arrow_point1, arrow_point2])
+
+    def edge_style(self, edge, colors, current_d_path):
+        # (color, line width, directed edge of the arrow, show the info popup) of an edge
+        color = colors[edge]
+        line_width = 2
+        arrow = None
+
+        if self.edge_in_d_edge_list(edge, self.visited_edges):
+            # color visited in green
+            color = (0, 255, 0)
+
+        d_edge = self.edge_in_d_edge_list(edge, current_d_path)
+        if d_edge is not None:
+            # mark current planned path to dest
+            line_width = 5
             color = colors[edge]
-            line_width = 2
+            arrow = d_edge
 
-            if self.edge_in_d_edge_list(edge, self.visited_edges):
-                # color visited in green
-                color = (0, 255, 0)
+        return color, line_width, arrow, self.popup_edge == edge
 
-            d_edge = self.edge_in_d_edge_list(edge, current_d_path)
-            if d_edge is not None:
-                # mark current planned path to dest
-                line_width = 5
-                color = colors[edge]
-                self.draw_d_arrow(d_edge, color)
+    def draw_edge(self, surface, i, start_pos, end_pos):
+        edge = self.edges[i]
+        color, line_width, arrow, popup = self.edge_styles[i]
+        if arrow is not None:
+            self.draw_d_arrow(surface, arrow, color)
 
-            pygame.draw.line(self.screen, color, start_pos, end_pos, line_width)
+        pygame.draw.line(surface, color, start_pos, end_pos, line_width)
 
-            # Check if popup should be shown on this edge
-            if self.popup_edge == edge:
-                self.draw_popup(edge)
+        # Check if popup should be shown on this edge
+        if popup:
+            self.draw_popup(surface, edge)
 
-    def draw_nodes(self):
+    def draw_nodes(self, surface, node_ids):
         node_color = (50, 100, 200)  # Node color
         node_radius = 10  # Radius of nodes
-        for node in self.graph.nodes():
-            pos = self.positions[node]
-            screen_pos = self.to_screen(pos)
+        for node, screen_pos in zip((self.nodes[i] for i in node_ids), self.screen_xy[node_ids].tolist()):
 
             # Highlight src_node and dest_node with different colors or effects
             if node == self.src_node:
-                pygame.draw.circle(self.screen, node_color, screen_pos, node_radius + 16, 3)
-                self.draw_text("Starting Point", screen_pos, node_color)
-                self.screen.blit(self.start_point_image, (screen_pos[0] - 17, screen_pos[1] - 17))
+                pygame.draw.circle(surface, node_color, screen_pos, node_radius + 16, 3)
+                self.draw_text(surface, "Starting Point", screen_pos, node_color)
+                surface.blit(self.start_point_image, (screen_pos[0] - 17, screen_pos[1] - 17))
 
             elif node == self.dest_node:
-                pygame.draw.circle(self.screen, node_color, screen_pos, node_radius + 16, 3)
-                self.draw_text("Destination", screen_pos, node_color)
-                self.screen.blit(self.end_point_image, (screen_pos[0] - 17, screen_pos[1] - 17))
+                pygame.draw.circle(surface, node_color, screen_pos, node_radius + 16, 3)
+                self.draw_text(surface, "Destination", screen_pos, node_color)
+                surface.blit(self.end_point_image, (screen_pos[0] - 17, screen_pos[1] - 17))
             else:
-                pygame.draw.circle(self.screen, node_color, screen_pos, node_radius)
+                pygame.draw.circle(surface, node_color, screen_pos, node_radius)
+
+    def render_region(self, rect):
+        """
+        Render a region of the frame again, in the drawing order: background, buttons and texts, edges (color by
+        traffic & current path), car and nodes.
+        """
+        surface = self.scratch
+        surface.fill(BACKGROUND_COLOR, rect)
+        self.draw_buttons(surface)
+        self.draw_bottom_text(surface)
+        edge_ids = self.in_view(self.edges_index, rect.inflate(2 * EDGE_MARGIN + 2, 2 * EDGE_MARGIN + 2))
+        # the screen positions of the edges in view, converted at once
+        for i, (start_pos, end_pos) in zip(edge_ids.tolist(), self.screen_xy[self.edge_ends[edge_ids]].tolist()):
+            self.draw_edge(surface, i, start_pos, end_pos)
+        if self.car is not None and rect.colliderect(self.car[2]):
+            surface.blit(self.car[1], self.car[2])
+        surface.blit(self.nodes_layer, rect, rect)
+        self.frame.blit(surface, rect, rect)
 
     def draw_graph(self, colors, current_d_path, current_d_edge):
-        # Clear the screen with a white background
-        self.screen.fill((255, 255, 255))
-        self.draw_buttons()
-        self.draw_bottom_text()
-
-        # draw edges: color by traffic & mark current path
-        self.draw_edges(colors, current_d_path)
-
-        # draw car on the current edge
-        self.draw_car_on_edge(current_d_edge)
-        self.visited_edges.add(current_d_edge)
-
-        # Draw nodes: mark src & dist
-        self.draw_nodes()
+        if self.view_changed:
+            self.apply_view()
+        dirty_rects = []
+
+        # edges: only when the colors, the path, the visited edges or the popup changed, and then only the edges
+        # whose style changed
+        rendered_colors, rendered_path, rendered_version, rendered_popup = self.rendered_state
+        if not (colors is rendered_colors and current_d_path is rendered_path
+                and self.visited_version == rendered_version and self.popup_edge == rendered_popup):
+            path_edges = None if current_d_path is None else set(current_d_path)
+            for i, edge in enumerate(self.edges):
+                style = self.edge_style(edge, colors, path_edges)
+                if style != self.edge_styles[i]:
+                    self.edge_styles[i] = style
+                    dirty_rects.append(self.edge_rect(i))
+            self.rendered_state = (colors, current_d_path, self.visited_version, self.popup_edge)
+
+        # car on the current edge
+        if (self.car[0] if self.car is not None else None) != current_d_edge:
+            if self.car is not None:
+                dirty_rects.append(self.car[2])
+            self.car = None if current_d_edge is None else self.car_on_edge(current_d_edge)
+            if self.car is not None:
+                dirty_rects.append(self.car[2])
+        if current_d_edge not in self.visited_edges:
+            self.visited_edges.add(current_d_edge)
+            self.visited_version += 1
+
+        # buttons (hover) and texts
+        mouse_pos = pygame.mouse.get_pos()
+        ui = (tuple(button.collidepoint(mouse_pos) for button in
+                    (self.next_button, self.show_prev_path_button, self.restart_button, self.quit_button)),
+              self.timer, self.est_time, self.prev_est_time, self.popup_edge)
+        if ui != self.rendered_ui:
+            dirty_rects.append(pygame.Rect(0, 0, self.width, 70))
+            dirty_rects.append(pygame.Rect(0, 510, self.width, self.height - 510))
+            self.rendered_ui = ui
+
+        # the regions out of the view are left out
+        dirty_rects = [rect.clip(self.frame.get_rect()) for rect in dirty_rects]
+        dirty_rects = [rect for rect in dirty_rects if rect.width and rect.height]
+        if self.full_redraw or len(dirty_rects) > MAX_DIRTY_RECTS:
+            dirty_rects = [self.frame.get_rect()]
+            self.full_redraw = False
+        if not dirty_rects:
+            return
+        for rect in dirty_rects:
+            self.render_region(rect)
+        for rect in dirty_rects:
+            self.screen.blit(self.frame, rect, rect)
 
         # Update the display
-        pygame.display.flip()
-
-    def to_screen(self, pos):
-        """Convert position from graph layout (-1,1) range to screen coordinates."""
-        x = int((pos[0] + 1) * (self.width - 200) / 2 + 100)  # Scale and center
-        y = int((pos[1] + 1) * (self.height - 200) / 2 + 100)
-        return x, y
-
-    def draw_text(self, text, position, color):
+        pygame.display.update(dirty_rects)
+
+    def to_screen(self, positions):
+        """
+        Convert positions (an (n, 2) array) from the layout box (the (-1,1) range of a graph layout) to screen
+        coordinates in the current view.
+        """
+        min_x, min_y, max_x, max_y = self.layout_box
+        positions = np.asarray(positions, dtype=float)
+        x = (positions[..., 0] - min_x) * (self.width - 200) / max(max_x - min_x, 1e-12) + 100  # Scale and center
+        y = (positions[..., 1] - min_y) * (self.height - 200) / max(max_y - min_y, 1e-12) + 100
+        return np.stack([x * self.zoom + self.pan[0], y * self.zoom + self.pan[1]], axis=-1).astype(int)
+
+    def from_screen(self, points):
+        """Convert screen points (an (n, 2) array) in the current view back to the layout box."""
+        min_x, min_y, max_x, max_y = self.layout_box
+        points = np.asarray(points, dtype=float)
+        x = ((points[..., 0] - self.pan[0]) / self.zoom - 100) * max(max_x - min_x, 1e-12) / (self.width - 200)
+        y = ((points[..., 1] - self.pan[1]) / self.zoom - 100) * max(max_y - min_y, 1e-12) / (self.height - 200)
+        return np.stack([x + min_x, y + min_y], axis=-1)
+
+    def draw_text(self, surface, text, position, color):
         """Draw text labels near the nodes."""
-        font = pygame.font.SysFont(None, 24)
-        text_surface = font.render(text, True, color)  # Render text in black color
+        text_surface = self.text_font.render(text, True, color)  # Render text in black color
         text_rect = text_surface.get_rect(center=(position[0], position[1] - 40))  # Position text above the node
-        self.screen.blit(text_surface, text_rect)  # Draw text on the screen
+        surface.blit(text_surface, text_rect)  # Draw text on the screen
 
     def translate_traffic_into_color(self):
         colors = {}
         for edge in self.edges:
-            traffic = self.logics.traffic_index[edge]
+            traffic = self.logics.traffic_index[self.logics.graph.edge_index[edge]]
             colors[edge] = (traffic * 255, 0, 0)
         return colors
 
-    def draw_buttons(self):
+    def draw_buttons(self, surface):
         button_color = (0, 128, 255)  # Blue color
         button_hover_color = (0, 200, 255)  # Lighter blue when hovered
         text_color = (255, 255, 255)  # White color
-        font = pygame.font.SysFont(None, 36)
+        font = self.button_font
 
         # Check if the mouse is over the button
         mouse_pos = pygame.mouse.get_pos()
         if self.next_button.collidepoint(mouse_pos):
-            pygame.draw.rect(self.screen, button_hover_color, self.next_button)
+            pygame.draw.rect(surface, button_hover_color, self.next_button)
         else:
-            pygame.draw.rect(self.screen, button_color, self.next_button)
+            pygame.draw.rect(surface, button_color, self.next_button)
         if self.show_prev_path_button.collidepoint(mouse_pos):
-            pygame.draw.rect(self.screen, button_hover_color, self.show_prev_path_button)
+            pygame.draw.rect(surface, button_hover_color, self.show_prev_path_button)
         else:
-            pygame.draw.rect(self.screen, button_color, self.show_prev_path_button)
+            pygame.draw.rect(surface, button_color, self.show_prev_path_button)
         if self.restart_button.collidepoint(mouse_pos):
-            pygame.draw.rect(self.screen, button_hover_color, self.restart_button)
+            pygame.draw.rect(surface, button_hover_color, self.restart_button)
         else:
-            pygame.draw.rect(self.screen, button_color, self.restart_button)
+            pygame.draw.rect(surface, button_color, self.restart_button)
         if self.quit_button.collidepoint(mouse_pos):
-            pygame.draw.rect(self.screen, button_hover_color, self.quit_button)
+            pygame.draw.rect(surface, button_hover_color, self.quit_button)
         else:
-            pygame.draw.rect(self.screen, button_color, self.quit_button)
+            pygame.draw.rect(surface, button_color, self.quit_button)
 
         # Render the button text
         text = font.render("Next", True, text_color)
-        self.screen.blit(text, (self.next_button.x + 10, self.next_button.y + 10))
+        surface.blit(text, (self.next_button.x + 10, self.next_button.y + 10))
         text = font.render("Show Previous Path", True, text_color)
-        self.screen.blit(text, (self.show_prev_path_button.x + 10, self.show_prev_path_button.y + 10))
+        surface.blit(text, (self.show_prev_path_button.x + 10, self.show_prev_path_button.y + 10))
         text = font.render("Restart", True, text_color)
-        self.screen.blit(text, (self.restart_button.x + 10, self.restart_button.y + 10))
+        surface.blit(text, (self.restart_button.x + 10, self.restart_button.y + 10))
         text = font.render("Quit", True, text_color)
-        self.screen.blit(text, (self.quit_button.x + 10, self.quit_button.y + 10))
+        surface.blit(text, (self.quit_button.x + 10, self.quit_button.y + 10))
 
-    def draw_bottom_text(self):
+    def draw_bottom_text(self, surface):
 
-        font = pygame.font.SysFont(None, 24)
+        font = self.text_font
         color = (0, 0, 0)
 
         # --- timers text ---
@@ -296,7 +496,7 @@ class NavigationManager:
         timer_text = f"Time: {round(self.timer * 60, 2)} minutes"
         timer_surface = font.render(timer_text, True, color)
         timer_rect = timer_surface.get_rect(topleft=(10, 520))  # Set 'topleft' to align left side
-        self.screen.blit(timer_surface, timer_rect)
+        surface.blit(timer_surface, timer_rect)
 
         # Render the estimated arrival time text
         if self.est_time is not None:
@@ -306,7 +506,7 @@ class NavigationManager:
                 color = (255, 0, 0)
             est_timer_surface = font.render(est_timer_text, True, color)
             est_timer_rect = est_timer_surface.get_rect(topleft=(10, 550))  # Aligns with the same left position
-            self.screen.blit(est_timer_surface, est_timer_rect)
+            surface.blit(est_timer_surface, est_timer_rect)
 
         # --- edge info text ---
         color = (0, 0, 0)
@@ -317,24 +517,14 @@ class NavigationManager:
             edge_info_text += "Press edge for info"
         edge_info_surface = font.render(edge_info_text, True, color)
         edge_info_rect = timer_surface.get_rect(topleft=(10, 580))
-        self.screen.blit(edge_info_surface, edge_info_rect)
+        surface.blit(edge_info_surface, edge_info_rect)
 
-    def is_mouse_near_edge(self, mouse_pos, edge):
-        n1, n2 = edge
-        x1, y1 = self.to_screen(self.positions[n1])
-        x2, y2 = self.to_screen(self.positions[n2])
-
-        # calculate the distance between the mouse position and the middle of ths edge
-        middle_edge_x, middle_edge_y = abs((x1 + x2)/2), abs((y1 + y2)/2)
-        distance = math.sqrt((middle_edge_x - mouse_pos[0])**2 + (middle_edge_y - mouse_pos[1])**2)
-        return distance < 5
-
-    def draw_popup(self, edge):
+    def draw_popup(self, surface, edge):
         # Get the midpoint of the edge
-        start_pos = self.to_screen(self.positions[edge[0]])
-        end_pos = self.to_screen(self.positions[edge[1]])
+        start_pos = self.screen_pos(edge[0])
+        end_pos = self.screen_pos(edge[1])
         midpoint = ((start_pos[0] + end_pos[0]) // 2, (start_pos[1] + end_pos[1]) // 2)
-        self.screen.blit(self.info_image, (midpoint[0] - 20, midpoint[1] - 20))
+        surface.blit(self.info_image, (midpoint[0] - 20, midpoint[1] - 20))
 
 
     def run(self):
@@ -346,7 +536,27 @@ class NavigationManager:
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
                     quit_pressed = True
-                elif event.type == pygame.MOUSEBUTTONDOWN:
+                elif event.type == pygame.MOUSEWHEEL:
+                    self.zoom_at(pygame.mouse.get_pos(), ZOOM_STEP ** event.y)
+                elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 3:
+                    # pan by dragging with the right button
+                    self.drag_pos = event.pos
+                elif event.type == pygame.MOUSEBUTTONUP and event.button == 3:
+                    self.drag_pos = None
+                elif event.type == pygame.MOUSEMOTION and self.drag_pos is not None:
+                    self.set_view(self.zoom, (self.pan[0] + event.rel[0], self.pan[1] + event.rel[1]))
+                elif event.type == pygame.KEYDOWN:
+                    if event.key == pygame.K_LEFT:
+                        self.set_view(self.zoom, (self.pan[0] + PAN_STEP, self.pan[1]))
+                    elif event.key == pygame.K_RIGHT:
+                        self.set_view(self.zoom, (self.pan[0] - PAN_STEP, self.pan[1]))
+                    elif event.key == pygame.K_UP:
+                        self.set_view(self.zoom, (self.pan[0], self.pan[1] + PAN_STEP))
+                    elif event.key == pygame.K_DOWN:
+                        self.set_view(self.zoom, (self.pan[0], self.pan[1] - PAN_STEP))
+                    elif event.key == pygame.K_HOME:
+                        self.set_view(1.0, (0, 0))
+                elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
                     if self.next_button.collidepoint(event.pos):
                         next_pressed = True
                     elif self.show_prev_path_button.collidepoint(event.pos):
@@ -361,13 +571,12 @@ class NavigationManager:
                         next_pressed = False
                     else:
                         # Check if any edge was clicked
-                        for edge in self.edges:
-                            if self.is_mouse_near_edge(event.pos, edge):
-                                self.popup_edge = edge
-                                self.draw_graph(self.colors, self.current_d_path, self.current_d_edge)
-                                time.sleep(2)
-                                self.popup_edge = None
-                                break
+                        edge = self.edge_at(event.pos)
+                        if edge is not None:
+                            self.popup_edge = edge
+                            self.draw_graph(self.colors, self.current_d_path, self.current_d_edge)
+                            time.sleep(2)
+                            self.popup_edge = None
 
             if next_pressed and got_to_dest:
                 self.update_timer()
@@ -406,28 +615,7 @@ class NavigationManager:
                 self.update_edge_info()
 
             self.draw_graph(self.colors, self.current_d_path, self.current_d_edge)
+            # idle frames are cheap (nothing to redraw), the cap keeps the loop from spinning a core
+            self.clock.tick(self.frame_rate)
         pygame.quit()
         sys.exit()
-
-
-def run_random_graph():
-    i = np.random.choice(25) + 2
-    nodes = [j for j in range(i)]
-    edges = []
-    for i in range(len(nodes)):
-        for j in range(len(nodes)):
-            coin = int(np.random.choice([0, 1]))
-            if i < j and coin == 0:
-                edges.append((nodes[i], nodes[j]))
-
-    src = np.random.choice(nodes)
-    nodes.remove(src)
-    dest = np.random.choice(nodes)
-    nodes.append(src)
-
-    if (src, dest) not in edges:
-        edges.append((src, dest))
-
-    return nodes, edges, src, dest
-
-
@@ -0,0 +1,322 @@
+import argparse
+import csv
+import itertools
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from agents.QLearningAgent import QLearningAgent
+from agents.agent import QLEARNING
+from BatchRunner import episode_seeds, MAX_TICKS_PER_NODE
+from GraphGenerator import run_random_graph, spring_positions
+from NavigationLogics import NavigationLogics, max_speed_limit, MIN_TRAFFIC_INDEX, MAX_TRAFFIC_INDEX, add_rows_to_csv
+
+SWEEP_RESULTS_FILE = 'Qlearning_sweep_results.csv'
+# the source column of the sweep rows: run by run_sweep, or imported from a legacy parameter results csv
+SWEEP_SOURCE = 'sweep'
+LEGACY_SOURCE = 'legacy'
+
+# the swept parameters: the QLearningAgent hyperparameters and the number of training episodes
+SWEEP_PARAMETERS = ('learning_rate', 'discount_factor', 'exploration_rate', 'episodes')
+PARAMETER_GRID = {
+    'learning_rate': [0.4, 0.5, 0.6, 0.7, 0.8, 0.9],
+    'discount_factor': [0.4, 0.5, 0.6, 0.7, 0.8, 0.9],
+    'exploration_rate': [0.05, 0.1, 0.2, 0.3],
+    'episodes': [100],
+}
+# the values of the parameter of every column of the legacy parameter results csvs (one Q-learning agent per value,
+# the other parameters at the QLearningAgent defaults). The csvs don't record them, they're read off the legends of
+# the figures made from the csvs (graphs/<parameter>1.png)
+LEGACY_PARAMETER_VALUES = {
+    'learning_rate': [0.4, 0.5, 0.6, 0.7, 0.8, 0.9],
+    'discount_factor': [0.4, 0.5, 0.6, 0.7, 0.8, 0.9],
+    'exploration_rate': [0.01, 0.1, 0.2, 0.3, 0.4, 0.5],
+}
+LEGACY_DEFAULTS = {'learning_rate': 0.9, 'discount_factor': 0.9, 'exploration_rate': 0.1, 'episodes': 100}
+
+
+def _load_map(seed, graph):
+    np.random.seed(seed)
+    random.seed(seed)
+    if graph is None:
+        nodes, edges, src, dest = run_random_graph()
+        return nodes, edges, src, dest, spring_positions(nodes, edges), None
+    return tuple(graph[:5]) + (graph[5] if len(graph) > 5 else None,)
+
+
+def greedy_path_cost(agent, start_node, edge_costs):
+    # cost of the greedy path of the agent, inf if it doesn't reach the goal
+    path = agent.greedy_path(start_node)
+    if path is None:
+        return float('inf')
+    return float(sum(edge_costs[agent.graph.edge_index[edge]] for edge in path))
+
+
+def warm_start_experiment(seed, snapshot_dir, episodes=100, graph=None):
+    """
+    Compare a cold start with a warm start of Q-learning on a new run of the same map.
+
+    A first run trains on the mean traffic and saves its snapshot. A new run draws the traffic again:
+    the cold agent trains all the episodes from scratch, the warm agent loads the snapshot and trains one episode
+    at a time until its greedy path is as cheap as the cold agent's one (at most the episodes the cold agent used).
+
+    :param seed: Seed of the map and the traffic.
+    :param snapshot_dir: Directory the snapshot is saved to.
+    :param episodes: The maximal number of training episodes of a cold start.
+    :param graph: (nodes, edges, src_node, dest_node, nodes_positions[, speed_classes]) to run on, a random graph
+                  if None.
+    :return: Dictionary with the episodes and wall time of both starts and what the warm start saved.
+    """
+    nodes, edges, src, dest, positions, speed_classes = _load_map(seed, graph)
+    logics = NavigationLogics(nodes, edges, src, dest, positions, agent_types=[QLEARNING], record_results=False,
+                              road_speed_classes=speed_classes)
+
+    # *** first run ***
+    first_run = QLearningAgent(dest, logics.graph, positions, max_speed_limit)
+    first_run.train(src, logics.mean_time_cost, episodes)
+    snapshot = first_run.save_snapshot(first_run.snapshot_path(snapshot_dir))
+
+    # *** new run, traffic drawn like NavigationLogics.update does ***
+    index = np.clip(np.random.normal(logics.undirected_traffic_mean, logics.undirected_traffic_std),
+                    MIN_TRAFFIC_INDEX, MAX_TRAFFIC_INDEX)
+    edge_costs = logics.get_time_cost(np.concatenate([index, index]))
+
+    cold = QLearningAgent(dest, logics.graph, positions, max_speed_limit)
+    cold.train(src, edge_costs, episodes)
+    cold_episodes, cold_time = cold.episodes_used, cold.training_time
+    cold_cost = greedy_path_cost(cold, src, edge_costs)
+
+    # the wall time of a warm start is loading the snapshot and the episodes it trained, the checks of the greedy
+    # path after every episode are part of the experiment only
+    warm = QLearningAgent(dest, logics.graph, positions, max_speed_limit)
+    start_time = time.time()
+    warm.load_snapshot(snapshot)
+    load_time = time.time() - start_time
+    warm_episodes = 0
+    while warm_episodes < cold_episodes and greedy_path_cost(warm, src, edge_costs) > cold_cost + 1e-9:
+        warm.train(src, edge_costs, 1)
+        warm_episodes += 1
+    warm_time = load_time + warm.training_time - warm.warm_start_time
+
+    return {'seed': seed, 'num_of_nodes': len(nodes), 'cold_episodes': cold_episodes, 'warm_episodes': warm_episodes,
+            'episodes_saved': cold_episodes - warm_episodes, 'cold_time': cold_time, 'warm_time': warm_time,
+            'time_saved': cold_time - warm_time, 'cold_cost': cold_cost,
+            'warm_cost': greedy_path_cost(warm, src, edge_costs)}
+
+
+def run_warm_start_experiments(num_of_runs, seed=0, episodes=100, snapshot_dir=None):
+    """
+    Run warm_start_experiment on independent random maps.
+
+    :param snapshot_dir: Directory of the snapshots, a temporary directory if None.
+    :return: List of the results of the runs.
+    """
+    if snapshot_dir is None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            return run_warm_start_experiments(num_of_runs, seed, episodes, tmp_dir)
+    return [warm_start_experiment(run_seed, snapshot_dir, episodes) for run_seed in episode_seeds(num_of_runs, seed)]
+
+
+def grid_configs(grid=None):
+    """
+    Grid search: every combination of the parameter values.
+
+    :param grid: Dictionary {parameter: list of values}, a missing parameter gets the QLearningAgent default.
+                 Defaults to PARAMETER_GRID.
+    :return: List of the configurations, every one a dictionary {parameter: value}.
+    """
+    grid = PARAMETER_GRID if grid is None else grid
+    parameters = [parameter for parameter in SWEEP_PARAMETERS if parameter in grid]
+    return [dict(zip(parameters, values)) for values in itertools.product(*(grid[p] for p in parameters))]
+
+
+def random_configs(num_of_configs, grid=None, seed=0):
+    """
+    Random search: every parameter is drawn uniformly between the lowest and the highest value of the grid
+    (the episodes are drawn as integers).
+
+    :param num_of_configs: Number of configurations to draw.
+    :param grid: Dictionary {parameter: list of values}, defaults to PARAMETER_GRID.
+    :param seed: Seed of the draws.
+    :return: List of the configurations, every one a dictionary {parameter: value}.
+    """
+    grid = PARAMETER_GRID if grid is None else grid
+    rng = np.random.default_rng(seed)
+    configs = []
+    for _ in range(num_of_configs):
+        config = {}
+        for parameter in SWEEP_PARAMETERS:
+            if parameter not in grid:
+                continue
+            low, high = min(grid[parameter]), max(grid[parameter])
+            if parameter == 'episodes':
+                config[parameter] = int(rng.integers(low, high + 1))
+            else:
+                config[parameter] = round(float(rng.uniform(low, high)), 4)
+        configs.append(config)
+    return configs
+
+
+def run_sweep_simulation(seed, config, graph=None):
+    """
+    Run one simulation driven by a single Q-learning agent with the given configuration.
+    Every configuration run with the same seed sees the same map and the same traffic.
+
+    :param seed: Seed of the map and the traffic.
+    :param config: Dictionary of QLearningAgent keyword arguments (see SWEEP_PARAMETERS).
+    :param graph: (nodes, edges, src_node, dest_node, nodes_positions[, speed_classes]) to run on, a random graph
+                  if None.
+    :return: The tidy result row: the source, the seed, the configuration and the outcome of the simulation.
+    """
+    nodes, edges, src, dest, positions, speed_classes = _load_map(seed, graph)
+    logics = NavigationLogics(nodes, edges, src, dest, positions, Qlearning_analysis=True, qlearning_params=[config],
+                              record_results=False, road_speed_classes=speed_classes)
+    ticks = 0
+    max_ticks = MAX_TICKS_PER_NODE * max(len(nodes), 1)
+    while logics.current_node != dest and ticks < max_ticks:
+        logics.update()
+        ticks += 1
+        if logics.current_d_path is None:
+            break  # no path to the destination
+
+    agent = logics.agents[0]
+    row = {'source': SWEEP_SOURCE, 'seed': seed, 'num_of_nodes': len(nodes)}
+    for parameter in SWEEP_PARAMETERS:
+        row[parameter] = config.get(parameter, getattr(agent, parameter))
+    row.update({'arrived': logics.current_node == dest, 'ticks': ticks,
+                'cost': round(60 * logics.agent_total_path_cost[0], 2),
+                'running_time': logics.agent_total_running_time[0],
+                'episodes_used': agent.episodes_trained, 'trainings': agent.num_of_trainings,
+                'converged': agent.num_of_converged, 'capped': agent.capped_episodes,
+                'stop_reason': agent.stop_reason,
+                'final_max_delta_q': agent.max_delta_q[-1] if agent.max_delta_q else None,
+                'legacy_file': None, 'legacy_row': None})
+    return row
+
+
+def _run_sweep_simulations(tasks):
+    # worker entry point - runs a chunk of (seed, config, graph) simulations
+    return [run_sweep_simulation(seed, config, graph) for seed, config, graph in tasks]
+
+
+def run_sweep(configs, num_of_maps, workers=None, seed=0, graphs=None, chunk_size=16,
+              results_file=SWEEP_RESULTS_FILE):
+    """
+    Run every configuration on the same sampled maps and traffic, spread over a process pool.
+
+    :param configs: List of configurations, see grid_configs and random_configs.
+    :param num_of_maps: Number of maps every configuration runs on.
+    :param workers: Number of worker processes, defaults to the number of cpus. 1 runs in this process.
+    :param seed: Seed of the sweep, the maps seeds are derived from it.
+    :param graphs: List of (nodes, edges, src_node, dest_node, nodes_positions[, speed_classes]) used round robin
+                   by the maps, random graphs if None.
+    :param chunk_size: Number of simulations sent to a worker at once.
+    :param results_file: Csv file the tidy rows are appended to, one row per map and configuration,
+                         None - don't write.
+    :return: List of the tidy rows, ordered by configuration and then by map.
+    """
+    workers = workers or os.cpu_count() or 1
+    seeds = episode_seeds(num_of_maps, seed)
+    tasks = [(map_seed, config, graphs[i % len(graphs)] if graphs else None)
+             for config in configs for i, map_seed in enumerate(seeds)]
+    chunks = [tasks[i:i + chunk_size] for i in range(0, len(tasks), chunk_size)]
+
+    if workers == 1:
+        chunk_results = list(map(_run_sweep_simulations, chunks))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            chunk_results = list(executor.map(_run_sweep_simulations, chunks))
+
+    rows = [row for chunk in chunk_results for row in chunk]
+    if results_file is not None:
+        add_rows_to_csv(rows, results_file)
+    return rows
+
+
+def import_parameter_results_csv(file_path, parameter, values=None, results_file=SWEEP_RESULTS_FILE):
+    """
+    Convert a legacy parameter results csv (the Qlearning_analysis output of NavigationLogics.record_Q_learning:
+    the cost of every Q-learning agent, then its running time, one row per run) into tidy sweep rows.
+
+    The rows are marked as LEGACY_SOURCE. The legacy runs have no seed, a run is named by the name of the file and
+    its row number (the legacy_file and legacy_row columns), the runs of different files are different maps. The
+    columns the legacy format doesn't have are left empty. The source files are kept, so the conversion can be
+    checked and run again.
+
+    :param parameter: The parameter the agents of the file differ in.
+    :param values: The value of the parameter of every agent, defaults to LEGACY_PARAMETER_VALUES[parameter].
+    :param results_file: Csv file the tidy rows are appended to, None - don't write.
+    :return: List of the tidy rows.
+    """
+    values = LEGACY_PARAMETER_VALUES[parameter] if values is None else values
+    legacy_file = os.path.basename(file_path)
+    rows = []
+    with open(file_path, newline='') as file:
+        for i, row in enumerate(csv.DictReader(file)):
+            for j, value in enumerate(values):
+                config = {**LEGACY_DEFAULTS, parameter: value}
+                rows.append({'source': LEGACY_SOURCE, 'seed': None, 'num_of_nodes': None,
+                             **{name: config[name] for name in SWEEP_PARAMETERS},
+                             'arrived': True, 'ticks': None, 'cost': float(row[str(j)]),
+                             'running_time': float(row[str(j + len(values))]), 'episodes_used': None,
+                             'trainings': None, 'converged': None, 'capped': None, 'stop_reason': None,
+                             'final_max_delta_q': None, 'legacy_file': legacy_file, 'legacy_row': i})
+    if results_file is not None:
+        add_rows_to_csv(rows, results_file)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Q-learning experiments.')
+    subparsers = parser.add_subparsers(dest='experiment', required=True)
+
+    warm_start = subparsers.add_parser('warm-start', help='Episodes and time saved by warm starting from snapshots')
+    warm_start.add_argument('-n', type=int, default=100, help='Number of runs')
+    warm_start.add_argument('-s', type=int, default=0, help='Seed of the runs')
+    warm_start.add_argument('-e', type=int, default=100, help='Training episodes of a cold start')
+    warm_start.add_argument('-d', default=None, help='Directory of the Q-table snapshots (default: temporary)')
+
+    sweep = subparsers.add_parser('sweep', help='Hyperparameter sweep')
+    sweep.add_argument('-n', type=int, default=30, help='Number of maps every configuration runs on')
+    sweep.add_argument('-s', type=int, default=0, help='Seed of the sweep')
+    sweep.add_argument('-w', type=int, default=None, help='Number of worker processes (default: number of cpus)')
+    sweep.add_argument('-r', type=int, default=None,
+                       help='Random search of this many configurations within the values ranges (default: grid)')
+    for parameter in SWEEP_PARAMETERS:
+        value_type = int if parameter == 'episodes' else float
+        sweep.add_argument(f"--{parameter.replace('_', '-')}", type=value_type, nargs='+',
+                           default=PARAMETER_GRID[parameter], help=f'Values of {parameter}')
+    sweep.add_argument('-o', default=SWEEP_RESULTS_FILE, help='Csv file the results are appended to')
+
+    legacy = subparsers.add_parser('import', help='Convert a legacy parameter results csv into sweep rows')
+    legacy.add_argument('file', help='The legacy csv, a cost column and a running time column per agent')
+    legacy.add_argument('parameter', choices=list(LEGACY_PARAMETER_VALUES), help='The parameter the agents differ in')
+    legacy.add_argument('--values', type=float, nargs='+', default=None,
+                        help='The value of every agent (default: the values of the legacy experiments)')
+    legacy.add_argument('-o', default=SWEEP_RESULTS_FILE, help='Csv file the rows are appended to')
+    args = parser.parse_args()
+
+    start_time = time.time()
+    if args.experiment == 'warm-start':
+        results = run_warm_start_experiments(args.n, seed=args.s, episodes=args.e, snapshot_dir=args.d)
+        episodes_saved = sum(result['episodes_saved'] for result in results)
+        cold_episodes = sum(result['cold_episodes'] for result in results)
+        time_saved = sum(result['time_saved'] for result in results)
+        cold_time = sum(result['cold_time'] for result in results)
+        print(f"warm start over {len(results)} runs: saved {episodes_saved} of {cold_episodes} training "
+              f"episodes, {round(time_saved, 3)} of {round(cold_time, 3)} seconds")
+    elif args.experiment == 'import':
+        rows = import_parameter_results_csv(args.file, args.parameter, args.values, results_file=args.o)
+        print(f"{len(rows)} rows appended to {args.o}")
+    else:
+        grid = {parameter: getattr(args, parameter) for parameter in SWEEP_PARAMETERS}
+        configs = grid_configs(grid) if args.r is None else random_configs(args.r, grid, seed=args.s)
+        rows = run_sweep(configs, args.n, workers=args.w, seed=args.s, results_file=args.o)
+        print(f"{len(configs)} configurations on {args.n} maps ({len(rows)} simulations) in "
+              f"{round(time.time() - start_time, 2)} seconds, results appended to {args.o}")
+
+
+if __name__ == '__main__':
+    main()
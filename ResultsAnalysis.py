@@ -1,9 +1,17 @@
-from navigation_logics import RESULTS_FILE, QLEARNING_RESULT_FILE
-import pandas as pd
+import argparse
+import csv
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from NavigationLogics import RESULTS_FILE
+from ResultsStore import ResultsStore, SCENARIOS, CHUNK_SIZE, LEGACY_RESULTS_CSV, migrate_legacy_results
+from QLearningExperiments import SWEEP_RESULTS_FILE
+from agents.agent import AGENT_NAMES
+import matplotlib
 import matplotlib.pyplot as plt
 import numpy as np
 
-# Define constants for column names
+# Define constants for the agent types and the y_values positions
 ASTAR__ZERO_H = 0
 ASTAR__AERIAL_DIST_H = 1
 ASTAR__DIJKSTRA_H = 2
@@ -18,70 +26,245 @@ MIN_SHIFT = 2 * NUM_OF_ALGOS
 MAX_SHIFT = 3 * NUM_OF_ALGOS
 RUNTIME_SHIFT = 4 * NUM_OF_ALGOS
 
-NUM_OF_QLEARNERS = 6
-
-def read_results():
-    # reads the CSV file
-    file_path = RESULTS_FILE
-    df = pd.read_csv(file_path)
-
-    # get results
-    y_values = []
-    # results of changing traffic
-    for i in range(NUM_OF_ALGOS):
-        y_values.append(df[str(i)])
-
-    # results of mean traffic
-    for i in range(NUM_OF_ALGOS):
-        y_values.append(df[str(i + MEAN_SHIFT)])
-
-    # results of min traffic
-    for i in range(NUM_OF_ALGOS):
-        y_values.append(df[str(i + MIN_SHIFT)])
-
-    # result of max traffic
-    for i in range(NUM_OF_ALGOS):
-        y_values.append(df[str(i + MAX_SHIFT)])
-
-    # result of running time
-    for i in range(NUM_OF_ALGOS):
-        y_values.append(df[str(i + RUNTIME_SHIFT)])
-
-    return y_values
-
-def read_Q_learners_results():
-    # reads the CSV file
-    file_path = QLEARNING_RESULT_FILE
-    df = pd.read_csv(file_path)
+QLEARNERS_COLORS = ['cornflowerblue', 'lightgreen', 'orangered', 'orange', 'hotpink', 'mediumpurple']
+AGENT_LABELS = ['A star - Zero heuristic', 'A star - Arial dist heuristic', 'A star - Dijkstra heuristic',
+                'A star - Combination heuristic', 'A star - Non-admissible heuristic', 'Q learning']
+
+# directory the figures are written to
+GRAPHS_DIR = 'graphs'
+# the sample figures plot the first runs only
+MAX_SAMPLES = 150
+# the agent the others are compared with in the win rate, it finds the cheapest path of the known costs
+REFERENCE_AGENT = ASTAR__ZERO_H
+# the approximate percentiles come from a histogram of log spaced bins, about 2% wide, between these values
+HISTOGRAM_RANGE = (1e-6, 1e8)
+BINS_PER_DECADE = 100
+PERCENTILES = (50, 90, 99)
+# the metrics summarized per agent and scenario, e.g. the expansions a heuristic saves
+METRICS = ('cost', 'running_time', 'expansions', 'heuristic_evaluations')
+
+
+class RunningStats:
+    def __init__(self):
+        """
+        Aggregates of a stream of values that are updated a chunk at a time, in constant memory: the count, mean
+        and variance (merged with Chan's parallel formula), the min and max and a log spaced histogram for the
+        approximate percentiles.
+        """
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0  # sum of the squared differences from the mean
+        self.minimum = np.inf
+        self.maximum = -np.inf
+        num_of_decades = np.log10(HISTOGRAM_RANGE[1]) - np.log10(HISTOGRAM_RANGE[0])
+        # first and last bins are below and above the range
+        self.histogram = np.zeros(int(num_of_decades * BINS_PER_DECADE) + 2, dtype=np.int64)
+
+    def add(self, values):
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+        count = len(values)
+        mean = values.mean()
+        m2 = ((values - mean) ** 2).sum()
+        delta = mean - self.mean
+        total = self.count + count
+        self.mean += delta * count / total
+        self.m2 += m2 + delta ** 2 * self.count * count / total
+        self.count = total
+        self.minimum = min(self.minimum, values.min())
+        self.maximum = max(self.maximum, values.max())
+
+        bins = np.floor((np.log10(np.maximum(values, HISTOGRAM_RANGE[0] / 10)) - np.log10(HISTOGRAM_RANGE[0])) *
+                        BINS_PER_DECADE).astype(np.int64) + 1
+        self.histogram += np.bincount(np.clip(bins, 0, len(self.histogram) - 1), minlength=len(self.histogram))
+
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    def percentile(self, q):
+        # the geometric middle of the bin of the q-th percentile, exact for the min and max bins
+        if not self.count:
+            return np.nan
+        i = int(np.searchsorted(np.cumsum(self.histogram), q / 100 * self.count))
+        if i == 0:
+            return self.minimum
+        if i == len(self.histogram) - 1:
+            return self.maximum
+        value = HISTOGRAM_RANGE[0] * 10 ** ((i - 0.5) / BINS_PER_DECADE)
+        return float(np.clip(value, self.minimum, self.maximum))
+
+
+def read_run_chunks(file_path=RESULTS_FILE, columns=('run_id', 'agent_type', 'scenario', *METRICS),
+                    chunk_size=CHUNK_SIZE):
+    """
+    Stream the records of the arrived runs of a results store, in chunks of whole runs: the records of a run were
+    added together, and the run cut by the end of a chunk is moved to the next one.
+
+    :return: Generator of dictionaries {column: array}.
+    """
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(file_path)
+    columns = list(columns)
+    carry = None
+    with ResultsStore(file_path) as store:
+        for chunk in store.read_chunks(columns, where='arrived = 1', chunk_size=chunk_size):
+            if carry is not None:
+                chunk = {name: np.concatenate([carry[name], chunk[name]]) for name in columns}
+            last = chunk['run_id'] == chunk['run_id'][-1]
+            carry = {name: values[last] for name, values in chunk.items()}
+            if not last.all():
+                yield {name: values[~last] for name, values in chunk.items()}
+    if carry is not None:
+        yield carry
+
+
+def scenario_codes(scenarios):
+    # the index in SCENARIOS of every scenario name
+    names, inverse = np.unique(scenarios, return_inverse=True)
+    return np.array([SCENARIOS.index(name) for name in names], dtype=np.int64)[inverse]
+
+
+def summarize_results(file_path=RESULTS_FILE, chunk_size=CHUNK_SIZE):
+    """
+    Summarize a results store in one pass over chunks, in memory that doesn't depend on the number of records.
+
+    :return: Dictionary {(agent_type, scenario): summary} with a RunningStats of every metric in METRICS, and
+             the wins and comparisons against REFERENCE_AGENT: a run is a win if the agent is as cheap as the
+             reference agent in the same scenario.
+    """
+    summary = {}
+    for chunk in read_run_chunks(file_path, chunk_size=chunk_size):
+        runs, run_ids = np.unique(chunk['run_id'], return_inverse=True)
+        scenarios = scenario_codes(chunk['scenario'])
+        agent_types = chunk['agent_type'].astype(np.int64)
+        cost = chunk['cost']
+
+        # the reference cost of every run and scenario
+        reference = np.full((len(runs), len(SCENARIOS)), np.nan)
+        is_reference = agent_types == REFERENCE_AGENT
+        reference[run_ids[is_reference], scenarios[is_reference]] = cost[is_reference]
+        reference = reference[run_ids, scenarios]
+        compared = ~np.isnan(reference)
+        wins = compared & (cost <= reference + 1e-9)
+
+        groups, group_ids = np.unique(agent_types * len(SCENARIOS) + scenarios, return_inverse=True)
+        for g, group in enumerate(groups):
+            in_group = group_ids == g
+            key = (int(group // len(SCENARIOS)), SCENARIOS[group % len(SCENARIOS)])
+            if key not in summary:
+                summary[key] = {'wins': 0, 'compared': 0, **{metric: RunningStats() for metric in METRICS}}
+            for metric in METRICS:
+                summary[key][metric].add(chunk[metric][in_group])
+            summary[key]['wins'] += int(wins[in_group].sum())
+            summary[key]['compared'] += int(compared[in_group].sum())
+    return summary
+
+
+def summary_rows(summary):
+    # one tidy row per agent, scenario and metric
+    rows = []
+    for (agent_type, scenario), group in sorted(summary.items(), key=lambda item: (item[0][0],
+                                                                                   SCENARIOS.index(item[0][1]))):
+        for metric in METRICS:
+            stats = group[metric]
+            if not stats.count:
+                continue
+            row = {'agent': AGENT_NAMES.get(agent_type, agent_type), 'scenario': scenario, 'metric': metric,
+                   'count': stats.count, 'mean': float(stats.mean), 'std': float(np.sqrt(stats.variance())),
+                   'min': float(stats.minimum), 'max': float(stats.maximum)}
+            row.update({f'p{q}': stats.percentile(q) for q in PERCENTILES})
+            row['win_rate'] = group['wins'] / group['compared'] if group['compared'] else np.nan
+            rows.append(row)
+    return rows
+
+
+def read_results(file_path=RESULTS_FILE, max_samples=MAX_SAMPLES):
+    """
+    The samples of the sample figures: the first max_samples runs of all the gui agents, streamed, so only they
+    are read.
+
+    :return: y_values - the cost of every agent in the changing, mean, min and max scenarios (see the shift
+             constants), then the running time of every agent.
+    """
+    samples = []
+    for chunk in read_run_chunks(file_path):
+        runs, first, run_ids = np.unique(chunk['run_id'], return_index=True, return_inverse=True)
+        values = np.full((len(runs), 5 * NUM_OF_ALGOS), np.nan)
+        gui_agent = chunk['agent_type'].astype(np.int64) < NUM_OF_ALGOS
+        scenarios = scenario_codes(chunk['scenario'][gui_agent])
+        agent_types = chunk['agent_type'][gui_agent].astype(np.int64)
+        values[run_ids[gui_agent], scenarios * NUM_OF_ALGOS + agent_types] = chunk['cost'][gui_agent]
+        changing = scenarios == 0
+        values[run_ids[gui_agent][changing], RUNTIME_SHIFT + agent_types[changing]] = \
+            chunk['running_time'][gui_agent][changing]
+
+        # in run order, the runs of all the gui agents
+        values = values[np.argsort(first)]
+        samples.append(values[~np.isnan(values).any(axis=1)])
+        if sum(len(values) for values in samples) >= max_samples:
+            break
+
+    samples = np.concatenate(samples)[:max_samples] if samples else np.zeros((0, 5 * NUM_OF_ALGOS))
+    return list(samples.T)
+
+
+def read_Q_learners_results(parameter='learning_rate', file_path=SWEEP_RESULTS_FILE):
+    """
+    Stream the sweep csv, one row per map and configuration, averaging the cost and running time of every map and
+    value of the parameter over the other parameters of the sweep. A map is a seed of the sweep, or a run of an
+    imported legacy csv (its legacy_file and legacy_row). Only the maps the parameter was varied on are kept, e.g.
+    the imported legacy runs of another parameter are left out.
+
+    :return: (values of the parameter, y_values - the cost of every value, then the running time of every value).
+    """
+    sums = {}  # (seed, value) -> [cost sum, running time sum, count]
+    seeds, values = {}, {}  # the maps in order of appearance, the values sorted
+    with open(file_path, newline='') as file:
+        for row in csv.DictReader(file):
+            seed, value = (row['seed'], row.get('legacy_file'), row.get('legacy_row')), float(row[parameter])
+            seeds.setdefault(seed, len(seeds))
+            values.setdefault(value, len(values))
+            sums.setdefault((seed, value), [0.0, 0.0, 0])
+            sums[(seed, value)][0] += float(row['cost'])
+            sums[(seed, value)][1] += float(row['running_time'])
+            sums[(seed, value)][2] += 1
+
+    # the maps with more than one value of the parameter
+    num_of_values = {}
+    for seed, _ in sums:
+        num_of_values[seed] = num_of_values.get(seed, 0) + 1
+    sums = {key: value for key, value in sums.items() if num_of_values[key[0]] > 1}
+    seeds = {seed: i for i, seed in enumerate(seed for seed in seeds if num_of_values[seed] > 1)}
+    kept_values = {value for _, value in sums}
+    values = {value: i for i, value in enumerate(sorted(value for value in values if value in kept_values))}
+
+    cost = np.full((len(seeds), len(values)), np.nan)
+    running_time = np.full((len(seeds), len(values)), np.nan)
+    for (seed, value), (cost_sum, running_time_sum, count) in sums.items():
+        cost[seeds[seed], values[value]] = cost_sum / count
+        running_time[seeds[seed], values[value]] = running_time_sum / count
 
     # get results
-    y_values = []
-    # results of changing traffic
-    for i in range(NUM_OF_QLEARNERS):
-        y_values.append(df[str(i)])
+    y_values = list(cost.T) + list(running_time.T)
+    return list(values), y_values
 
-    # result of running time
-    for i in range(NUM_OF_QLEARNERS):
-        y_values.append(df[str(i + NUM_OF_QLEARNERS)])
 
-    return y_values
+def show_or_save(file_path):
+    # show the figure, or write it to file_path without a display
+    if file_path is None:
+        plt.show()
+    else:
+        plt.savefig(file_path)
+        plt.close()
 
 
-def create_runtime_sample_grpah(y_values):
+def create_runtime_sample_grpah(y_values, file_path=None):
     x_values = np.arange(len(y_values[ASTAR__ZERO_H]))
-    line_width = 0
     # plot changing traffic data
-    plt.plot(x_values, y_values[ASTAR__ZERO_H + RUNTIME_SHIFT] - 1.5 * line_width, label='A star - Zero heuristic',
-             color='cornflowerblue')
-    plt.plot(x_values, y_values[ASTAR__AERIAL_DIST_H + RUNTIME_SHIFT] - 1 * line_width, label='A star - Arial dist heuristic',
-             color='lightgreen')
-    plt.plot(x_values, y_values[ASTAR__DIJKSTRA_H + RUNTIME_SHIFT] - 0.5 * line_width, label='A star - Dijkstra heuristic',
-             color='orangered')
-    plt.plot(x_values, y_values[ASTAR__COMBINATION_H + RUNTIME_SHIFT], label='A star - Combination heuristic',
-             color='orange')
-    plt.plot(x_values, y_values[ASTAR__NONADMISSIBLE_H + RUNTIME_SHIFT] + 0.5 * line_width, label='A star - Non-admissible heuristic',
-             color='hotpink')
-    plt.plot(x_values, y_values[QLEARNING + RUNTIME_SHIFT] + 1 * line_width, label='Q learning', color='mediumpurple')
+    for agent in range(NUM_OF_ALGOS):
+        plt.plot(x_values, y_values[agent + RUNTIME_SHIFT], label=AGENT_LABELS[agent], color=QLEARNERS_COLORS[agent])
 
     plt.yscale('log')
 
@@ -96,25 +279,16 @@ def create_runtime_sample_grpah(y_values):
     # display the legend and grid
     plt.legend()
     plt.grid(True)
-    plt.show()
+    show_or_save(file_path)
 
 
-def create_Q_learners_runtime_sample_grpah(y_values):
+def create_Q_learners_runtime_sample_grpah(values, y_values, parameter='learning_rate', file_path=None):
     x_values = np.arange(len(y_values[0]))
 
     # plot changing traffic data
-    plt.plot(x_values, y_values[0 + NUM_OF_QLEARNERS], label='learning rate 0.4',
-             color='cornflowerblue')
-    plt.plot(x_values, y_values[1 + NUM_OF_QLEARNERS], label='learning rate 0.5',
-             color='lightgreen')
-    plt.plot(x_values, y_values[2 + NUM_OF_QLEARNERS], label='learning rate 0.6',
-             color='orangered')
-    plt.plot(x_values, y_values[3 + NUM_OF_QLEARNERS], label='learning rate 0.7',
-             color='orange')
-    plt.plot(x_values, y_values[4 + NUM_OF_QLEARNERS], label='learning rate 0.8',
-             color='hotpink')
-    plt.plot(x_values, y_values[5 + NUM_OF_QLEARNERS], label='learning rate 0.9',
-             color='mediumpurple')
+    for i, value in enumerate(values):
+        plt.plot(x_values, y_values[i + len(values)], label=f"{parameter.replace('_', ' ')} {value}",
+                 color=QLEARNERS_COLORS[i % len(QLEARNERS_COLORS)])
 
     plt.yscale('log')
 
@@ -128,43 +302,44 @@ def create_Q_learners_runtime_sample_grpah(y_values):
     # display the legend and grid
     plt.legend()
     plt.grid(True)
-    plt.show()
-def create_cost_sample_graph(y_values):
+    show_or_save(file_path)
+
+
+def create_cost_per_algo_graph(y_values, file_path=None):
     x_values = np.arange(len(y_values[ASTAR__ZERO_H]))
-    line_width = 0
 
-    # plot changing traffic data
-    plt.plot(x_values, y_values[ASTAR__ZERO_H] - 1.5*line_width, label='changing traffic', color='cornflowerblue')
-    # plt.plot(x_values, y_values[ASTAR__AERIAL_DIST_H] - 1*line_width, label='A star - Arial dist heuristic', color='lightgreen')
-    # plt.plot(x_values, y_values[ASTAR__DIJKSTRA_H] - 0.5*line_width, label='A star - Dijkstra heuristic', color='orangered')
-    # plt.plot(x_values, y_values[ASTAR__COMBINATION_H], label='A star - Combination heuristic', color='orange')
+    # plot changing traffic data, the admissible heuristics find the same paths
+    plt.plot(x_values, y_values[ASTAR__NONADMISSIBLE_H], label=AGENT_LABELS[ASTAR__NONADMISSIBLE_H],
+             color='hotpink')
+    plt.plot(x_values, y_values[QLEARNING], label=AGENT_LABELS[QLEARNING], color='mediumpurple')
+    plt.plot(x_values, y_values[ASTAR__ZERO_H], label='A star - Admissible heuristics', color='cornflowerblue')
+
+    plt.yscale('log')
+    # labels and title
+    plt.xlabel('sample')
+    plt.ylabel('Cost (time until arrival, log scale)')
+    plt.title('Cost per Algorithm')
 
-    # plt.plot(x_values, y_values[ASTAR__NONADMISSIBLE_H] + 0.5*line_width, label='A star - Non-admissible heuristic', color='hotpink')
-    # plt.plot(x_values, y_values[QLEARNING] + 1*line_width, label='Q learning', color='mediumpurple')
-    # plt.plot(x_values, y_values[ASTAR__ZERO_H] - 1.5 * line_width, label='A star - Admissible heuristics',
-    #          color='cornflowerblue')
+    # Set x-axis ticks to integers only
+    plt.xticks(ticks=np.arange(0, len(x_values), 10))
 
-    # plot min traffic data
-    plt.plot(x_values, y_values[ASTAR__ZERO_H + MIN_SHIFT] - 1.5*line_width, color='cornflowerblue', linestyle='dotted', label='min traffic')
-    # plt.plot(x_values, y_values[ASTAR__AERIAL_DIST_H + MIN_SHIFT] - 1*line_width, color='lightgreen', linestyle='dotted')
-    # plt.plot(x_values, y_values[ASTAR__DIJKSTRA_H + MIN_SHIFT] - 0.5*line_width, color='orangered', linestyle='dotted')
-    # plt.plot(x_values, y_values[ASTAR__COMBINATION_H + MIN_SHIFT], color='orange', linestyle='dotted')
-    # plt.plot(x_values, y_values[ASTAR__NONADMISSIBLE_H + MIN_SHIFT] + 0.5*line_width, color='hotpink', linestyle='dotted')
-    # plt.plot(x_values, y_values[QLEARNING + MIN_SHIFT] + 1*line_width, color='mediumpurple', linestyle='dotted')
+    # Display the legend and grid
+    plt.legend()
+    plt.grid(True)
+    show_or_save(file_path)
 
-    # # plot max traffic data
-    plt.plot(x_values, y_values[ASTAR__ZERO_H + MAX_SHIFT] - 1.5*line_width, color='cornflowerblue', linestyle='--', label='max traffic')
-    # plt.plot(x_values, y_values[ASTAR__AERIAL_DIST_H + MAX_SHIFT] - 1*line_width, color='lightgreen', linestyle='--')
-    # plt.plot(x_values, y_values[ASTAR__DIJKSTRA_H + MAX_SHIFT] - 0.5*line_width, color='orangered', linestyle='--')
-    # plt.plot(x_values, y_values[ASTAR__COMBINATION_H + MAX_SHIFT], color='orange', linestyle='--')
-    # plt.plot(x_values, y_values[ASTAR__NONADMISSIBLE_H + MAX_SHIFT] + 0.5*line_width, color='hotpink', linestyle='dotted')
-    # plt.plot(x_values, y_values[QLEARNING + MAX_SHIFT] + 1*line_width, color='mediumpurple', linestyle='dotted')
 
-    plt.yscale('log')
+def create_admissible_cost_graph(y_values, file_path=None):
+    x_values = np.arange(len(y_values[ASTAR__ZERO_H]))
+
+    # plot changing traffic data
+    for agent in (ASTAR__ZERO_H, ASTAR__AERIAL_DIST_H, ASTAR__DIJKSTRA_H, ASTAR__COMBINATION_H):
+        plt.plot(x_values, y_values[agent], label=AGENT_LABELS[agent], color=QLEARNERS_COLORS[agent])
+
     # labels and title
     plt.xlabel('sample')
-    plt.ylabel('Cost (time until arrival, log scael)')
-    plt.title('A-Star Admissible Heuristic Cost')
+    plt.ylabel('Cost (time until arrival)')
+    plt.title('Cost per A-Star Admissible Heuristic')
 
     # Set x-axis ticks to integers only
     plt.xticks(ticks=np.arange(0, len(x_values), 10))
@@ -172,29 +347,27 @@ def create_cost_sample_graph(y_values):
     # Display the legend and grid
     plt.legend()
     plt.grid(True)
-    plt.show()
+    show_or_save(file_path)
 
-def create_min_max_graph(y_values):
+
+def create_min_max_graph(y_values, agent=QLEARNING, title='Q Learning Cost', file_path=None):
     x_values = np.arange(len(y_values[ASTAR__ZERO_H]))
-    line_width = 0
+    color = QLEARNERS_COLORS[agent]
 
     # plot changing traffic data
-    # plt.plot(x_values, y_values[ASTAR__NONADMISSIBLE_H] + 0.5*line_width, label='changing traffic', color='hotpink')
-    plt.plot(x_values, y_values[QLEARNING] + 1*line_width, label='changing traffic', color='mediumpurple')
+    plt.plot(x_values, y_values[agent], label='changing traffic', color=color)
 
     # plot min traffic data
-    # plt.plot(x_values, y_values[ASTAR__NONADMISSIBLE_H + MIN_SHIFT] + 0.5*line_width, color='hotpink', linestyle='dotted', label='min traffic')
-    plt.plot(x_values, y_values[QLEARNING + MIN_SHIFT] + 1*line_width, color='mediumpurple', linestyle='dotted', label='min traffic')
+    plt.plot(x_values, y_values[agent + MIN_SHIFT], color=color, linestyle='dotted', label='min traffic')
 
     # # plot max traffic data
-    # plt.plot(x_values, y_values[ASTAR__NONADMISSIBLE_H + MAX_SHIFT] + 0.5*line_width, color='hotpink', linestyle='--', label='max traffic')
-    plt.plot(x_values, y_values[QLEARNING + MAX_SHIFT] + 1*line_width, color='mediumpurple', linestyle='--', label='max traffic')
+    plt.plot(x_values, y_values[agent + MAX_SHIFT], color=color, linestyle='--', label='max traffic')
 
     plt.yscale('log')
     # labels and title
     plt.xlabel('sample')
     plt.ylabel('Cost (time until arrival, log scale)')
-    plt.title('Q Learning Cost')
+    plt.title(title)
 
     # Set x-axis ticks to integers only
     plt.xticks(ticks=np.arange(0, len(x_values), 10))
@@ -202,24 +375,16 @@ def create_min_max_graph(y_values):
     # Display the legend and grid
     plt.legend()
     plt.grid(True)
-    plt.show()
+    show_or_save(file_path)
+
 
-def create_Q_learners_cost_sample_graph(y_values):
+def create_Q_learners_cost_sample_graph(values, y_values, parameter='learning_rate', file_path=None):
     x_values = np.arange(len(y_values[0]))
 
     # plot changing traffic data
-    plt.plot(x_values, y_values[0], label='learning rate 0.4',
-             color='cornflowerblue')
-    plt.plot(x_values, y_values[1], label='learning rate 0.5',
-             color='lightgreen')
-    plt.plot(x_values, y_values[2], label='learning rate 0.6',
-             color='orangered')
-    plt.plot(x_values, y_values[3], label='learning rate 0.7',
-             color='orange')
-    plt.plot(x_values, y_values[4], label='learning rate 0.8',
-             color='hotpink')
-    plt.plot(x_values, y_values[5], label='learning rate 0.9',
-             color='mediumpurple')
+    for i, value in enumerate(values):
+        plt.plot(x_values, y_values[i], label=f"{parameter.replace('_', ' ')} {value}",
+                 color=QLEARNERS_COLORS[i % len(QLEARNERS_COLORS)])
     plt.yscale('log')
     # labels and title
     plt.xlabel('sample')
@@ -232,16 +397,91 @@ def create_Q_learners_cost_sample_graph(y_values):
     # Display the legend and grid
     plt.legend()
     plt.grid(True)
-    plt.show()
-
-
-# GENERAL ALGOS
-y_values = read_results()
-# create_cost_sample_graph(y_values)
-# create_min_max_graph(y_values)
-create_runtime_sample_grpah(y_values)
-
-# Q LEARNERS
-# y_values = read_Q_learners_results()
-# create_Q_learners_cost_sample_graph(y_values)
-# create_Q_learners_runtime_sample_grpah(y_values)
\ No newline at end of file
+    show_or_save(file_path)
+
+
+# the figures of GRAPHS_DIR: file name -> (function, data - 'results' or the swept parameter, keyword arguments)
+FIGURES = {
+    'runtime.png': (create_runtime_sample_grpah, 'results', {}),
+    'costperalgo.png': (create_cost_per_algo_graph, 'results', {}),
+    'admissiblecost.png': (create_admissible_cost_graph, 'results', {}),
+    'admissible_minmax.png': (create_min_max_graph, 'results',
+                              {'agent': ASTAR__ZERO_H, 'title': 'A-Star Admissible Heuristic Cost'}),
+    'nonadmiss_minmax.png': (create_min_max_graph, 'results',
+                             {'agent': ASTAR__NONADMISSIBLE_H, 'title': 'A-Star Non-admissible Heuristic Cost'}),
+    'Q_minmax.png': (create_min_max_graph, 'results', {'agent': QLEARNING, 'title': 'Q Learning Cost'}),
+}
+for _parameter in ('learning_rate', 'discount_factor', 'exploration_rate'):
+    FIGURES[f'{_parameter}1.png'] = (create_Q_learners_cost_sample_graph, _parameter, {'parameter': _parameter})
+    FIGURES[f'{_parameter}2.png'] = (create_Q_learners_runtime_sample_grpah, _parameter, {'parameter': _parameter})
+
+
+def _render_figure(task):
+    # worker entry point - renders one figure to its file without a display
+    function, data, kwargs, file_path = task
+    matplotlib.use('Agg')
+    plt.figure()
+    function(*data, file_path=file_path, **kwargs)
+    return file_path
+
+
+def export_figures(out_dir=GRAPHS_DIR, workers=None, results_file=RESULTS_FILE, sweep_file=SWEEP_RESULTS_FILE,
+                   max_samples=MAX_SAMPLES, legacy_file=LEGACY_RESULTS_CSV):
+    """
+    Render the FIGURES to files, in parallel over a process pool. The data of every figure is read once, the
+    figures of a missing results file are skipped.
+
+    :param workers: Number of worker processes, defaults to the number of cpus. 1 renders in this process.
+    :param legacy_file: The legacy results csv the results store is created from if it doesn't exist.
+    :return: List of the written files.
+    """
+    data = {}
+    if migrate_legacy_results(results_file, legacy_file):
+        data['results'] = (read_results(results_file, max_samples),)
+    if os.path.exists(sweep_file):
+        for _, source, _ in FIGURES.values():
+            if source != 'results' and source not in data:
+                data[source] = read_Q_learners_results(source, sweep_file)
+    tasks = [(function, data[source], kwargs, os.path.join(out_dir, name))
+             for name, (function, source, kwargs) in FIGURES.items() if source in data]
+
+    os.makedirs(out_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        return list(map(_render_figure, tasks))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(_render_figure, tasks))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Summarize the results and render the figures to files.')
+    parser.add_argument('-r', default=RESULTS_FILE,
+                        help=f'Results database, created from {LEGACY_RESULTS_CSV} if it does not exist')
+    parser.add_argument('-q', default=SWEEP_RESULTS_FILE, help='Q-learning sweep csv')
+    parser.add_argument('-d', default=GRAPHS_DIR, help='Directory the figures are written to')
+    parser.add_argument('-w', type=int, default=None, help='Number of worker processes (default: number of cpus)')
+    parser.add_argument('-n', type=int, default=MAX_SAMPLES, help='Number of runs of the sample figures')
+    parser.add_argument('-o', default=None, help='Csv file the summary is written to (default: print it)')
+    parser.add_argument('--no-figures', action='store_true', help='Only summarize the results')
+    args = parser.parse_args()
+
+    start_time = time.time()
+    if migrate_legacy_results(args.r):
+        rows = summary_rows(summarize_results(args.r))
+        if args.o is not None:
+            with open(args.o, mode='w', newline='') as file:
+                writer = csv.DictWriter(file, fieldnames=rows[0].keys() if rows else [])
+                writer.writeheader()
+                writer.writerows(rows)
+        else:
+            for row in rows:
+                print(', '.join(f'{key}={round(value, 4) if isinstance(value, float) else value}'
+                                for key, value in row.items()))
+    if not args.no_figures:
+        files = export_figures(args.d, workers=args.w, results_file=args.r, sweep_file=args.q, max_samples=args.n)
+        print(f"{len(files)} figures written to {args.d}")
+    print(f"done in {round(time.time() - start_time, 2)} seconds")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,228 @@
+import argparse
+import csv
+import os
+import sqlite3
+import time
+import uuid
+import numpy as np
+from agents.agent import AGENT_NAMES
+
+RESULTS_DB = 'results.sqlite'
+# the results csv of integer columns, the format before the results store
+LEGACY_RESULTS_CSV = 'results_recording.csv'
+# version of the results table, stored in the database - older databases get the new columns added
+SCHEMA_VERSION = 3
+# the buffered records are written in one transaction once there are this many
+FLUSH_SIZE = 10000
+# number of records read_chunks reads at once
+CHUNK_SIZE = 100000
+# seconds a writer waits for another process that holds the write lock
+LOCK_TIMEOUT = 60
+
+# the traffic scenarios an agent runs on, in the order of the agents of NavigationLogics
+SCENARIOS = ('changing', 'mean', 'min', 'max')
+
+# the columns of the results table, one record per run, agent and scenario
+RESULTS_COLUMNS = {
+    'run_id': 'TEXT',  # shared by the records of one run
+    'recorded_at': 'REAL',  # unix time
+    'seed': 'INTEGER',
+    'graph': 'TEXT',  # RoadGraph.fingerprint of the map
+    'num_of_nodes': 'INTEGER',
+    'num_of_roads': 'INTEGER',
+    'src_node': 'TEXT',
+    'dest_node': 'TEXT',
+    'ticks': 'INTEGER',
+    'arrived': 'INTEGER',
+    'agent_type': 'INTEGER',  # constant of agents.agent
+    'agent': 'TEXT',  # AGENT_NAMES of agent_type
+    'scenario': 'TEXT',  # one of SCENARIOS
+    'cost': 'REAL',  # minutes until arrival
+    'running_time': 'REAL',  # seconds of all the searches (wall time), of the changing scenario only
+    # the work of all the searches (agents.agent.SearchStats), since version 2
+    'expansions': 'INTEGER',
+    'pushes': 'INTEGER',
+    'pops': 'INTEGER',
+    'peak_open_set': 'INTEGER',  # the largest of the searches
+    'heuristic_evaluations': 'INTEGER',
+    'qlearning_steps': 'INTEGER',
+    'episodes': 'INTEGER',
+    'cpu_time': 'REAL',  # cpu seconds of all the searches, of the changing scenario only, since version 3
+}
+
+
+def new_run_id():
+    return uuid.uuid4().hex
+
+
+class ResultsStore:
+    def __init__(self, file_path=RESULTS_DB, flush_size=FLUSH_SIZE):
+        """
+        Results table in a SQLite database, with named columns (RESULTS_COLUMNS).
+
+        Records are buffered and written flush_size at a time in one transaction. The database is in write-ahead
+        log mode, so several processes can add to it at once, a writer waits (up to LOCK_TIMEOUT) for the others
+        and readers aren't blocked.
+
+        :param file_path: The database file, created if it doesn't exist.
+        :param flush_size: Number of buffered records that triggers a write.
+        """
+        self.file_path = file_path
+        self.flush_size = flush_size
+        self.buffer = []
+        self.connection = sqlite3.connect(file_path, timeout=LOCK_TIMEOUT, isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self._create_table()
+        self.columns = list(RESULTS_COLUMNS)
+        self._insert = (f"INSERT INTO results ({', '.join(self.columns)}) "
+                        f"VALUES ({', '.join('?' for _ in self.columns)})")
+
+    def _create_table(self):
+        connection = self.connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            columns = ', '.join(f'{name} {sql_type}' for name, sql_type in RESULTS_COLUMNS.items())
+            connection.execute(f'CREATE TABLE IF NOT EXISTS results ({columns})')
+            # a database of an older version gets the new columns, its records have them NULL
+            existing = {row[1] for row in connection.execute('PRAGMA table_info(results)')}
+            for name, sql_type in RESULTS_COLUMNS.items():
+                if name not in existing:
+                    connection.execute(f'ALTER TABLE results ADD COLUMN {name} {sql_type}')
+            connection.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+    def add(self, records):
+        """
+        Buffer records, dictionaries of RESULTS_COLUMNS values (a missing column is NULL).
+        """
+        for record in records:
+            unknown = record.keys() - RESULTS_COLUMNS.keys()
+            if unknown:
+                raise ValueError(f"unknown results columns: {sorted(unknown)}")
+            self.buffer.append(tuple(record.get(name) for name in self.columns))
+        if len(self.buffer) >= self.flush_size:
+            self.flush()
+
+    def flush(self):
+        # write the buffered records in one transaction
+        if not self.buffer:
+            return
+        connection = self.connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.executemany(self._insert, self.buffer)
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        self.buffer = []
+
+    def read(self, columns=None, where=None, params=()):
+        """
+        Iterate over the records, without loading them all.
+
+        :param columns: The columns to read, defaults to all.
+        :param where: SQL condition of the records to read, e.g. "scenario = ?", with params.
+        :return: Generator of dictionaries {column: value}.
+        """
+        columns = self.columns if columns is None else list(columns)
+        for row in self._select(columns, where, params):
+            yield dict(zip(columns, row))
+
+    def read_chunks(self, columns=None, where=None, params=(), chunk_size=CHUNK_SIZE):
+        """
+        Iterate over the records chunk_size at a time, in the order they were added, so only a chunk is in memory.
+
+        :param columns: The columns to read, defaults to all.
+        :param where: SQL condition of the records to read, e.g. "scenario = ?", with params.
+        :return: Generator of dictionaries {column: array of the chunk's values}, a NULL number is nan.
+        """
+        columns = self.columns if columns is None else list(columns)
+        cursor = self._select(columns, where, params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                return
+            yield {name: np.array(values, dtype=float if RESULTS_COLUMNS.get(name) == 'REAL' else None)
+                   for name, values in zip(columns, zip(*rows))}
+
+    def _select(self, columns, where, params):
+        self.flush()
+        query = f"SELECT {', '.join(columns)} FROM results"
+        if where is not None:
+            query += f' WHERE {where}'
+        return self.connection.execute(query + ' ORDER BY rowid', params)
+
+    def close(self):
+        if self.connection is not None:
+            self.flush()
+            self.connection.close()
+            self.connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def import_results_csv(file_path, store, agent_types=tuple(range(6))):
+    """
+    Add the rows of a results csv of integer columns (the format before the results store) to a store: the
+    costs of the agents in the changing, mean, min and max scenarios, then the running times of the agents.
+
+    :param agent_types: The agents of the csv, by default the gui agents.
+    :return: Number of rows imported.
+    """
+    num_of_agents = len(agent_types)
+    num_of_rows = 0
+    recorded_at = time.time()
+    with open(file_path, newline='') as file:
+        for row in csv.DictReader(file):
+            run = {'run_id': new_run_id(), 'recorded_at': recorded_at, 'arrived': 1}
+            store.add({**run, 'agent_type': agent_type, 'agent': AGENT_NAMES[agent_type], 'scenario': scenario,
+                       'cost': float(row[str(s * num_of_agents + i)]),
+                       'running_time': float(row[str(len(SCENARIOS) * num_of_agents + i)]) if s == 0 else None}
+                      for s, scenario in enumerate(SCENARIOS) for i, agent_type in enumerate(agent_types))
+            num_of_rows += 1
+    return num_of_rows
+
+
+def migrate_legacy_results(file_path=RESULTS_DB, legacy_file=LEGACY_RESULTS_CSV):
+    """
+    Create the results store from the legacy results csv (see import_results_csv) if there is no store yet, so a
+    checkout that only has the csv still has its results. The store is written under a temporary name and renamed,
+    so an interrupted import is redone next time.
+
+    :return: True if the store exists.
+    """
+    if os.path.exists(file_path):
+        return True
+    if legacy_file is None or not os.path.exists(legacy_file):
+        return False
+    temp_path = f'{file_path}.{os.getpid()}.tmp'
+    with ResultsStore(temp_path) as store:
+        import_results_csv(legacy_file, store)
+    os.replace(temp_path, file_path)
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import a results csv of integer columns into a results store.')
+    parser.add_argument('file', help='The results csv')
+    parser.add_argument('-o', default=RESULTS_DB, help='Results database the rows are added to')
+    parser.add_argument('-a', type=int, nargs='+', default=list(range(6)),
+                        help='Agent numbers of the csv columns (default: the agents of the gui, 0-5)')
+    args = parser.parse_args()
+
+    with ResultsStore(args.o) as store:
+        num_of_rows = import_results_csv(args.file, store, args.a)
+    print(f"{num_of_rows} runs imported into {args.o}")
+
+
+if __name__ == '__main__':
+    main()
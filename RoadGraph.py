@@ -0,0 +1,167 @@
+import hashlib
+import itertools
+from functools import cached_property
+import numpy as np
+
+# unique identity of every RoadGraph built in the process (unlike id(), never reused)
+_graph_ids = itertools.count()
+
+
+class RoadGraph:
+    # the arrays a RoadGraph is made of
+    ARRAYS = ('edge_sources', 'edge_targets', 'out_offsets', 'out_targets', 'out_edge_ids', 'in_offsets',
+              'in_sources', 'in_edge_ids')
+
+    def __init__(self, nodes, edges):
+        """
+        Compact adjacency index of a directed road graph, built once and shared (read only) by all the agents.
+
+        Nodes are interned into dense integer ids (their position in nodes) and every directed edge gets an
+        edge id (its position in edges). The outgoing and incoming arcs of every node are stored in CSR form:
+        the arcs of node u are at positions offsets[u]..offsets[u + 1] of the targets / edge_ids arrays,
+        in the same order the edges appear in the edges list.
+
+        :param nodes: List of nodes.
+        :param edges: List of DIRECTED edges represented as tuples (start_node, end_node).
+        """
+        self.graph_id = next(_graph_ids)
+        self.nodes = list(nodes)
+        self.edges = list(edges)
+        self.num_nodes = len(self.nodes)
+        self.num_edges = len(self.edges)
+
+        self.node_index = {node: i for i, node in enumerate(self.nodes)}
+        self.edge_index = {edge: i for i, edge in enumerate(self.edges)}
+
+        # source / target node id of every directed edge id
+        self.edge_sources = np.array([self.node_index[n1] for n1, _ in self.edges], dtype=np.int64)
+        self.edge_targets = np.array([self.node_index[n2] for _, n2 in self.edges], dtype=np.int64)
+
+        # forward CSR: outgoing arcs of every node
+        self.out_offsets, self.out_targets, self.out_edge_ids = \
+            self._build_csr(self.edge_sources, self.edge_targets)
+        # backward CSR: incoming arcs of every node (used by backward searches such as the Dijkstra heuristic)
+        self.in_offsets, self.in_sources, self.in_edge_ids = \
+            self._build_csr(self.edge_targets, self.edge_sources)
+
+        self._fingerprint = None
+
+    @classmethod
+    def from_arrays(cls, nodes, arrays):
+        """
+        A RoadGraph of arrays that were already built (see ARRAYS), e.g. the read only memory mapped arrays of a
+        map snapshot. Nothing is copied, the edges, the indexes and the python views are made on first use.
+
+        :param nodes: List of nodes.
+        :param arrays: Dictionary with the arrays of ARRAYS.
+        """
+        graph = cls.__new__(cls)
+        graph.graph_id = next(_graph_ids)
+        graph.nodes = list(nodes)
+        graph.num_nodes = len(graph.nodes)
+        for name in cls.ARRAYS:
+            setattr(graph, name, arrays[name])
+        graph.num_edges = len(graph.edge_sources)
+        graph._fingerprint = None
+        return graph
+
+    @cached_property
+    def edges(self):
+        nodes = self.nodes
+        return [(nodes[source], nodes[target]) for source, target in zip(self.edge_sources_list,
+                                                                           self.edge_targets_list)]
+
+    @cached_property
+    def node_index(self):
+        return {node: i for i, node in enumerate(self.nodes)}
+
+    @cached_property
+    def edge_index(self):
+        return {edge: i for i, edge in enumerate(self.edges)}
+
+    # python views of the CSR arrays, indexing numpy arrays element by element is slow inside pure python loops.
+    # They're made on first use, an agent only pays for the views it reads
+    @cached_property
+    def out_offsets_list(self):
+        return self.out_offsets.tolist()
+
+    @cached_property
+    def out_targets_list(self):
+        return self.out_targets.tolist()
+
+    @cached_property
+    def out_edge_ids_list(self):
+        return self.out_edge_ids.tolist()
+
+    @cached_property
+    def in_offsets_list(self):
+        return self.in_offsets.tolist()
+
+    @cached_property
+    def in_sources_list(self):
+        return self.in_sources.tolist()
+
+    @cached_property
+    def in_edge_ids_list(self):
+        return self.in_edge_ids.tolist()
+
+    @cached_property
+    def edge_sources_list(self):
+        return self.edge_sources.tolist()
+
+    @cached_property
+    def edge_targets_list(self):
+        return self.edge_targets.tolist()
+
+    def _build_csr(self, row_nodes, col_nodes):
+        """
+        Group the arcs by row node.
+
+        :param row_nodes: Array with the row node id of every edge id.
+        :param col_nodes: Array with the column node id of every edge id.
+        :return: (offsets, column node ids, edge ids) arrays.
+        """
+        # stable sort keeps the original edges order inside every row
+        order = np.argsort(row_nodes, kind='stable')
+        counts = np.bincount(row_nodes, minlength=self.num_nodes)
+        offsets = np.zeros(self.num_nodes + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        return offsets, col_nodes[order], order.astype(np.int64)
+
+    def fingerprint(self):
+        """
+        Hash of the topology (the nodes and the directed edges, in order). Unlike graph_id it's the same for the
+        same map in every process, so it can key files on disk.
+        """
+        if self._fingerprint is None:
+            digest = hashlib.blake2b(digest_size=16)
+            digest.update('\n'.join(str(node) for node in self.nodes).encode())
+            digest.update(self.edge_sources.tobytes())
+            digest.update(self.edge_targets.tobytes())
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    def out_degree(self, node_id):
+        return self.out_offsets_list[node_id + 1] - self.out_offsets_list[node_id]
+
+    def out_edges(self, node):
+        """
+        Get all the edges directed out of a node, in O(out-degree).
+
+        :param node: The node (not its id).
+        :return: A list of edges (start_node, end_node).
+        """
+        node_id = self.node_index[node]
+        start, end = self.out_offsets_list[node_id], self.out_offsets_list[node_id + 1]
+        return [self.edges[edge_id] for edge_id in self.out_edge_ids_list[start:end]]
+
+    def in_edges(self, node):
+        """
+        Get all the edges directed into a node, in O(in-degree).
+
+        :param node: The node (not its id).
+        :return: A list of edges (start_node, end_node).
+        """
+        node_id = self.node_index[node]
+        start, end = self.in_offsets_list[node_id], self.in_offsets_list[node_id + 1]
+        return [self.edges[edge_id] for edge_id in self.in_edge_ids_list[start:end]]
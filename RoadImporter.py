@@ -0,0 +1,531 @@
+import csv
+import itertools
+import json
+import math
+import os
+import re
+import numpy as np
+from GraphGenerator import component_endpoints, layout_positions, NODES_SPACING, LOCAL, COLLECTOR, ARTERIAL, \
+    EXPRESSWAY, HIGHWAY
+from NavigationLogics import speed_limits
+
+# rows (or features) parsed at once, only a chunk is held as Python objects
+CHUNK_SIZE = 100000
+# characters read at once from a GeoJSON FeatureCollection
+BLOCK_SIZE = 1 << 20
+
+# km per length unit of the files, OSM extracts are in meters
+METERS = 0.001
+# road_length is 100 times the distance between the positions (see GraphGenerator.NODES_SPACING), so the
+# positions are in units of 100 km
+KM_PER_POSITION_UNIT = 100
+EARTH_RADIUS_KM = 6371.0088
+
+FILE_FORMATS = ('csv', 'geojson', 'geojsonl', 'edgelist')
+
+# the speed class of the roads without a maxspeed, by their OSM highway tag
+OSM_HIGHWAY_CLASSES = {
+    'motorway': HIGHWAY, 'motorway_link': EXPRESSWAY,
+    'trunk': EXPRESSWAY, 'trunk_link': ARTERIAL,
+    'primary': ARTERIAL, 'primary_link': COLLECTOR,
+    'secondary': COLLECTOR, 'secondary_link': COLLECTOR,
+    'tertiary': COLLECTOR, 'tertiary_link': COLLECTOR,
+}
+
+# the accepted column names of the csv files, the first one found is used
+SOURCE_COLUMNS = ('u', 'source', 'from', 'start_node', 'node1')
+TARGET_COLUMNS = ('v', 'target', 'to', 'end_node', 'node2')
+LENGTH_COLUMNS = ('length', 'length_m', 'distance')
+SPEED_COLUMNS = ('maxspeed', 'speed', 'speed_kph', 'speed_limit')
+HIGHWAY_COLUMNS = ('highway', 'road_class', 'fclass', 'type')
+NODE_ID_COLUMNS = ('osmid', 'id', 'node_id', 'node')
+X_COLUMNS = ('x', 'lon', 'lng', 'longitude')
+Y_COLUMNS = ('y', 'lat', 'latitude')
+
+_NUMBER = re.compile(r'\d+(?:\.\d+)?')
+_WORD = re.compile(r'[a-z_]+')
+
+
+class NodeInterner:
+    def __init__(self):
+        """
+        Dense integer ids of the node ids of a file, in the order they're first seen.
+
+        Integer ids (OSM ids) are interned a chunk at a time with numpy, against the sorted array of the ids seen
+        so far. Other ids (strings, coordinates) go through a dict.
+        """
+        self.ids = {}
+        self.known = np.zeros(0, dtype=np.int64)  # the integer ids seen so far, sorted
+        self.known_ids = np.zeros(0, dtype=np.int64)  # their dense ids
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def _integers(self, keys):
+        # keys as an int64 array, None if they aren't all integers (then the dict is used from now on)
+        if self.ids or not keys or not isinstance(keys[0], str):
+            return None
+        try:
+            return np.array(keys, dtype=np.int64)
+        except (ValueError, OverflowError):
+            return None
+
+    def _find(self, integers):
+        # the sorted unique integers, the inverse indices and the dense ids of the unique ones (-1 if unseen)
+        unique, first, inverse = np.unique(integers, return_index=True, return_inverse=True)
+        positions = np.searchsorted(self.known, unique)
+        found = positions < len(self.known)
+        found[found] = self.known[positions[found]] == unique[found]
+        dense = np.full(len(unique), -1, dtype=np.int64)
+        dense[found] = self.known_ids[positions[found]]
+        return unique, first, inverse, positions, dense
+
+    def _to_dict(self):
+        # the integer ids move to the dict once an id that isn't an integer shows up
+        if len(self.known):
+            self.ids.update(zip(map(str, self.known.tolist()), self.known_ids.tolist()))
+            self.known = self.known_ids = np.zeros(0, dtype=np.int64)
+
+    def intern(self, keys):
+        """The dense ids of keys, new keys get the next ids."""
+        integers = self._integers(keys)
+        if integers is None:
+            self._to_dict()
+            ids = self.ids
+            # len(ids) is evaluated before setdefault adds the key
+            dense = np.fromiter((ids.setdefault(key, len(ids)) for key in keys), dtype=np.int64, count=len(keys))
+            self.size = len(ids)
+            return dense
+
+        unique, first, inverse, positions, dense = self._find(integers)
+        new = np.flatnonzero(dense < 0)
+        # the new ids are numbered in the order they're first seen
+        dense[new[np.argsort(first[new], kind='stable')]] = np.arange(self.size, self.size + len(new))
+        self.size += len(new)
+        self.known = np.insert(self.known, positions[new], unique[new])
+        self.known_ids = np.insert(self.known_ids, positions[new], dense[new])
+        return dense[inverse]
+
+    def lookup(self, keys):
+        """The dense ids of keys, -1 for keys that weren't interned."""
+        integers = self._integers(keys)
+        if integers is None:
+            self._to_dict()
+            ids = self.ids
+            return np.fromiter((ids.get(key, -1) for key in keys), dtype=np.int64, count=len(keys))
+        _, _, inverse, _, dense = self._find(integers)
+        return dense[inverse]
+
+
+def parse_speed(value):
+    """A maxspeed value in km/h ('50', '30 mph', "['50', '30']" - the first one), nan if there's none."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    if not value:
+        return math.nan
+    match = _NUMBER.search(str(value))
+    if match is None:
+        return math.nan
+    speed = float(match.group())
+    return speed * 1.609344 if 'mph' in value else speed
+
+
+def highway_speed(value):
+    """The speed limit of a road by its highway tag (the first one of a list)."""
+    match = _WORD.search(str(value).lower()) if value else None
+    return speed_limits[OSM_HIGHWAY_CLASSES.get(match.group() if match else None, LOCAL)]
+
+
+def _parse_speeds(values, highways=None):
+    # the speeds of a column, the maxspeed values that aren't whole numbers are parsed once per distinct value and
+    # the missing speeds are by the highway tags, once per distinct tag
+    speeds = np.array([value if value.isdigit() else 'nan' for value in values], dtype=float)
+    other = [i for i in np.flatnonzero(np.isnan(speeds)).tolist() if values[i]]
+    if other:
+        texts, inverse = np.unique(np.array([values[i] for i in other]), return_inverse=True)
+        speeds[other] = np.array([parse_speed(text) for text in texts.tolist()])[inverse]
+    if highways is not None:
+        missing = np.flatnonzero(np.isnan(speeds))
+        if len(missing):
+            tags, inverse = np.unique(np.array([highways[i] for i in missing]), return_inverse=True)
+            speeds[missing] = np.array([highway_speed(tag) for tag in tags.tolist()])[inverse]
+    return speeds
+
+
+def _column(header, names, required=True):
+    # index in header of the first of names, None if there's none
+    lowered = [name.strip().lower() for name in header]
+    for name in names:
+        if name in lowered:
+            return lowered.index(name)
+    if required:
+        raise ValueError(f"no column named one of {names} in {header}")
+    return None
+
+
+def _to_floats(values):
+    # fast paths for clean numeric columns and for columns with empty values, nan for the values that aren't numbers
+    try:
+        return np.array(values, dtype=float)
+    except ValueError:
+        pass
+    try:
+        return np.array([value or 'nan' for value in values], dtype=float)
+    except ValueError:
+        return np.array([_to_float(value) for value in values], dtype=float)
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def _csv_chunks(file_path, chunk_size):
+    # the header and then lists of chunk_size rows
+    with open(file_path, newline='') as file:
+        reader = csv.reader(file)
+        header = next(reader, None)
+        if header is None:
+            return
+        yield header
+        while True:
+            rows = list(itertools.islice(reader, chunk_size))
+            if not rows:
+                return
+            yield rows
+
+
+class _EdgeChunks:
+    def __init__(self):
+        # the parsed chunks, as arrays
+        self.interner = NodeInterner()
+        self.sources = []
+        self.targets = []
+        self.lengths = []
+        self.speeds = []
+        # (dense ids, coordinates) of the nodes whose coordinates come with the edges
+        self.node_ids = []
+        self.coordinates = []
+
+    def add(self, source_keys, target_keys, lengths, speeds):
+        # interleaved, so the dense ids are in the order of the file whatever the chunks are
+        ids = self.interner.intern(list(itertools.chain.from_iterable(zip(source_keys, target_keys))))
+        self.sources.append(ids[0::2])
+        self.targets.append(ids[1::2])
+        self.lengths.append(np.asarray(lengths, dtype=float))
+        self.speeds.append(np.asarray(speeds, dtype=float))
+        return ids
+
+    def add_coordinates(self, node_ids, coordinates):
+        self.node_ids.append(np.asarray(node_ids, dtype=np.int64))
+        self.coordinates.append(np.asarray(coordinates, dtype=float).reshape(-1, 2))
+
+    def arrays(self):
+        def concatenate(chunks, dtype):
+            return np.concatenate(chunks) if chunks else np.zeros(0, dtype=dtype)
+        return (concatenate(self.sources, np.int64), concatenate(self.targets, np.int64),
+                concatenate(self.lengths, float), concatenate(self.speeds, float))
+
+
+def _read_csv_edges(chunks, file_path, chunk_size):
+    # an OSM-extract edges csv: u, v and optionally length, maxspeed and highway columns
+    csv_chunks = _csv_chunks(file_path, chunk_size)
+    header = next(csv_chunks, None)
+    if header is None:
+        return
+    source = _column(header, SOURCE_COLUMNS)
+    target = _column(header, TARGET_COLUMNS)
+    length = _column(header, LENGTH_COLUMNS, required=False)
+    speed = _column(header, SPEED_COLUMNS, required=False)
+    highway = _column(header, HIGHWAY_COLUMNS, required=False)
+    for rows in csv_chunks:
+        columns = list(zip(*rows))
+        lengths = _to_floats(columns[length]) if length is not None else np.full(len(rows), math.nan)
+        speeds = _parse_speeds(columns[speed] if speed is not None else [''] * len(rows),
+                               columns[highway] if highway is not None else None)
+        chunks.add([key.strip() for key in columns[source]], [key.strip() for key in columns[target]], lengths,
+                   speeds)
+
+
+def _read_edge_list(chunks, file_path, chunk_size):
+    # a plain edge list: 'u v [length [speed]]' lines separated by whitespace or commas, '#' comments
+    with open(file_path) as file:
+        while True:
+            lines = list(itertools.islice(file, chunk_size))
+            if not lines:
+                return
+            rows = [line.replace(',', ' ').split() for line in lines]
+            rows = [row for row in rows if row and not row[0].startswith('#')]
+            chunks.add([row[0] for row in rows], [row[1] for row in rows],
+                       _to_floats([row[2] if len(row) > 2 else 'nan' for row in rows]),
+                       _to_floats([row[3] if len(row) > 3 else 'nan' for row in rows]))
+
+
+def _feature_collection_features(file, block_size=BLOCK_SIZE):
+    """
+    The features of a GeoJSON FeatureCollection, decoded one by one from a buffer of a couple of blocks, so the
+    file is never loaded at once.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    match = None
+    while match is None:
+        block = file.read(block_size)
+        if not block:
+            return
+        buffer += block
+        match = re.search(r'"features"\s*:\s*\[', buffer)
+    position = match.end()
+
+    while True:
+        # skip to the next feature
+        while position < len(buffer) and buffer[position] in ' \t\r\n,':
+            position += 1
+        if position == len(buffer):
+            buffer, position = file.read(block_size), 0
+            if not buffer:
+                return
+            continue
+        if buffer[position] == ']':
+            return
+        try:
+            feature, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            # the feature goes on in the next block
+            block = file.read(block_size)
+            if not block:
+                raise
+            buffer, position = buffer[position:] + block, 0
+            continue
+        yield feature
+        if position > block_size:
+            buffer, position = buffer[position:], 0
+
+
+def _line_features(file):
+    # GeoJSON text sequences, a feature per line (RFC 8142 record separators are skipped)
+    for line in file:
+        line = line.strip().lstrip('\x1e')
+        if line:
+            yield json.loads(line)
+
+
+def _points(points):
+    # (n, 2) array of GeoJSON positions, an altitude is dropped
+    try:
+        points = np.asarray(points, dtype=float)
+    except ValueError:
+        # some of the positions have an altitude
+        points = np.array([point[:2] for point in points], dtype=float)
+    return points.reshape(len(points), -1)[:, :2]
+
+
+def _polyline_lengths(points, offsets, geographic):
+    # the length in km of every polyline (points[offsets[i]:offsets[i + 1]]), at once
+    if geographic:
+        lon, lat = np.radians(points[:, 0]), np.radians(points[:, 1])
+        a = (np.sin(np.diff(lat) / 2) ** 2 +
+             np.cos(lat[:-1]) * np.cos(lat[1:]) * np.sin(np.diff(lon) / 2) ** 2)
+        segments = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1)))
+    else:
+        segments = np.hypot(*np.diff(points, axis=0).T)
+    # the segments between two polylines are dropped
+    cumulative = np.concatenate([[0], np.cumsum(segments)])
+    return cumulative[offsets[1:] - 1] - cumulative[offsets[:-1]]
+
+
+def _add_features(chunks, features, geographic, length_scale):
+    # every LineString (or part of a MultiLineString) is a road between its first and last points
+    lines, properties, whole = [], [], []
+    for feature in features:
+        geometry = feature.get('geometry') or {}
+        if geometry.get('type') == 'LineString':
+            parts = [geometry['coordinates']]
+        elif geometry.get('type') == 'MultiLineString':
+            parts = geometry['coordinates']
+        else:
+            continue
+        feature_properties = feature.get('properties') or {}
+        for line in parts:
+            if len(line) >= 2:
+                lines.append(line)
+                properties.append(feature_properties)
+                # the length and the u, v properties are of the whole feature
+                whole.append(len(parts) == 1)
+    if not lines:
+        return
+
+    def texts(key):
+        return ['' if p.get(key) is None else str(p[key]) for p in properties]
+    speeds = _parse_speeds(texts('maxspeed'), texts('highway'))
+    lengths = np.array([_to_float(p.get('length')) if w else math.nan for p, w in zip(properties, whole)])
+    lengths *= length_scale
+    missing = np.flatnonzero(np.isnan(lengths))
+    if len(missing):
+        missing_lines = [lines[i] for i in missing]
+        offsets = np.cumsum([0] + [len(line) for line in missing_lines])
+        polyline_lengths = _polyline_lengths(_points(list(itertools.chain.from_iterable(missing_lines))), offsets,
+                                             geographic)
+        lengths[missing] = polyline_lengths if geographic else polyline_lengths * length_scale
+
+    # nodes are the u, v properties, or else they're identified by their rounded coordinates
+    firsts = _points([line[0] for line in lines])
+    lasts = _points([line[-1] for line in lines])
+    scale = 1e7 if geographic else length_scale * 1e6  # planar coordinates to the mm
+    source_keys = list(zip(*np.round(firsts * scale).astype(np.int64).T.tolist()))
+    target_keys = list(zip(*np.round(lasts * scale).astype(np.int64).T.tolist()))
+    for i, (p, w) in enumerate(zip(properties, whole)):
+        if w and p.get('u') is not None and p.get('v') is not None:
+            source_keys[i], target_keys[i] = str(p['u']), str(p['v'])
+
+    ids = chunks.add(source_keys, target_keys, lengths, speeds)
+    chunks.add_coordinates(ids, np.stack([firsts, lasts], axis=1))
+
+
+def _read_geojson(chunks, file_path, chunk_size, geographic, length_scale, line_delimited):
+    with open(file_path) as file:
+        features = _line_features(file) if line_delimited else _feature_collection_features(file)
+        while True:
+            chunk = list(itertools.islice(features, chunk_size))
+            if not chunk:
+                return
+            _add_features(chunks, chunk, geographic, length_scale)
+
+
+def _read_nodes(chunks, nodes_path, chunk_size):
+    # the coordinates of the interned nodes from a nodes csv (id, x, y columns), the other nodes are skipped
+    csv_chunks = _csv_chunks(nodes_path, chunk_size)
+    header = next(csv_chunks, None)
+    if header is None:
+        return
+    node_id, x, y = _column(header, NODE_ID_COLUMNS), _column(header, X_COLUMNS), _column(header, Y_COLUMNS)
+    for rows in csv_chunks:
+        columns = list(zip(*rows))
+        ids = chunks.interner.lookup([key.strip() for key in columns[node_id]])
+        known = ids >= 0
+        chunks.node_ids.append(ids[known])
+        chunks.coordinates.append(np.column_stack([_to_floats(columns[x]), _to_floats(columns[y])])[known])
+
+
+def _project(coordinates, geographic, length_scale):
+    # positions in the units of NavigationLogics: 100 times the distance between them is the road length in km
+    if not geographic:
+        return coordinates * length_scale / KM_PER_POSITION_UNIT
+    # equirectangular projection around the center of the map, north up on the screen
+    lon0, lat0 = np.nanmean(coordinates, axis=0)
+    x = np.radians(coordinates[:, 0] - lon0) * math.cos(math.radians(lat0)) * EARTH_RADIUS_KM
+    y = np.radians(lat0 - coordinates[:, 1]) * EARTH_RADIUS_KM
+    return np.column_stack([x, y]) / KM_PER_POSITION_UNIT
+
+
+def _layout(num_of_nodes, sources, targets, lengths):
+    """
+    Positions of a map whose nodes have no coordinates: the layout of the graph (see
+    GraphGenerator.layout_positions). It's scaled so the roads without a length are NODES_SPACING apart on average,
+    their lengths are the straight line between their nodes, and then shrunk until no straight line is longer than
+    its road, so the aerial distance heuristics stay admissible.
+
+    :return: The (num_of_nodes, 2) positions, lengths is filled in place.
+    """
+    nodes = list(range(num_of_nodes))
+    layout = layout_positions(nodes, list(zip(sources.tolist(), targets.tolist())))
+    positions = np.array([layout[node] for node in nodes], dtype=float).reshape(-1, 2)
+    distances = KM_PER_POSITION_UNIT * np.hypot(*(positions[sources] - positions[targets]).T)
+    missing = np.isnan(lengths)
+    if missing.any():
+        mean = distances[missing].mean()
+        scale = KM_PER_POSITION_UNIT * NODES_SPACING / mean if mean > 0 else 1
+        positions *= scale
+        distances *= scale
+        lengths[missing] = distances[missing]
+    longer = distances > lengths
+    if longer.any():
+        positions *= np.min(lengths[longer] / distances[longer])
+    return positions
+
+
+def import_road_network(file_path, nodes_path=None, file_format=None, geographic=True, length_scale=METERS,
+                        chunk_size=CHUNK_SIZE, seed=None):
+    """
+    Import a real road network, streaming the files in chunks of chunk_size rows (or features).
+
+    Supported files:
+        csv - an OSM-extract edges csv with a header: u, v and optionally length, maxspeed and highway columns
+              (see the *_COLUMNS names).
+        geojson / geojsonl - a GeoJSON FeatureCollection (streamed feature by feature) or a feature per line, of
+              LineStrings. A road connects the first and last points of a line, its nodes are the u, v properties
+              if there are, or else the points. The length and maxspeed / highway properties are used if there
+              are, the length is the length of the line otherwise.
+        edgelist - plain 'u v [length [speed]]' lines.
+    The node ids are interned into dense integers, node i is the i-th distinct node id of the file. Roads given
+    more than once keep the fastest, self loops are dropped. Speeds are in km/h, a missing speed is by the highway
+    tag (local roads without one), and they're clipped to the range of NavigationLogics.speed_limits.
+
+    :param file_path: The edges file.
+    :param nodes_path: A nodes csv with id and x / y (lon / lat) columns, the coordinates of the csv and edgelist
+                       nodes.
+    :param file_format: One of FILE_FORMATS, by the file extension if None.
+    :param geographic: The coordinates are (lon, lat), or else planar in the files' length unit.
+    :param length_scale: km per length unit of the files, defaults to meters.
+    :param chunk_size: Number of rows (or features) parsed at once.
+    :param seed: Seed of the source and destination draw.
+    :return: (nodes, edges, src_node, dest_node, nodes_positions, None, speed_limits, road_lengths), the arguments
+             of NavigationLogics: speed_limits and road_lengths (km) are arrays with the value of every edge in
+             edges, the road_speed_limits and road_lengths arguments. If the nodes have no coordinates (an
+             edgelist or a csv without nodes_path), nodes_positions is the layout of the graph (see _layout).
+    """
+    if file_format is None:
+        extension = os.path.splitext(file_path)[1].lower()
+        file_format = {'.csv': 'csv', '.geojson': 'geojson', '.json': 'geojson', '.geojsonl': 'geojsonl',
+                       '.geojsons': 'geojsonl', '.ndjson': 'geojsonl'}.get(extension, 'edgelist')
+    chunks = _EdgeChunks()
+    if file_format == 'csv':
+        _read_csv_edges(chunks, file_path, chunk_size)
+    elif file_format in ('geojson', 'geojsonl'):
+        _read_geojson(chunks, file_path, chunk_size, geographic, length_scale, file_format == 'geojsonl')
+    elif file_format == 'edgelist':
+        _read_edge_list(chunks, file_path, chunk_size)
+    else:
+        raise ValueError(f"unknown road network file format: {file_format}")
+    if nodes_path is not None:
+        _read_nodes(chunks, nodes_path, chunk_size)
+
+    n = len(chunks.interner)
+    sources, targets, lengths, speeds = chunks.arrays()
+    positions = None
+    if chunks.node_ids:
+        coordinates = np.full((n, 2), math.nan)
+        coordinates[np.concatenate(chunks.node_ids)] = np.concatenate(chunks.coordinates)
+        if np.isnan(coordinates).any():
+            raise ValueError(f"{int(np.isnan(coordinates[:, 0]).sum())} nodes have no coordinates")
+        positions = _project(coordinates, geographic, length_scale)
+
+    # lengths in km, the missing ones are the straight line between the nodes
+    lengths = lengths * (1 if file_format in ('geojson', 'geojsonl') else length_scale)
+    missing = np.isnan(lengths)
+    if missing.any() and positions is not None:
+        lengths[missing] = KM_PER_POSITION_UNIT * np.hypot(*(positions[sources[missing]] -
+                                                            positions[targets[missing]]).T)
+    speeds[np.isnan(speeds)] = speed_limits[LOCAL]
+    speeds = np.clip(speeds, min(speed_limits), max(speed_limits))
+
+    # drop the self loops, and keep the fastest of the roads given more than once
+    keep = sources != targets
+    low, high = np.minimum(sources, targets)[keep], np.maximum(sources, targets)[keep]
+    lengths, speeds = lengths[keep], speeds[keep]
+    order = np.lexsort((lengths / speeds, high, low))
+    low, high, lengths, speeds = low[order], high[order], lengths[order], speeds[order]
+    first = np.ones(len(low), dtype=bool)
+    first[1:] = (low[1:] != low[:-1]) | (high[1:] != high[:-1])
+    low, high, lengths, speeds = low[first], high[first], lengths[first], speeds[first]
+    if positions is None:
+        positions = _layout(n, low, high, lengths)
+
+    src, dest = component_endpoints(n, low, high, np.random.default_rng(seed))
+    nodes = list(range(n))
+    edges = list(zip(low.tolist(), high.tolist()))
+    nodes_positions = dict(zip(nodes, map(tuple, positions.tolist())))
+    return nodes, edges, src, dest, nodes_positions, None, speeds, lengths
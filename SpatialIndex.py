@@ -0,0 +1,81 @@
+import numpy as np
+
+
+class GridIndex:
+    def __init__(self, starts, ends, cell_size=None):
+        """
+        A uniform grid spatial index over line segments (points are segments with equal ends).
+
+        Every segment is registered in all the cells its bounding box covers. The cells are kept CSR-like, the
+        segment ids of cell c are cell_items[cell_offsets[c]:cell_offsets[c + 1]], so a box query only gathers the
+        cells it covers and its cost depends on what's inside the box, not on the number of segments.
+
+        :param starts: (n, 2) array of the segments' first ends.
+        :param ends: (n, 2) array of the segments' second ends.
+        :param cell_size: The side of a cell. By default about one segment per cell, but not smaller than the
+                          mean extent of a segment, so long segments don't cover many cells.
+        """
+        starts = np.asarray(starts, dtype=float).reshape(-1, 2)
+        ends = np.asarray(ends, dtype=float).reshape(-1, 2)
+        self.mins = np.minimum(starts, ends)
+        self.maxs = np.maximum(starts, ends)
+        self.num_of_items = len(starts)
+
+        if self.num_of_items:
+            self.origin = self.mins.min(axis=0)
+            self.end = self.maxs.max(axis=0)
+        else:
+            self.origin = np.zeros(2)
+            self.end = np.zeros(2)
+        extent = self.end - self.origin
+        if cell_size is None:
+            cell_size = max(extent.max() / max(np.sqrt(self.num_of_items), 1),
+                            (self.maxs - self.mins).max(axis=1).mean() if self.num_of_items else 0)
+        self.cell_size = cell_size if cell_size > 0 else 1.0
+        self.shape = (np.floor(extent / self.cell_size).astype(int) + 1)  # (columns, rows)
+
+        # register every segment in the cells of its bounding box, all at once
+        low = self._cells(self.mins)
+        high = self._cells(self.maxs)
+        widths = high[:, 0] - low[:, 0] + 1
+        counts = widths * (high[:, 1] - low[:, 1] + 1)
+        items = np.repeat(np.arange(self.num_of_items), counts)
+        k = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        columns = low[items, 0] + k % widths[items]
+        rows = low[items, 1] + k // widths[items]
+        cells = rows * self.shape[0] + columns
+
+        order = np.argsort(cells, kind='stable')
+        self.cell_items = items[order]
+        self.cell_offsets = np.zeros(self.shape[0] * self.shape[1] + 1, dtype=np.int64)
+        np.cumsum(np.bincount(cells, minlength=self.shape[0] * self.shape[1]), out=self.cell_offsets[1:])
+
+    def _cells(self, points):
+        # the (column, row) of the cells of points, clipped to the grid
+        cells = np.floor((np.asarray(points, dtype=float) - self.origin) / self.cell_size).astype(int)
+        return np.clip(cells, 0, self.shape - 1)
+
+    def query(self, box_min, box_max):
+        """
+        The segments whose bounding box intersects a box.
+
+        :param box_min: (x, y) of the box's lower corner.
+        :param box_max: (x, y) of the box's upper corner.
+        :return: A sorted array of the segment ids.
+        """
+        box_min = np.asarray(box_min, dtype=float)
+        box_max = np.asarray(box_max, dtype=float)
+        if not self.num_of_items or (box_max < self.origin).any() or (box_min > self.end).any():
+            return np.zeros(0, dtype=int)
+
+        (low_column, low_row), (high_column, high_row) = self._cells(box_min), self._cells(box_max)
+        cells = (np.arange(low_row, high_row + 1)[:, None] * self.shape[0] +
+                 np.arange(low_column, high_column + 1)[None, :]).ravel()
+        firsts = self.cell_offsets[cells]
+        counts = self.cell_offsets[cells + 1] - firsts
+        k = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        candidates = np.unique(self.cell_items[np.repeat(firsts, counts) + k])
+
+        # the cells are coarser than the boxes
+        inside = ((self.mins[candidates] <= box_max).all(axis=1) & (self.maxs[candidates] >= box_min).all(axis=1))
+        return candidates[inside]
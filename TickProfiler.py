@@ -0,0 +1,228 @@
+import argparse
+import cProfile
+import json
+import math
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+TRACE_FILE = 'tick_trace.jsonl'
+# the latency histogram has this many bins per doubling of the time, about 19% wide
+BINS_PER_OCTAVE = 4
+PERCENTILES = (50, 90, 99)
+# number of the largest allocation changes a memory snapshot keeps
+TOP_ALLOCATIONS = 10
+
+# the phase of the whole tick
+TICK_PHASE = 'tick'
+
+_NO_PHASE = nullcontext()
+
+
+class TickHooks:
+    """
+    Hooks NavigationLogics.update calls around every tick and its phases: traffic (the traffic draw), costs (the
+    cost table), searches (all the searches, and search.<agent>.<scenario> for every one of them) and recording.
+    These don't do anything, TickProfiler overrides them.
+    """
+
+    def start_tick(self):
+        pass
+
+    def phase(self, name):
+        # context manager around a phase of the tick
+        return _NO_PHASE
+
+    def add_phase(self, name, elapsed_ns):
+        # a phase timed elsewhere, e.g. a search timed by NavigationLogics.find_path_of_agent
+        pass
+
+    def end_tick(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class LatencyHistogram:
+    def __init__(self):
+        """
+        Latencies of a phase in log spaced bins, BINS_PER_OCTAVE per doubling of the time, with the count, total,
+        min and max.
+        """
+        self.count = 0
+        self.total = 0
+        self.minimum = None
+        self.maximum = 0
+        self.bins = {}  # bin -> count, bin b holds the times below bin_upper(b)
+
+    def add(self, elapsed_ns):
+        self.count += 1
+        self.total += elapsed_ns
+        self.minimum = elapsed_ns if self.minimum is None else min(self.minimum, elapsed_ns)
+        self.maximum = max(self.maximum, elapsed_ns)
+        b = int(math.log2(max(elapsed_ns, 1)) * BINS_PER_OCTAVE)
+        self.bins[b] = self.bins.get(b, 0) + 1
+
+    @staticmethod
+    def bin_upper(b):
+        return 2 ** ((b + 1) / BINS_PER_OCTAVE)
+
+    def percentile(self, q):
+        # approximate, the upper edge of the bin of the q-th percentile, at most the max
+        rank = q / 100 * self.count
+        seen = 0
+        for b in sorted(self.bins):
+            seen += self.bins[b]
+            if seen >= rank:
+                return min(self.bin_upper(b), self.maximum)
+        return self.maximum
+
+    def as_dict(self):
+        return {'count': self.count, 'total_ns': self.total, 'mean_ns': self.total / self.count if self.count else 0,
+                'min_ns': self.minimum, 'max_ns': self.maximum,
+                **{f'p{q}_ns': round(self.percentile(q)) for q in PERCENTILES},
+                'bins': [[round(self.bin_upper(b)), self.bins[b]] for b in sorted(self.bins)]}
+
+
+class TickProfiler(TickHooks):
+    def __init__(self, trace_file=TRACE_FILE, trace_memory=False, profile_file=None, profile_every=1):
+        """
+        Profiling hooks: times every phase of every tick with time.perf_counter_ns, writes a json line per tick to
+        the trace and aggregates a LatencyHistogram per phase. The histograms are appended to the trace on close.
+
+        The memory tracing and the profiling are opt in, they slow the ticks down - compare their phases with each
+        other, not with a run without them.
+
+        :param trace_file: The json lines trace, None - only the histograms are kept.
+        :param trace_memory: Trace the allocations with tracemalloc: the traced and peak memory of every tick and
+                             the TOP_ALLOCATIONS largest changes since the previous tick's snapshot.
+        :param profile_file: File the cProfile stats of the profiled ticks are dumped to (pstats format), None - no
+                             profiling.
+        :param profile_every: Profile every this many ticks, a sample of the ticks for long runs.
+        """
+        self.histograms = {}  # phase -> LatencyHistogram
+        self.tick = 0
+        self.phases = None  # phase -> nanoseconds of the current tick
+        self.tick_start = None
+        self.trace = open(trace_file, 'w') if trace_file is not None else None
+        self.trace_memory = trace_memory
+        self.snapshot = None
+        if trace_memory:
+            tracemalloc.start()
+            self.snapshot = self.take_snapshot()
+        self.profile_file = profile_file
+        self.profile_every = profile_every
+        self.profiler = cProfile.Profile() if profile_file is not None else None
+        self.profiling = False
+
+    def start_tick(self):
+        self.phases = {}
+        if self.profiler is not None and self.tick % self.profile_every == 0:
+            self.profiler.enable()
+            self.profiling = True
+        self.tick_start = time.perf_counter_ns()
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.add_phase(name, time.perf_counter_ns() - start)
+
+    def add_phase(self, name, elapsed_ns):
+        self.phases[name] = self.phases.get(name, 0) + elapsed_ns
+
+    def end_tick(self):
+        self.phases[TICK_PHASE] = time.perf_counter_ns() - self.tick_start
+        if self.profiling:
+            self.profiler.disable()
+            self.profiling = False
+        for name, elapsed_ns in self.phases.items():
+            if name not in self.histograms:
+                self.histograms[name] = LatencyHistogram()
+            self.histograms[name].add(elapsed_ns)
+
+        if self.trace is not None:
+            record = {'tick': self.tick, 'phases_ns': self.phases}
+            if self.trace_memory:
+                record['memory'] = self.memory_record()
+            self.trace.write(json.dumps(record) + '\n')
+        self.tick += 1
+
+    def take_snapshot(self):
+        # the allocations of the profiler itself aren't counted
+        return tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__),
+                                                          tracemalloc.Filter(False, __file__)])
+
+    def memory_record(self):
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        snapshot = self.take_snapshot()
+        top = snapshot.compare_to(self.snapshot, 'lineno')[:TOP_ALLOCATIONS]
+        self.snapshot = snapshot
+        return {'current': current, 'peak': peak,
+                'top': [{'file': stat.traceback[0].filename, 'line': stat.traceback[0].lineno,
+                         'size_diff': stat.size_diff, 'count_diff': stat.count_diff} for stat in top]}
+
+    def report(self):
+        return format_report(self.histograms)
+
+    def close(self):
+        if self.trace is not None:
+            for name, histogram in self.histograms.items():
+                self.trace.write(json.dumps({'phase': name, **histogram.as_dict()}) + '\n')
+            self.trace.close()
+            self.trace = None
+        if self.profiler is not None:
+            self.profiler.dump_stats(self.profile_file)
+            self.profiler = None
+        if self.trace_memory:
+            tracemalloc.stop()
+            self.trace_memory = False
+
+
+def read_trace(file_path):
+    """
+    The per phase histograms of the ticks of a trace.
+
+    :return: Dictionary {phase: LatencyHistogram}.
+    """
+    histograms = {}
+    with open(file_path) as file:
+        for line in file:
+            record = json.loads(line)
+            for name, elapsed_ns in record.get('phases_ns', {}).items():
+                if name not in histograms:
+                    histograms[name] = LatencyHistogram()
+                histograms[name].add(elapsed_ns)
+    return histograms
+
+
+def format_report(histograms):
+    """
+    A table of the phases, the slowest first: the number of ticks, the total time and its share of the ticks
+    time, the mean, the percentiles and the max, in milliseconds.
+    """
+    tick_total = histograms[TICK_PHASE].total if TICK_PHASE in histograms else 0
+    lines = [f"{'phase':<48} {'count':>7} {'total':>10} {'share':>6} {'mean':>9} "
+             + ' '.join(f"{f'p{q}':>9}" for q in PERCENTILES) + f" {'max':>9}"]
+    for name, histogram in sorted(histograms.items(), key=lambda item: -item[1].total):
+        share = f'{100 * histogram.total / tick_total:.1f}%' if tick_total else ''
+        lines.append(f'{name:<48} {histogram.count:>7} {histogram.total / 1e6:>10.1f} {share:>6} '
+                     f'{histogram.total / histogram.count / 1e6:>9.3f} '
+                     + ' '.join(f'{histogram.percentile(q) / 1e6:>9.3f}' for q in PERCENTILES)
+                     + f' {histogram.maximum / 1e6:>9.3f}')
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per phase latencies of the ticks of a trace.')
+    parser.add_argument('file', nargs='?', default=TRACE_FILE, help=f'The json lines trace (default: {TRACE_FILE})')
+    args = parser.parse_args()
+    print(format_report(read_trace(args.file)))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,79 +1,130 @@
 import heapq
 import math
-from collections import defaultdict
-from agents.agent import Agent, ASTAR__ZERO_H, ASTAR__AERIAL_DIST_H, ASTAR__DIJKSTRA_H, ASTAR__COMBINATION_H, ASTAR__NONADMISSIBLE_H
+from agents.HeuristicCache import heuristic_cache
+from agents.Landmarks import get_landmark_tables
+from agents.agent import Agent, ASTAR__ZERO_H, ASTAR__AERIAL_DIST_H, ASTAR__DIJKSTRA_H, ASTAR__COMBINATION_H, ASTAR__NONADMISSIBLE_H, \
+    ASTAR__LANDMARK_H
 
 
 class AStarAgent(Agent):
-    def __init__(self, goal_node, edges, nodes_positions, roads_length, speed_limit, heuristic):
+    def __init__(self, goal_node, graph, nodes_positions, roads_length, speed_limit, heuristic):
         """
         Initialize the A* agent with additional parameters needed for pathfinding.
 
         :param start_node: The starting node of the agent.
         :param goal_node: The goal node the agent aims to reach.
-        :param edges: List of edges represented as tuples (start_node, end_node).
-        :param edge_costs: Dictionary with edge costs {(start_node, end_node): cost}.
+        :param graph: RoadGraph adjacency index of the directed edges.
         :param nodes_positions: Dictionary of node positions {node: (x, y)}.
+        :param roads_length: Array with the length of every edge, indexed by edge id.
+        :param speed_limit: Array with the speed limit of every edge, indexed by edge id.
         """
         max_speed_limit = 120
         min_speed_limit = 20
-        super().__init__(goal_node, edges, nodes_positions, max_speed_limit)
+        super().__init__(goal_node, graph, nodes_positions, max_speed_limit)
         self.heuristic = ZeroHeuristic()
         if heuristic == ASTAR__AERIAL_DIST_H:
             self.heuristic = AerialDistHeuristic(nodes_positions, max_speed_limit)
         elif heuristic == ASTAR__DIJKSTRA_H:
-            self.heuristic = DijkstraHeuristic(goal_node, edges, roads_length, speed_limit)
+            self.heuristic = DijkstraHeuristic(goal_node, graph, roads_length, speed_limit)
         elif heuristic == ASTAR__COMBINATION_H:
-            self.heuristic = AdmissibleCombinationHeuristic(nodes_positions, max_speed_limit, goal_node, edges, roads_length, speed_limit)
+            self.heuristic = AdmissibleCombinationHeuristic(nodes_positions, max_speed_limit, goal_node, graph, roads_length,
+                                                            speed_limit)
         elif heuristic == ASTAR__NONADMISSIBLE_H:
             self.heuristic = NonAdmissibleHeuristic(nodes_positions, min_speed_limit, speed_limit)
+        elif heuristic == ASTAR__LANDMARK_H:
+            self.heuristic = LandmarkHeuristic(goal_node, graph, nodes_positions, roads_length, speed_limit)
 
     def find_path(self, start_node, edge_costs):
-        """Find the shortest path from the start node to the goal node using A* algorithm."""
-        # Initialize the priority queue with edges starting from the start node
-        open_set = []  # (f_cost, current_edge, total_cost, path)
-
-        # Start with edges directed out from the source node
-        for edge in self.edges:
-            if edge[0] == start_node:
-                initial_cost = edge_costs.get(edge, float('inf'))
-                f_cost = initial_cost + self.heuristic.heuristic(edge[1], self.goal_node)
-                heapq.heappush(open_set, (f_cost, edge, initial_cost, [edge]))
-
-        # Track visited nodes to avoid revisiting
+        """
+        Find the shortest path from the start node to the goal node using A* algorithm.
+
+        Every reached node keeps only its best known g cost and the edge it was reached by (parent pointer),
+        pushes that don't improve the best g are skipped, and the path is rebuilt only once the goal is popped.
+        Ties are broken by the edge tuple, exactly as when the open set held whole paths.
+        """
+        graph = self.graph
+        edges = graph.edges
+        offsets, targets, edge_ids = graph.out_offsets_list, graph.out_targets_list, graph.out_edge_ids_list
+        node_index = graph.node_index
+        nodes = graph.nodes
+        heuristic = self.heuristic.heuristic
+        goal_node = self.goal_node
+        start = node_index[start_node]
+        goal = node_index[goal_node]
+
+        open_set = []  # (f_cost, edge, g_cost, node id, edge id)
+        best_g = {}  # node id -> best known cost from the start node
+        parent = {}  # node id -> id of the edge the best known cost was reached by
+        # nodes whose cost is final. the start node is not closed, as a path has at least one edge
         visited = set()
+        # counted locally and stored in self.stats once the search ends
+        pops = peak_open_set = 0
 
-        while open_set:
-            # Pop the edge with the lowest f_cost from the priority queue
-            current_f_cost, current_edge, current_g_cost, path = heapq.heappop(open_set)
+        current, current_g_cost = start, 0
+        while True:
+            # Explore outgoing edges from the current node
+            for k in range(offsets[current], offsets[current + 1]):
+                next_node = targets[k]
+                if next_node in visited:
+                    continue
 
-            # Current node is the destination node of the current edge
-            current_node = current_edge[1]
+                edge_id = edge_ids[k]
+                next_edge = edges[edge_id]
+                new_g_cost = current_g_cost + edge_costs[edge_id]
 
-            # If the destination node is reached, return the path of edges
-            if current_node == self.goal_node:
+                # Skip the push if it doesn't improve the best known g of next_node
+                old_g_cost = best_g.get(next_node)
+                if old_g_cost is not None and \
+                        (new_g_cost > old_g_cost or (new_g_cost == old_g_cost and next_edge >= edges[parent[next_node]])):
+                    continue
+                best_g[next_node] = new_g_cost
+                parent[next_node] = edge_id
+
+                new_f_cost = new_g_cost + heuristic(nodes[next_node], goal_node)
+                heapq.heappush(open_set, (new_f_cost, next_edge, new_g_cost, next_node, edge_id))
+
+            # the open set only grows by the pushes above, so it peaks before the pops
+            if len(open_set) > peak_open_set:
+                peak_open_set = len(open_set)
+
+            # Pop the node with the lowest f_cost, dropping entries that were improved on after they were pushed
+            while open_set:
+                _, _, current_g_cost, current, edge_id = heapq.heappop(open_set)
+                pops += 1
+                if current not in visited and parent[current] == edge_id:
+                    break
+            else:
+                self.record_stats(start, visited, pops, len(open_set), peak_open_set)
+                return None  # No path found
+
+            # If the destination node is reached, rebuild the path of edges from the parent pointers
+            if current == goal:
+                self.record_stats(start, visited, pops, len(open_set), peak_open_set)
+                path = []
+                while True:
+                    edge_id = parent[current]
+                    path.append(edges[edge_id])
+                    current = graph.edge_sources_list[edge_id]
+                    if current == start:
+                        break
+                path.reverse()
                 self.path = path
                 return path
 
             # Mark the current node as visited
-            visited.add(current_node)
-
-            # Explore outgoing edges from the current node
-            for next_edge in self.edges:
-                # Ensure the edge starts from the current node and has not been visited
-                if next_edge[0] != current_node or next_edge[1] in visited:
-                    continue
-
-                # Calculate the g_cost for the new path
-                new_g_cost = current_g_cost + edge_costs.get(next_edge, float('inf'))
-
-                # Calculate f_cost using heuristic
-                new_f_cost = new_g_cost + self.heuristic.heuristic(next_edge[1], self.goal_node)
-
-                # Add the new path to the priority queue
-                heapq.heappush(open_set, (new_f_cost, next_edge, new_g_cost, path + [next_edge]))
+            visited.add(current)
 
-        return None  # No path found
+    def record_stats(self, start, visited, pops, open_set_size, peak_open_set):
+        stats = self.stats
+        stats.reset()
+        # the start node is expanded first, it's closed only if a cycle leads back to it
+        stats.expansions = len(visited) + (start not in visited)
+        # every pushed entry was either popped or is still in the open set
+        stats.pushes = pops + open_set_size
+        stats.pops = pops
+        stats.peak_open_set = peak_open_set
+        # the heuristic is evaluated once per push
+        stats.heuristic_evaluations = stats.pushes
 
 
 class Heuristic():
@@ -103,9 +154,9 @@ class NonAdmissibleHeuristic(Heuristic):
         return distance / self.min_speed_limit
 
 class AdmissibleCombinationHeuristic(Heuristic):
-    def __init__(self, nodes_positions, max_speed_limit, goal_node, edges, roads_length, speed_limit):
+    def __init__(self, nodes_positions, max_speed_limit, goal_node, graph, roads_length, speed_limit):
         self.aerial = AerialDistHeuristic(nodes_positions, max_speed_limit)
-        self.dijkstra = DijkstraHeuristic(goal_node, edges, roads_length, speed_limit)
+        self.dijkstra = DijkstraHeuristic(goal_node, graph, roads_length, speed_limit)
 
     def heuristic(self, start_node, goal_node):
         return 0.5 * self.aerial.heuristic(start_node, goal_node) + \
@@ -130,50 +181,33 @@ class AerialDistHeuristic(Heuristic):
 
 
 class DijkstraHeuristic(Heuristic):
-    def __init__(self, goal_node, edges, roads_length, speed_limit):
+    def __init__(self, goal_node, graph, roads_length, speed_limit):
         """
         Initialize the DijkstraHeuristic with precomputed shortest path costs from all nodes to the goal node.
+        The costs table is taken from the shared heuristic cache, so it's computed once per goal node.
         """
         self.goal_node = goal_node
-        self.edges = edges
-        self.edge_costs = {edge: roads_length[edge]/speed_limit[edge] for edge in edges}
-        self.dijkstra_costs = self.compute_dijkstra_costs()
+        self.graph = graph
+        self.edge_costs = roads_length / speed_limit
+        self.dijkstra_costs = heuristic_cache.get_costs_to_goal(graph, goal_node, self.edge_costs)
 
-    def compute_dijkstra_costs(self):
+    def heuristic(self, start_node, goal):
         """
-        Compute shortest path costs from all nodes to the goal node using Dijkstra's algorithm.
-        Returns a dictionary with nodes as keys and their cost to the goal node as values.
+        Return the precomputed Dijkstra cost from the start node to the goal node.
         """
-        costs = defaultdict(lambda: float('inf'))
-        costs[self.goal_node] = 0
-        priority_queue = [(0, self.goal_node)]  # (cost, node)
-
-        # Reverse the edges to work from goal node backwards
-        reverse_edges = defaultdict(list)
-        for start, end in self.edges:
-            reverse_edges[end].append((start, self.edge_costs.get((start, end), float('inf'))))
-
-        visited = set()
-
-        while priority_queue:
-            current_cost, current_node = heapq.heappop(priority_queue)
+        return self.dijkstra_costs[self.graph.node_index[start_node]]
 
-            if current_node in visited:
-                continue
-            visited.add(current_node)
 
-            for neighbor, edge_cost in reverse_edges[current_node]:
-                new_cost = current_cost + edge_cost
-                if new_cost < costs[neighbor]:
-                    costs[neighbor] = new_cost
-                    heapq.heappush(priority_queue, (new_cost, neighbor))
-
-        return costs
-
-    def heuristic(self, start_node, goal):
+class LandmarkHeuristic(Heuristic):
+    def __init__(self, goal_node, graph, nodes_positions, roads_length, speed_limit):
         """
-        Return the precomputed Dijkstra cost from the start node to the goal node.
+        ALT heuristic: lower bounds from the triangle inequality with precomputed landmark tables.
+        The tables hold free flow (no traffic) travel times, so the bounds are admissible under any traffic,
+        and they serve any destination - only the cheap per goal bounds vector is computed here.
         """
-        return self.dijkstra_costs.get(start_node, float('inf'))
-
+        self.graph = graph
+        tables = get_landmark_tables(graph, roads_length / speed_limit, nodes_positions)
+        self.bounds = tables.lower_bounds(graph.node_index[goal_node])
 
+    def heuristic(self, start_node, goal):
+        return self.bounds[self.graph.node_index[start_node]]
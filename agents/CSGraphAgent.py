@@ -0,0 +1,65 @@
+import numpy as np
+from agents.agent import Agent
+from agents.CostMatrix import CostMatrix
+from agents.HeuristicCache import heuristic_cache
+
+
+class CSGraphAgent(Agent):
+    def __init__(self, goal_node, graph, nodes_positions, max_speed_limit):
+        """
+        Initialize the csgraph agent, a compiled Dijkstra for large road networks.
+
+        The reversed graph is kept as a CSR CostMatrix. Every new set of edge costs is written into its data
+        array in place and a single backward Dijkstra from the goal node gives the shortest path tree toward the
+        goal, which answers find_path from any node. The tree's costs are the Dijkstra heuristic table of these
+        costs, so they're added to the shared heuristic cache.
+
+        :param goal_node: The goal node the agent aims to reach.
+        :param graph: RoadGraph adjacency index of the directed edges.
+        :param nodes_positions: Dictionary of node positions {node: (x, y)}.
+        :param max_speed_limit: The maximum speed limit.
+        """
+        super().__init__(goal_node, graph, nodes_positions, max_speed_limit)
+        self.matrix = CostMatrix(graph, reverse=True)
+        self.edge_costs = None  # the costs the current tree was computed for
+        self.costs_to_goal = None
+        self.next_nodes = None  # the next node on the shortest path from every node id to the goal
+
+    def update_edge_costs(self, edge_costs):
+        # recompute the shortest path tree toward the goal, only if the costs changed
+        if self.edge_costs is not None and np.array_equal(self.edge_costs, edge_costs):
+            return
+        self.edge_costs = np.array(edge_costs, dtype=float)
+        self.matrix.update(self.edge_costs)
+        # on the reversed edges, the predecessor of a node is the next node toward the goal
+        self.costs_to_goal, next_nodes = self.matrix.search(self.graph.node_index[self.goal_node])
+        self.next_nodes = next_nodes.tolist()
+        # the compiled Dijkstra doesn't report its heap, only the nodes it settled are known
+        self.stats.expansions = int(np.isfinite(self.costs_to_goal).sum())
+        heuristic_cache.put(self.graph, self.goal_node, self.edge_costs, self.costs_to_goal)
+
+    def find_path(self, start_node, edge_costs):
+        """
+        Find the shortest path from the start node to the goal node by following the shortest path tree toward
+        the goal.
+        """
+        self.stats.reset()
+        self.update_edge_costs(edge_costs)
+        graph = self.graph
+        current = graph.node_index[start_node]
+        goal = graph.node_index[self.goal_node]
+        if np.isinf(self.costs_to_goal[current]):
+            return None
+
+        path = []
+        while current != goal:
+            next_node = self.next_nodes[current]
+            # the cheapest of the edges current -> next_node
+            edge_id = min((graph.out_edge_ids_list[k]
+                           for k in range(graph.out_offsets_list[current], graph.out_offsets_list[current + 1])
+                           if graph.out_targets_list[k] == next_node), key=self.edge_costs.__getitem__)
+            path.append(self.edges[edge_id])
+            current = next_node
+
+        self.path = path
+        return path
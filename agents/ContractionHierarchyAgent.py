@@ -0,0 +1,295 @@
+import heapq
+import numpy as np
+from agents.agent import Agent
+
+_hierarchies = {}
+
+
+class ContractionHierarchy:
+    def __init__(self, graph):
+        """
+        Contraction hierarchy of the road graph.
+
+        Preprocessing depends only on the topology: the nodes are ordered by minimum degree and contracted one by
+        one. Contracting a node connects all its remaining neighbors to each other with shortcuts. No witness
+        search is done, so the shortcuts stay valid for any edge costs. Customize then computes the cost of every
+        hierarchy arc for a given set of edge costs, reusing the contraction order, so new traffic costs only
+        need a customization and not a new contraction.
+
+        :param graph: RoadGraph adjacency index of the directed edges.
+        """
+        self.graph = graph
+        n = graph.num_nodes
+
+        # undirected neighbors of every node in the remaining (not contracted) graph
+        neighbors = [set() for _ in range(n)]
+        for u, v in zip(graph.edge_sources_list, graph.edge_targets_list):
+            if u != v:
+                neighbors[u].add(v)
+                neighbors[v].add(u)
+
+        # *** node ordering and shortcut creation ***
+        self.rank = [0] * n
+        upward = [None] * n  # node -> its neighbors at the time it's contracted, all of them have a higher rank
+        contracted = [False] * n
+        queue = [(len(neighbors[v]), v) for v in range(n)]
+        heapq.heapify(queue)
+        order = 0
+        while queue:
+            degree, v = heapq.heappop(queue)
+            if contracted[v] or degree != len(neighbors[v]):
+                continue  # stale entry
+            contracted[v] = True
+            self.rank[v] = order
+            order += 1
+            upward[v] = sorted(neighbors[v])
+            for u in upward[v]:
+                neighbors[u].discard(v)
+                # shortcuts between all the remaining neighbors of v
+                neighbors[u].update(w for w in upward[v] if w != u)
+            for u in upward[v]:
+                heapq.heappush(queue, (len(neighbors[u]), u))
+
+        self.order = sorted(range(n), key=lambda v: self.rank[v])
+
+        # *** hierarchy arcs in CSR form, every arc joins a node to one of its upward neighbors ***
+        self.up_offsets = [0] * (n + 1)
+        self.up_targets = []
+        self.arc_index = {}  # (lower node, higher node) -> arc id
+        for v in range(n):
+            for w in upward[v]:
+                self.arc_index[(v, w)] = len(self.up_targets)
+                self.up_targets.append(w)
+            self.up_offsets[v + 1] = len(self.up_targets)
+        self.num_arcs = len(self.up_targets)
+
+        # the original edge behind every arc, in both directions (-1 - it's a shortcut only)
+        self.up_edge = [-1] * self.num_arcs  # lower -> higher
+        self.down_edge = [-1] * self.num_arcs  # higher -> lower
+        for edge_id, (u, v) in enumerate(zip(graph.edge_sources_list, graph.edge_targets_list)):
+            if u == v:
+                continue
+            if self.rank[u] < self.rank[v]:
+                self.up_edge[self.arc_index[(u, v)]] = edge_id
+            else:
+                self.down_edge[self.arc_index[(v, u)]] = edge_id
+
+    def customize(self, edge_costs):
+        """
+        Compute the costs of the hierarchy arcs for the given edge costs, by processing the lower triangles of
+        every arc bottom up (in the contraction order).
+
+        :param edge_costs: An array with the time cost to cross every edge, indexed by edge id.
+        :return: HierarchyCosts of the arcs.
+        """
+        customized = HierarchyCosts(edge_costs)
+        costs = customized.edge_costs.tolist()
+        up_cost = [float('inf')] * self.num_arcs
+        down_cost = [float('inf')] * self.num_arcs
+        # an arc gets the cost of its original edge (the cheapest one, if there are parallel edges)
+        for edge_id, (u, v) in enumerate(zip(self.graph.edge_sources_list, self.graph.edge_targets_list)):
+            if u == v:
+                continue
+            if self.rank[u] < self.rank[v]:
+                arc = self.arc_index[(u, v)]
+                up_cost[arc] = min(up_cost[arc], costs[edge_id])
+            else:
+                arc = self.arc_index[(v, u)]
+                down_cost[arc] = min(down_cost[arc], costs[edge_id])
+        up_mid = [-1] * self.num_arcs
+        down_mid = [-1] * self.num_arcs
+        up_offsets, up_targets, rank, arc_index = self.up_offsets, self.up_targets, self.rank, self.arc_index
+
+        for x in self.order:
+            # every pair of upward neighbors of x forms a lower triangle (x, v, w) of the arc v - w
+            x_arcs = range(up_offsets[x], up_offsets[x + 1])
+            for a1 in x_arcs:
+                v = up_targets[a1]
+                for a2 in x_arcs:
+                    w = up_targets[a2]
+                    if rank[v] >= rank[w]:
+                        continue
+                    arc = arc_index[(v, w)]
+                    # v -> x -> w
+                    cost = down_cost[a1] + up_cost[a2]
+                    if cost < up_cost[arc]:
+                        up_cost[arc] = cost
+                        up_mid[arc] = x
+                    # w -> x -> v
+                    cost = down_cost[a2] + up_cost[a1]
+                    if cost < down_cost[arc]:
+                        down_cost[arc] = cost
+                        down_mid[arc] = x
+
+        customized.up_cost, customized.down_cost = up_cost, down_cost
+        customized.up_mid, customized.down_mid = up_mid, down_mid
+        return customized
+
+    def upward_search(self, source, arc_costs, stats=None):
+        """
+        Dijkstra from source using only arcs to higher ranked nodes.
+
+        :param stats: SearchStats the work of the search is added to, None - not counted.
+        :return: (dist, parent) dictionaries, parent[node] is the previous node on the search tree.
+        """
+        dist = {source: 0}
+        parent = {}
+        queue = [(0, source)]
+        settled = set()
+        pops = peak_queue = 0
+        while queue:
+            if len(queue) > peak_queue:
+                peak_queue = len(queue)
+            d, v = heapq.heappop(queue)
+            pops += 1
+            if v in settled:
+                continue
+            settled.add(v)
+            for arc in range(self.up_offsets[v], self.up_offsets[v + 1]):
+                w = self.up_targets[arc]
+                new_d = d + arc_costs[arc]
+                if new_d < dist.get(w, float('inf')):
+                    dist[w] = new_d
+                    parent[w] = v
+                    heapq.heappush(queue, (new_d, w))
+        if stats is not None:
+            stats.expansions += len(settled)
+            # the queue is drained, every pushed entry was popped
+            stats.pushes += pops
+            stats.pops += pops
+            stats.peak_open_set = max(stats.peak_open_set, peak_queue)
+        return dist, parent
+
+    def unpack(self, customized, u, v):
+        """
+        Unpack the hierarchy arc u -> v into original edge ids.
+        """
+        edge_ids = []
+        stack = [(u, v)]
+        while stack:
+            a, b = stack.pop()
+            if self.rank[a] < self.rank[b]:
+                arc = self.arc_index[(a, b)]
+                mid, edge_id = customized.up_mid[arc], self.up_edge[arc]
+            else:
+                arc = self.arc_index[(b, a)]
+                mid, edge_id = customized.down_mid[arc], self.down_edge[arc]
+            if mid < 0:
+                edge_ids.append(self.best_edge(customized, a, b, edge_id))
+            else:
+                # the first half is popped first
+                stack.append((mid, b))
+                stack.append((a, mid))
+        return edge_ids
+
+    def best_edge(self, customized, a, b, edge_id):
+        # among parallel edges a -> b, the cheapest one
+        graph = self.graph
+        for k in range(graph.out_offsets_list[a], graph.out_offsets_list[a + 1]):
+            other = graph.out_edge_ids_list[k]
+            if graph.out_targets_list[k] == b and customized.edge_costs[other] < customized.edge_costs[edge_id]:
+                edge_id = other
+        return edge_id
+
+    def query(self, customized, source, target, stats=None):
+        """
+        Bidirectional upward query: forward search from the source on the lower -> higher arcs, backward search
+        from the target on the reversed higher -> lower arcs, the shortest path meets at its highest node.
+
+        :param stats: SearchStats the work of both searches is added to, None - not counted.
+        :return: The path as a list of edge ids, or None if there is no path.
+        """
+        if source == target:
+            return []
+        forward_dist, forward_parent = self.upward_search(source, customized.up_cost, stats)
+        backward_dist, backward_parent = self.upward_search(target, customized.down_cost, stats)
+
+        best, meeting = float('inf'), None
+        for v, d in forward_dist.items():
+            total = d + backward_dist.get(v, float('inf'))
+            if total < best:
+                best, meeting = total, v
+        if meeting is None:
+            return None
+
+        # source -> meeting
+        nodes = [meeting]
+        while nodes[-1] != source:
+            nodes.append(forward_parent[nodes[-1]])
+        nodes.reverse()
+        # meeting -> target
+        v = meeting
+        while v != target:
+            v = backward_parent[v]
+            nodes.append(v)
+
+        path = []
+        for a, b in zip(nodes, nodes[1:]):
+            path.extend(self.unpack(customized, a, b))
+        return path
+
+
+class HierarchyCosts:
+    def __init__(self, edge_costs):
+        """
+        The costs of a ContractionHierarchy customized for one set of edge costs.
+        For every arc: up_cost / down_cost - the cost of lower -> higher / higher -> lower,
+        up_mid / down_mid - the middle node of the shortcut (-1 - the arc is an original edge).
+        """
+        self.edge_costs = np.array(edge_costs, dtype=float)
+        self.up_cost = None
+        self.down_cost = None
+        self.up_mid = None
+        self.down_mid = None
+
+
+def get_contraction_hierarchy(graph):
+    """
+    Get the contraction hierarchy of a graph, the contraction is done once per graph and shared by the agents.
+    """
+    if graph.graph_id not in _hierarchies:
+        _hierarchies.clear()
+        _hierarchies[graph.graph_id] = ContractionHierarchy(graph)
+    return _hierarchies[graph.graph_id]
+
+
+def clear_contraction_hierarchies():
+    # drop the shared hierarchy, the next agent contracts the graph again
+    _hierarchies.clear()
+
+
+class ContractionHierarchyAgent(Agent):
+    def __init__(self, goal_node, graph, nodes_positions, max_speed_limit, roads_length, speed_limit):
+        """
+        Initialize the contraction hierarchy agent.
+
+        The contraction order and shortcuts are computed once per graph and shared by all the agents. Every agent
+        customizes the arc costs for the edge costs it's given, so new traffic reuses the contraction order.
+
+        :param goal_node: The goal node the agent aims to reach.
+        :param graph: RoadGraph adjacency index of the directed edges.
+        :param nodes_positions: Dictionary of node positions {node: (x, y)}.
+        :param max_speed_limit: The maximum speed limit.
+        :param roads_length: Array with the length of every edge, indexed by edge id.
+        :param speed_limit: Array with the speed limit of every edge, indexed by edge id.
+        """
+        super().__init__(goal_node, graph, nodes_positions, max_speed_limit)
+        self.hierarchy = get_contraction_hierarchy(graph)
+        # initial customization with free flow costs
+        self.customized = self.hierarchy.customize(roads_length / speed_limit)
+
+    def find_path(self, start_node, edge_costs):
+        """
+        Find the shortest path from the start node to the goal node with a bidirectional upward query,
+        customizing the hierarchy first if the edge costs changed.
+        """
+        if not np.array_equal(self.customized.edge_costs, edge_costs):
+            self.customized = self.hierarchy.customize(edge_costs)
+
+        self.stats.reset()
+        edge_ids = self.hierarchy.query(self.customized, self.graph.node_index[start_node],
+                                        self.graph.node_index[self.goal_node], self.stats)
+        if edge_ids is None:
+            return None
+        self.path = [self.graph.edges[edge_id] for edge_id in edge_ids]
+        return self.path
@@ -0,0 +1,47 @@
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+
+# from this many nodes the cost-to-goal tables are computed by the compiled csgraph Dijkstra
+CSGRAPH_MIN_NODES = 2000
+
+
+class CostMatrix:
+    def __init__(self, graph, reverse=False):
+        """
+        The road graph as a scipy.sparse CSR matrix with the edge costs as data, for the compiled csgraph searches.
+
+        The sparsity structure is the RoadGraph CSR index, so it's built once. New costs only overwrite the data
+        array in place. Parallel edges are kept as duplicate entries, which the csgraph searches relax one by one.
+
+        :param graph: RoadGraph adjacency index of the directed edges.
+        :param reverse: If True, the matrix of the reversed edges (row v holds the edges into v), for searches
+                        toward a goal.
+        """
+        self.graph = graph
+        if reverse:
+            offsets, columns, self.edge_ids = graph.in_offsets, graph.in_sources, graph.in_edge_ids
+        else:
+            offsets, columns, self.edge_ids = graph.out_offsets, graph.out_targets, graph.out_edge_ids
+        # csgraph works with int32 indices, converting once here saves a copy on every search
+        self.matrix = csr_matrix((np.zeros(graph.num_edges), columns.astype(np.int32), offsets.astype(np.int32)),
+                                 shape=(graph.num_nodes, graph.num_nodes))
+
+    def update(self, edge_costs):
+        """
+        Set the costs, in place.
+
+        :param edge_costs: An array with the cost of every edge, indexed by edge id.
+        """
+        np.take(np.asarray(edge_costs, dtype=float), self.edge_ids, out=self.matrix.data)
+
+    def search(self, source_id):
+        """
+        Compiled Dijkstra from a node over the matrix.
+
+        :param source_id: The node id to search from.
+        :return: (costs, predecessors) arrays indexed by node id. predecessors[v] is the previous node on the
+                 shortest path from the source to v, negative for the source and the unreachable nodes.
+        """
+        return dijkstra(self.matrix, directed=True, indices=source_id, return_predecessors=True)
+
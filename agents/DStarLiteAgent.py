@@ -0,0 +1,201 @@
+import heapq
+from agents.agent import Agent
+from agents.AStarAgent import AerialDistHeuristic
+import numpy as np
+
+
+class DStarLiteAgent(Agent):
+    def __init__(self, goal_node, graph, nodes_positions, max_speed_limit):
+        """
+        Initialize the D* Lite agent.
+
+        D* Lite searches backwards from the goal node and keeps its search state (g, rhs and the open set) between
+        find_path calls. When the car moves and edge costs change, only the nodes whose cost to the goal is affected
+        by the changed edges are repaired, instead of replanning from scratch.
+
+        :param goal_node: The goal node the agent aims to reach.
+        :param graph: RoadGraph adjacency index of the directed edges.
+        :param nodes_positions: Dictionary of node positions {node: (x, y)}.
+        :param max_speed_limit: The maximum speed limit, used by the aerial distance heuristic.
+        """
+        super().__init__(goal_node, graph, nodes_positions, max_speed_limit)
+        self.heuristic = AerialDistHeuristic(nodes_positions, max_speed_limit)
+        self.goal = graph.node_index[goal_node]
+
+        # search state, initialized on the first find_path call
+        self.edge_costs = None
+        self.edge_costs_list = None
+        self.g = None
+        self.rhs = None
+        self.open_set = None  # heap of (k1, k2, node id), stale entries are skipped lazily
+        self.open_key = None  # node id -> its current key in the open set, None if it's not in the open set
+        self.km = 0
+        self.last_start = None
+
+    def h(self, node_id, other_id):
+        self.stats.heuristic_evaluations += 1
+        return self.heuristic.heuristic(self.graph.nodes[node_id], self.graph.nodes[other_id])
+
+    def calculate_key(self, node_id):
+        g_rhs = min(self.g[node_id], self.rhs[node_id])
+        return g_rhs + self.h(self.last_start, node_id) + self.km, g_rhs
+
+    def update_vertex(self, node_id):
+        if self.g[node_id] != self.rhs[node_id]:
+            key = self.calculate_key(node_id)
+            self.open_key[node_id] = key
+            self.push(node_id, key)
+        else:
+            self.open_key[node_id] = None
+
+    def push(self, node_id, key):
+        heapq.heappush(self.open_set, (key[0], key[1], node_id))
+        stats = self.stats
+        stats.pushes += 1
+        if len(self.open_set) > stats.peak_open_set:
+            stats.peak_open_set = len(self.open_set)
+
+    def best_successor_cost(self, node_id):
+        """
+        :return: min over the edges (node, successor) of edge cost + g(successor).
+        """
+        graph = self.graph
+        best = float('inf')
+        for k in range(graph.out_offsets_list[node_id], graph.out_offsets_list[node_id + 1]):
+            cost = self.edge_costs_list[graph.out_edge_ids_list[k]] + self.g[graph.out_targets_list[k]]
+            if cost < best:
+                best = cost
+        return best
+
+    def top_key(self):
+        # drop stale entries from the top of the open set
+        while self.open_set:
+            k1, k2, node_id = self.open_set[0]
+            if self.open_key[node_id] == (k1, k2):
+                return k1, k2
+            heapq.heappop(self.open_set)
+            self.stats.pops += 1
+        return float('inf'), float('inf')
+
+    def compute_shortest_path(self):
+        graph = self.graph
+        start = self.last_start
+        while self.top_key() < self.calculate_key(start) or self.rhs[start] != self.g[start]:
+            k1, k2, node_id = heapq.heappop(self.open_set)
+            self.stats.pops += 1
+            self.open_key[node_id] = None
+            new_key = self.calculate_key(node_id)
+
+            if (k1, k2) < new_key:
+                # the key is outdated (the start moved) - reinsert with the correct key
+                self.open_key[node_id] = new_key
+                self.push(node_id, new_key)
+
+            elif self.g[node_id] > self.rhs[node_id]:
+                # overconsistent - the cost to goal decreased, propagate to the predecessors
+                self.stats.expansions += 1
+                self.g[node_id] = self.rhs[node_id]
+                for k in range(graph.in_offsets_list[node_id], graph.in_offsets_list[node_id + 1]):
+                    pred = graph.in_sources_list[k]
+                    if pred != self.goal:
+                        cost = self.edge_costs_list[graph.in_edge_ids_list[k]] + self.g[node_id]
+                        if cost < self.rhs[pred]:
+                            self.rhs[pred] = cost
+                            self.update_vertex(pred)
+
+            else:
+                # underconsistent - the cost to goal increased, recompute the node and its predecessors
+                self.stats.expansions += 1
+                old_g = self.g[node_id]
+                self.g[node_id] = float('inf')
+                if node_id != self.goal and self.rhs[node_id] == old_g:
+                    self.rhs[node_id] = self.best_successor_cost(node_id)
+                self.update_vertex(node_id)
+                for k in range(graph.in_offsets_list[node_id], graph.in_offsets_list[node_id + 1]):
+                    pred = graph.in_sources_list[k]
+                    if pred != self.goal and \
+                            self.rhs[pred] == self.edge_costs_list[graph.in_edge_ids_list[k]] + old_g:
+                        self.rhs[pred] = self.best_successor_cost(pred)
+                        self.update_vertex(pred)
+
+    def initialize(self, start, edge_costs):
+        n = self.graph.num_nodes
+        self.edge_costs = np.array(edge_costs, dtype=float)
+        self.edge_costs_list = self.edge_costs.tolist()
+        self.g = [float('inf')] * n
+        self.rhs = [float('inf')] * n
+        self.open_set = []
+        self.open_key = [None] * n
+        self.km = 0
+        self.last_start = start
+        self.rhs[self.goal] = 0
+        self.update_vertex(self.goal)
+
+    def update_edge_costs(self, edge_costs):
+        """
+        Apply the new edge costs, repairing only the nodes whose rhs depends on a changed edge.
+        """
+        graph = self.graph
+        edge_costs = np.asarray(edge_costs, dtype=float)
+        changed = np.flatnonzero(edge_costs != self.edge_costs)
+        old_costs = self.edge_costs[changed].tolist()
+        new_costs = edge_costs[changed].tolist()
+        self.edge_costs = edge_costs.copy()
+
+        for edge_id, old_cost, new_cost in zip(changed.tolist(), old_costs, new_costs):
+            self.edge_costs_list[edge_id] = new_cost
+            u, v = graph.edge_sources_list[edge_id], graph.edge_targets_list[edge_id]
+            if u == self.goal:
+                continue
+            if old_cost > new_cost:
+                if new_cost + self.g[v] < self.rhs[u]:
+                    self.rhs[u] = new_cost + self.g[v]
+                    self.update_vertex(u)
+            elif self.rhs[u] == old_cost + self.g[v]:
+                self.rhs[u] = self.best_successor_cost(u)
+                self.update_vertex(u)
+
+    def find_path(self, start_node, edge_costs):
+        """
+        Find the shortest path from the start node to the goal node, reusing the search state of the previous call.
+
+        :param start_node: The source node the agent starts from.
+        :param edge_costs: An array with the time cost to cross every edge, indexed by edge id.
+        :return: The path as a list of edges, or None if the goal can't be reached.
+        """
+        graph = self.graph
+        start = graph.node_index[start_node]
+        # the open set is kept between the calls, its peak is counted from its current size
+        self.stats.reset()
+        self.stats.peak_open_set = len(self.open_set) if self.open_set is not None else 0
+
+        if self.g is None:
+            self.initialize(start, edge_costs)
+        else:
+            # the start moved - the keys in the open set are lower bounds, correct them by km
+            self.km += self.h(self.last_start, start)
+            self.last_start = start
+            self.update_edge_costs(edge_costs)
+
+        self.compute_shortest_path()
+
+        if self.g[start] == float('inf'):
+            return None
+
+        # walk down the g values from the start to the goal
+        path = []
+        current = start
+        while current != self.goal and len(path) < graph.num_nodes:
+            best_cost, best_edge_id = float('inf'), None
+            for k in range(graph.out_offsets_list[current], graph.out_offsets_list[current + 1]):
+                edge_id = graph.out_edge_ids_list[k]
+                cost = self.edge_costs_list[edge_id] + self.g[graph.out_targets_list[k]]
+                if cost < best_cost:
+                    best_cost, best_edge_id = cost, edge_id
+            if best_edge_id is None:
+                return None
+            path.append(graph.edges[best_edge_id])
+            current = graph.edge_targets_list[best_edge_id]
+
+        self.path = path
+        return path
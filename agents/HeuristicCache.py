@@ -0,0 +1,118 @@
+import hashlib
+import heapq
+from collections import OrderedDict
+import numpy as np
+from agents.CostMatrix import CostMatrix, CSGRAPH_MIN_NODES
+
+HEURISTIC_CACHE_SIZE = 32
+
+
+def compute_dijkstra_costs(graph, goal_node, edge_costs, reverse=True):
+    """
+    Compute shortest path costs from all nodes to the goal node using Dijkstra's algorithm on the reversed edges.
+
+    :param graph: RoadGraph adjacency index of the directed edges.
+    :param goal_node: The goal node.
+    :param edge_costs: An array with the cost of every edge, indexed by edge id.
+    :param reverse: If False, compute the costs from the goal node to all nodes (on the forward edges) instead.
+    :return: An array with the cost between every node id and the goal node (inf if there is no path).
+    """
+    if graph.num_nodes >= CSGRAPH_MIN_NODES:
+        # the python heap is the bottleneck on large graphs, use the compiled csgraph Dijkstra
+        matrix = CostMatrix(graph, reverse=reverse)
+        matrix.update(edge_costs)
+        costs, _ = matrix.search(graph.node_index[goal_node])
+        return costs
+
+    edge_costs = np.asarray(edge_costs, dtype=float).tolist()
+    if reverse:
+        offsets, neighbors, edge_ids = graph.in_offsets_list, graph.in_sources_list, graph.in_edge_ids_list
+    else:
+        offsets, neighbors, edge_ids = graph.out_offsets_list, graph.out_targets_list, graph.out_edge_ids_list
+    goal = graph.node_index[goal_node]
+
+    costs = [float('inf')] * graph.num_nodes
+    costs[goal] = 0
+    priority_queue = [(0, goal)]  # (cost, node id)
+    visited = [False] * graph.num_nodes
+
+    while priority_queue:
+        current_cost, current_node = heapq.heappop(priority_queue)
+
+        if visited[current_node]:
+            continue
+        visited[current_node] = True
+
+        for k in range(offsets[current_node], offsets[current_node + 1]):
+            neighbor = neighbors[k]
+            new_cost = current_cost + edge_costs[edge_ids[k]]
+            if new_cost < costs[neighbor]:
+                costs[neighbor] = new_cost
+                heapq.heappush(priority_queue, (new_cost, neighbor))
+
+    return np.array(costs, dtype=float)
+
+
+class HeuristicCache:
+    def __init__(self, max_size=HEURISTIC_CACHE_SIZE):
+        """
+        LRU cache of cost-to-goal tables, keyed by (graph identity, goal node, cost basis).
+
+        Agents that need the same table (e.g. the Dijkstra heuristic of every cost scenario and of the
+        combination heuristic) share one read-only array, so the backward search runs once per goal.
+
+        :param max_size: Maximal number of tables kept, the least recently used table is evicted first.
+        """
+        self.max_size = max_size
+        self.tables = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def cost_basis(edge_costs):
+        # the cost basis is identified by the content of the cost array
+        return hashlib.blake2b(np.ascontiguousarray(edge_costs, dtype=float).tobytes(), digest_size=16).hexdigest()
+
+    def get_costs_to_goal(self, graph, goal_node, edge_costs):
+        """
+        Get the cost from every node to the goal node, computing it only if it's not cached.
+
+        :param graph: RoadGraph adjacency index of the directed edges.
+        :param goal_node: The goal node.
+        :param edge_costs: An array with the cost of every edge, indexed by edge id.
+        :return: A read-only array with the cost from every node id to the goal node.
+        """
+        key = (graph.graph_id, goal_node, self.cost_basis(edge_costs))
+        table = self.tables.get(key)
+        if table is not None:
+            self.hits += 1
+            self.tables.move_to_end(key)
+            return table
+
+        self.misses += 1
+        table = compute_dijkstra_costs(graph, goal_node, edge_costs)
+        table.flags.writeable = False
+        self.tables[key] = table
+        if len(self.tables) > self.max_size:
+            self.tables.popitem(last=False)
+        return table
+
+    def put(self, graph, goal_node, edge_costs, table):
+        """
+        Add a cost-to-goal table computed elsewhere (e.g. by a search that computes it anyway).
+
+        :param table: An array with the cost from every node id to the goal node, it's made read-only.
+        """
+        key = (graph.graph_id, goal_node, self.cost_basis(edge_costs))
+        table.flags.writeable = False
+        self.tables[key] = table
+        self.tables.move_to_end(key)
+        if len(self.tables) > self.max_size:
+            self.tables.popitem(last=False)
+
+    def clear(self):
+        self.tables.clear()
+
+
+# shared by all the agents of the process
+heuristic_cache = HeuristicCache()
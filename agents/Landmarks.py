@@ -0,0 +1,158 @@
+import math
+import os
+from collections import OrderedDict
+import numpy as np
+from agents.HeuristicCache import HeuristicCache, compute_dijkstra_costs
+
+NUM_OF_LANDMARKS = 8
+LANDMARKS_SELECTION_FARTHEST = 'farthest'
+LANDMARKS_SELECTION_PLANAR = 'planar'
+
+# directory for persisting the landmark tables, None - tables are kept in memory only
+LANDMARKS_DIR = None
+LANDMARKS_CACHE_SIZE = 8
+
+
+class LandmarkTables:
+    def __init__(self, landmarks, forward, backward):
+        """
+        Precomputed travel times between k landmarks and all the nodes, for the ALT (A*, landmarks, triangle
+        inequality) heuristic.
+
+        :param landmarks: Array with the node ids of the landmarks.
+        :param forward: Array of shape (k, num_nodes), forward[i, v] is the cost from landmark i to node v.
+        :param backward: Array of shape (k, num_nodes), backward[i, v] is the cost from node v to landmark i.
+        """
+        self.landmarks = landmarks
+        self.forward = forward
+        self.backward = backward
+
+    @classmethod
+    def build(cls, graph, edge_costs, nodes_positions, num_of_landmarks=NUM_OF_LANDMARKS,
+              selection=LANDMARKS_SELECTION_FARTHEST):
+        """
+        Select the landmarks and compute their tables.
+
+        :param graph: RoadGraph adjacency index of the directed edges.
+        :param edge_costs: An array with the cost of every edge, indexed by edge id. For the bounds to be
+                           admissible it should be a lower bound of the costs seen at query time (e.g. free flow).
+        :param nodes_positions: Dictionary of node positions {node: (x, y)}, used by the planar selection.
+        :param num_of_landmarks: k, the number of landmarks.
+        :param selection: LANDMARKS_SELECTION_FARTHEST or LANDMARKS_SELECTION_PLANAR.
+        """
+        k = min(num_of_landmarks, graph.num_nodes)
+        forward = np.empty((k, graph.num_nodes))
+        backward = np.empty((k, graph.num_nodes))
+        landmarks = []
+
+        def add_landmark(node_id):
+            i = len(landmarks)
+            landmarks.append(node_id)
+            forward[i] = compute_dijkstra_costs(graph, graph.nodes[node_id], edge_costs, reverse=False)
+            backward[i] = compute_dijkstra_costs(graph, graph.nodes[node_id], edge_costs, reverse=True)
+
+        if selection == LANDMARKS_SELECTION_PLANAR:
+            for node_id in cls.planar_candidates(graph, nodes_positions, k):
+                add_landmark(node_id)
+        elif selection != LANDMARKS_SELECTION_FARTHEST:
+            raise ValueError(f"unknown landmarks selection: {selection}")
+
+        if k > 0 and not landmarks:
+            # start from the node farthest from an arbitrary node
+            start = compute_dijkstra_costs(graph, graph.nodes[0], edge_costs, reverse=False)
+            add_landmark(cls.farthest(start))
+
+        # farthest point: the next landmark is the node farthest from all the landmarks selected so far
+        while len(landmarks) < k:
+            n = len(landmarks)
+            dist = np.min(forward[:n] + backward[:n], axis=0)
+            dist[landmarks] = -1
+            add_landmark(cls.farthest(dist))
+
+        return cls(np.array(landmarks, dtype=np.int64), forward, backward)
+
+    @staticmethod
+    def farthest(dist):
+        # unreachable nodes count as the farthest, so every connected component gets a landmark
+        return int(np.argmax(np.where(np.isinf(dist), np.finfo(float).max, dist)))
+
+    @staticmethod
+    def planar_candidates(graph, nodes_positions, k):
+        """
+        Split the plane around the center of the map into k sectors and take the node farthest from the
+        center in every sector.
+        """
+        positions = np.array([nodes_positions[node] for node in graph.nodes], dtype=float).reshape(-1, 2)
+        offsets = positions - positions.mean(axis=0)
+        radius = np.hypot(offsets[:, 0], offsets[:, 1])
+        sectors = ((np.arctan2(offsets[:, 1], offsets[:, 0]) + math.pi) / (2 * math.pi) * k).astype(int) % max(k, 1)
+        candidates = []
+        for sector in range(k):
+            in_sector = np.flatnonzero(sectors == sector)
+            if len(in_sector) > 0:
+                candidates.append(int(in_sector[np.argmax(radius[in_sector])]))
+        return candidates
+
+    def lower_bounds(self, goal_id):
+        """
+        Triangle inequality lower bounds of the cost from every node to the goal:
+        d(v, t) >= d(L, t) - d(L, v) and d(v, t) >= d(v, L) - d(t, L), maximized over the landmarks L.
+
+        :return: An array with a lower bound of the cost from every node id to the goal node id.
+        """
+        bounds = np.zeros(self.forward.shape[1])
+        with np.errstate(invalid='ignore'):
+            for i in range(len(self.landmarks)):
+                for bound in (self.forward[i, goal_id] - self.forward[i], self.backward[i] - self.backward[i, goal_id]):
+                    # inf - inf pairs (both unreachable from the landmark) give no information
+                    np.fmax(bounds, np.nan_to_num(bound, nan=0.0, posinf=np.inf, neginf=0.0), out=bounds)
+        return bounds
+
+    def save(self, file_path):
+        np.savez(file_path, landmarks=self.landmarks, forward=self.forward, backward=self.backward)
+
+    @classmethod
+    def load(cls, file_path):
+        with np.load(file_path) as data:
+            return cls(data['landmarks'], data['forward'], data['backward'])
+
+
+_tables = OrderedDict()
+
+
+def get_landmark_tables(graph, edge_costs, nodes_positions, num_of_landmarks=NUM_OF_LANDMARKS,
+                        selection=LANDMARKS_SELECTION_FARTHEST, landmarks_dir=None):
+    """
+    Get the landmark tables of a graph, shared in memory by all the agents, and loaded from / saved to
+    landmarks_dir (defaults to LANDMARKS_DIR) when it's set, so large maps are preprocessed once.
+    """
+    cost_basis = HeuristicCache.cost_basis(edge_costs)
+    key = (graph.graph_id, cost_basis, num_of_landmarks, selection)
+    tables = _tables.get(key)
+    if tables is not None:
+        _tables.move_to_end(key)
+        return tables
+
+    landmarks_dir = LANDMARKS_DIR if landmarks_dir is None else landmarks_dir
+    file_path = None
+    if landmarks_dir is not None:
+        file_name = f'{graph.fingerprint()}_{cost_basis}_{num_of_landmarks}_{selection}.npz'
+        file_path = os.path.join(landmarks_dir, file_name)
+
+    if file_path is not None and os.path.exists(file_path):
+        tables = LandmarkTables.load(file_path)
+    else:
+        tables = LandmarkTables.build(graph, edge_costs, nodes_positions, num_of_landmarks, selection)
+        if file_path is not None:
+            os.makedirs(landmarks_dir, exist_ok=True)
+            tables.save(file_path)
+
+    _tables[key] = tables
+    if len(_tables) > LANDMARKS_CACHE_SIZE:
+        _tables.popitem(last=False)
+    return tables
+
+
+def clear_landmark_tables():
+    # drop the tables kept in memory, the next agents build (or load) them again
+    _tables.clear()
@@ -1,33 +1,80 @@
+import math
+import os
 import random
-from collections import defaultdict
+import time
 from agents.agent import Agent
 import numpy as np
 
+# directory of the Q-table snapshots used for warm starts, None - agents start cold
+QTABLE_DIR = None
+
+# a cap of the episode steps per node of the graph, so an episode can't wander through cycles for long (opt in,
+# max_steps=MAX_STEPS_PER_NODE * graph.num_nodes)
+MAX_STEPS_PER_NODE = 20
+# a patience of the convergence early stopping (opt in, patience=CONVERGENCE_PATIENCE)
+CONVERGENCE_PATIENCE = 10
+
+# why the last training stopped
+STOP_MAX_EPISODES = 'max_episodes'
+STOP_CONVERGED = 'converged'
+
 
 class QLearningAgent(Agent):
-    def __init__(self, goal_node, edges, nodes_positions, max_speed_limit, learning_rate=0.9, discount_factor=0.9,
-                 exploration_rate=0.1):
+    def __init__(self, goal_node, graph, nodes_positions, max_speed_limit, learning_rate=0.9, discount_factor=0.9,
+                 exploration_rate=0.1, episodes=100, warm_start=False, max_steps=None, patience=None):
         """
         Initialize the Q-learning agent with parameters for learning.
 
         :param goal_node: The goal node the agent aims to reach.
-        :param edges: List of edges represented as tuples (start_node, end_node).
+        :param graph: RoadGraph adjacency index of the directed edges.
         :param nodes_positions: Dictionary of node positions {node: (x, y)}.
         :param max_speed_limit: The maximum speed limit for heuristic calculations.
         :param learning_rate: The learning rate (alpha) for Q-value updates.
         :param discount_factor: The discount factor (gamma) to weigh future rewards.
         :param exploration_rate: The initial exploration rate (epsilon) for epsilon-greedy strategy.
+        :param episodes: The default maximal number of training episodes of find_path.
+        :param warm_start: If True, start from the snapshot of this graph and goal in QTABLE_DIR, if there is one.
+        :param max_steps: Maximal number of steps of an episode (and of the exploited path), None - no cap.
+        :param patience: Stop training once the greedy path hasn't changed for this many episodes,
+                         None - always train all the episodes.
         """
-        super().__init__(goal_node, edges, nodes_positions, max_speed_limit)
+        super().__init__(goal_node, graph, nodes_positions, max_speed_limit)
 
-        # self.q_table is a defaultdict where each key corresponds to a state (a node in our Q-learning context).
-        # The value of each key is another defaultdict, which represents the actions for that state.
-        # This inner dictionary holds the Q-values associated with each possible action from the given state.
-        self.q_table = defaultdict(lambda: defaultdict(float))
+        # A state is a node and its actions are the edges directed out of it, so the Q-value of every
+        # state-action pair is kept in an array indexed by the edge id. The actions of node u are the edge ids
+        # graph.out_edge_ids[graph.out_offsets[u]:graph.out_offsets[u + 1]].
+        self.q_values = np.zeros(graph.num_edges)
+        # Whether each Q-value was ever looked at. The best future Q-value of a node is taken over these only,
+        # and is 0 if there are none.
+        self.q_seen = np.zeros(graph.num_edges, dtype=bool)
 
         self.learning_rate = learning_rate
         self.discount_factor = discount_factor
         self.exploration_rate = exploration_rate
+        self.episodes = episodes
+        self.max_steps = max_steps
+        self.patience = patience
+
+        # convergence monitor of the last training: the episodes it used, why it stopped and the max |delta Q|
+        # of every episode
+        self.episodes_used = 0
+        self.stop_reason = None
+        self.max_delta_q = []
+        # totals over all the trainings of this agent
+        self.num_of_trainings = 0
+        self.num_of_converged = 0
+        self.capped_episodes = 0  # episodes stopped by max_steps
+
+        # training done by this agent and by the runs its snapshot came from
+        self.episodes_trained = 0
+        self.training_time = 0
+        # training carried over from a snapshot, i.e. saved compared with a cold start
+        self.warm_start_episodes = 0
+        self.warm_start_time = 0
+
+        if warm_start and QTABLE_DIR is not None:
+            self.load_snapshot()
+
     def get_possible_actions(self, current_node):
         """
         Get all possible actions (edges) from the current node.
@@ -35,33 +82,66 @@ class QLearningAgent(Agent):
         :param current_node: The n9ode from which to find possible actions.
         :return: A list of possible edges (actions).
         """
-        # print("the edges are: ", self.edges)
-        a = [edge for edge in self.edges if edge[0] == current_node]
-        # print("cur node is: ", current_node, ", and the edges are:", a)
-        return a
+        return self.graph.out_edges(current_node)
 
-    def choose_action(self, current_node):
+    def _choose_action(self, node_id, q_values, q_seen):
         """
         Choose an action using an epsilon-greedy strategy.
 
-        :param current_node: The current node of the agent.
-        :return: The chosen action (edge).
+        :param node_id: The id of the current node.
+        :param q_values: List view of self.q_values, or the array itself. Only the actions of the node are read.
+        :param q_seen: List view of self.q_seen, or the array itself.
+        :return: The id of the chosen edge, None if there are no possible actions.
         """
+        offsets = self.graph.out_offsets_list
+        actions = self.graph.out_edge_ids_list[offsets[node_id]:offsets[node_id + 1]]
         if random.uniform(0, 1) < self.exploration_rate:
             # Explore: select a random action
-            actions = self.get_possible_actions(current_node)
             if actions:
                 return random.choice(actions)
             else:
                 return None
         else:
             # Exploit: select the action with the highest Q-value
-            possible_actions = self.get_possible_actions(current_node)
-            if not possible_actions:
+            if not actions:
                 return None
+            for action in actions:
+                q_seen[action] = True
             # Choose the action with the maximum Q-value
-            best_action = max(possible_actions, key=lambda action: self.q_table[current_node][action])
-            return best_action
+            return max(actions, key=q_values.__getitem__)
+
+    def _update_q_value(self, action, reward, next_node_id, q_values, q_seen):
+        """
+        Update the Q-value for a state-action pair.
+
+        :param action: The id of the edge taken.
+        :param reward: The reward received after taking the action.
+        :param next_node_id: The id of the resulting node after taking the action.
+        :param q_values: List view of self.q_values, or the array itself. Only the action and the actions of the
+                         next node are read.
+        :param q_seen: List view of self.q_seen, or the array itself.
+        :return: |delta Q| of the update.
+        """
+        q_seen[action] = True
+        current_q_value = q_values[action]
+        offsets = self.graph.out_offsets_list
+        next_actions = self.graph.out_edge_ids_list[offsets[next_node_id]:offsets[next_node_id + 1]]
+        max_future_q = max((q_values[a] for a in next_actions if q_seen[a]), default=0)
+        delta = self.learning_rate * (reward + self.discount_factor * max_future_q - current_q_value)
+        q_values[action] = current_q_value + delta
+        return abs(delta)
+
+    def choose_action(self, current_node):
+        """
+        Choose an action using an epsilon-greedy strategy.
+
+        :param current_node: The current node of the agent.
+        :return: The chosen action (edge).
+        """
+        # a single step touches only the out edges of the node, so it works on the arrays in place rather than on
+        # list views of the whole table
+        action = self._choose_action(self.graph.node_index[current_node], self.q_values, self.q_seen)
+        return None if action is None else self.edges[action]
 
     def update_q_value(self, current_node, action, reward, next_node):
         """
@@ -72,64 +152,215 @@ class QLearningAgent(Agent):
         :param reward: The reward received after taking the action.
         :param next_node: The resulting node after taking the action.
         """
-        current_q_value = self.q_table[current_node][action]
-        max_future_q = max(self.q_table[next_node].values(), default=0)
-        new_q_value = current_q_value + self.learning_rate * (
-                    reward + self.discount_factor * max_future_q - current_q_value)
-        self.q_table[current_node][action] = new_q_value
+        self._update_q_value(self.graph.edge_index[action], reward, self.graph.node_index[next_node],
+                             self.q_values, self.q_seen)
 
-    def find_path(self, start_node, edge_costs, episodes=100):
+    def _train(self, start, edge_costs, episodes, q_values, q_seen):
         """
-        Find the optimal path using Q-learning by training over multiple episodes.
+        Train the Q-values over at most the given number of episodes, stopping early once the greedy path
+        converged (if there's a patience).
 
-        :param start_node: The starting node of the agent.
-        :param edge_costs: A dictionary of edges and their associated time costs.
-        :param episodes: The number of episodes for training.
-        :return: The learned optimal path from start to goal node.
+        :param start: The id of the starting node of the agent.
+        :param edge_costs: List with the time cost of every edge id.
+        :param episodes: The maximal number of episodes for training.
+        :param q_values: List view of self.q_values.
+        :param q_seen: List view of self.q_seen.
         """
+        start_time = time.time()
+        goal = self.graph.node_index[self.goal_node]
+        targets = self.graph.edge_targets_list
+        max_steps = math.inf if self.max_steps is None else self.max_steps
+        self.episodes_used = 0
+        self.stop_reason = STOP_MAX_EPISODES
+        self.max_delta_q = []
+        greedy_path = None
+        stable_episodes = 0
+        total_steps = 0
 
         for episode in range(episodes):
-            current_node = start_node
-            path = []
+            current_node = start
+            steps = 0
+            max_delta_q = 0
+
+            while current_node != goal:
+                if steps >= max_steps:
+                    self.capped_episodes += 1
+                    break
 
-            while current_node != self.goal_node:
                 # Choose an action based on the current node
-                action = self.choose_action(current_node)
+                action = self._choose_action(current_node, q_values, q_seen)
                 if action is None:
                     break  # No possible actions; terminate
 
-                next_node = action[1]  # The destination node of the selected edge
-                reward = -edge_costs.get(action, float('inf'))  # Negative reward to minimize cost
+                next_node = targets[action]  # The destination node of the selected edge
+                reward = -edge_costs[action]  # Negative reward to minimize cost
 
                 # Update the Q-value for the state-action pair
-                self.update_q_value(current_node, action, reward, next_node)
+                max_delta_q = max(max_delta_q, self._update_q_value(action, reward, next_node, q_values, q_seen))
 
                 # Move to the next node
                 current_node = next_node
-                path.append(action)
+                steps += 1
 
+            total_steps += steps
             # Decay exploration rate over time to reduce randomness
             self.exploration_rate *= 0.995
+            self.episodes_used += 1
+            self.max_delta_q.append(max_delta_q)
+
+            if self.patience is not None:
+                # the costs are fixed during the training, so an unchanged greedy path has an unchanged cost
+                previous_path, greedy_path = greedy_path, self._greedy_path(start, q_values)
+                stable_episodes = stable_episodes + 1 if greedy_path is not None and greedy_path == previous_path else 0
+                if stable_episodes >= self.patience:
+                    self.stop_reason = STOP_CONVERGED
+                    self.num_of_converged += 1
+                    break
+
+        self.stats.reset()
+        self.stats.qlearning_steps = total_steps
+        self.stats.episodes = self.episodes_used
+        self.num_of_trainings += 1
+        self.episodes_trained += self.episodes_used
+        self.training_time += time.time() - start_time
+
+    def train(self, start_node, edge_costs, episodes=100):
+        """
+        Train the Q-values over multiple episodes from the start node, without finding a path.
+
+        :param start_node: The starting node of the agent.
+        :param edge_costs: An array with the time cost of every edge, indexed by edge id.
+        :param episodes: The maximal number of episodes for training.
+        """
+        q_values, q_seen = self.q_values.tolist(), self.q_seen.tolist()
+        self._train(self.graph.node_index[start_node], np.asarray(edge_costs, dtype=float).tolist(), episodes,
+                    q_values, q_seen)
+        self.q_values[:] = q_values
+        self.q_seen[:] = q_seen
+
+    def find_path(self, start_node, edge_costs, episodes=None):
+        """
+        Find the optimal path using Q-learning by training over multiple episodes.
+
+        :param start_node: The starting node of the agent.
+        :param edge_costs: An array with the time cost of every edge, indexed by edge id.
+        :param episodes: The maximal number of episodes for training, defaults to self.episodes.
+        :return: The learned optimal path from start to goal node.
+        """
+        episodes = self.episodes if episodes is None else episodes
+        start = self.graph.node_index[start_node]
+        # the training steps are many and act on a handful of actions each, plain lists are faster to index
+        # than numpy scalars - train on list views of the arrays and store them back
+        q_values, q_seen = self.q_values.tolist(), self.q_seen.tolist()
+        self._train(start, np.asarray(edge_costs, dtype=float).tolist(), episodes, q_values, q_seen)
 
         # After training, determine the best path by exploiting learned Q-values
-        return self._exploit_path(start_node)
+        path = self._exploit_path(start, q_values, q_seen)
+        self.q_values[:] = q_values
+        self.q_seen[:] = q_seen
+        return path
 
-    def _exploit_path(self, start_node):
+    def _exploit_path(self, start, q_values, q_seen):
         """
         Exploit the learned Q-values to find the best path.
 
-        :param start_node: The starting node of the agent.
+        :param start: The id of the starting node of the agent.
         :return: The optimal path according to the Q-table.
         """
-        current_node = start_node
+        goal = self.graph.node_index[self.goal_node]
+        max_steps = math.inf if self.max_steps is None else self.max_steps
+        current_node = start
         path = []
 
-        while current_node != self.goal_node:
-            action = self.choose_action(current_node)
+        while current_node != goal and len(path) < max_steps:
+            action = self._choose_action(current_node, q_values, q_seen)
             if action is None:
                 break
-            current_node = action[1]
-            path.append(action)
+            current_node = self.graph.edge_targets_list[action]
+            path.append(self.edges[action])
 
         self.path = path
         return path
+
+    def _greedy_path(self, start, q_values):
+        """
+        The path of always taking the action with the highest Q-value, without exploring.
+
+        :param start: The id of the starting node of the agent.
+        :param q_values: List view of self.q_values.
+        :return: The path as a list of edge ids, or None if it doesn't reach the goal node (without repeating a
+                 node).
+        """
+        offsets, edge_ids = self.graph.out_offsets_list, self.graph.out_edge_ids_list
+        targets = self.graph.edge_targets_list
+        goal = self.graph.node_index[self.goal_node]
+        current_node = start
+        path = []
+
+        while current_node != goal:
+            actions = edge_ids[offsets[current_node]:offsets[current_node + 1]]
+            if not actions or len(path) >= self.graph.num_nodes:
+                return None
+            action = max(actions, key=q_values.__getitem__)
+            current_node = targets[action]
+            path.append(action)
+        return path
+
+    def greedy_path(self, start_node):
+        """
+        The path of always taking the action with the highest Q-value, without exploring.
+
+        :param start_node: The starting node of the agent.
+        :return: The path as a list of edges, or None if it doesn't reach the goal node (without repeating a node).
+        """
+        path = self._greedy_path(self.graph.node_index[start_node], self.q_values.tolist())
+        return None if path is None else [self.edges[action] for action in path]
+
+    def snapshot_path(self, snapshot_dir=None):
+        """
+        The snapshot file of this agent, a snapshot is keyed by the graph fingerprint and the goal node.
+
+        :param snapshot_dir: Directory of the snapshots, defaults to QTABLE_DIR.
+        """
+        snapshot_dir = QTABLE_DIR if snapshot_dir is None else snapshot_dir
+        goal = self.graph.node_index[self.goal_node]
+        return os.path.join(snapshot_dir, f'{self.graph.fingerprint()}_{goal}.npz')
+
+    def save_snapshot(self, file_path=None):
+        """
+        Save the Q-table, the exploration rate and the hyperparameters to a binary snapshot.
+
+        :param file_path: The snapshot file, defaults to snapshot_path().
+        :return: The snapshot file.
+        """
+        file_path = self.snapshot_path() if file_path is None else file_path
+        os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
+        np.savez(file_path, q_values=self.q_values, q_seen=np.packbits(self.q_seen),
+                 exploration_rate=self.exploration_rate, learning_rate=self.learning_rate,
+                 discount_factor=self.discount_factor, episodes_trained=self.episodes_trained,
+                 training_time=self.training_time)
+        return file_path
+
+    def load_snapshot(self, file_path=None):
+        """
+        Warm start from a snapshot. A snapshot of another graph or taken with other hyperparameters isn't loaded.
+
+        :param file_path: The snapshot file, defaults to snapshot_path().
+        :return: True if the snapshot was loaded.
+        """
+        file_path = self.snapshot_path() if file_path is None else file_path
+        if not os.path.exists(file_path):
+            return False
+        with np.load(file_path) as data:
+            if (data['q_values'].shape != self.q_values.shape
+                    or float(data['learning_rate']) != self.learning_rate
+                    or float(data['discount_factor']) != self.discount_factor):
+                return False
+            self.q_values[:] = data['q_values']
+            self.q_seen[:] = np.unpackbits(data['q_seen'], count=len(self.q_seen)).astype(bool)
+            self.exploration_rate = float(data['exploration_rate'])
+            self.warm_start_episodes = int(data['episodes_trained'])
+            self.warm_start_time = float(data['training_time'])
+        self.episodes_trained += self.warm_start_episodes
+        self.training_time += self.warm_start_time
+        return True
@@ -5,24 +5,78 @@ ASTAR__DIJKSTRA_H = 2
 ASTAR__COMBINATION_H = 3
 ASTAR__NONADMISSIBLE_H = 4
 QLEARNING = 5
+DSTAR_LITE = 6
+ASTAR__LANDMARK_H = 7
+CONTRACTION_HIERARCHY = 8
+CSGRAPH_DIJKSTRA = 9
+
+# the name of every agent type, e.g. in the results
+AGENT_NAMES = {
+    ASTAR__ZERO_H: 'astar_zero',
+    ASTAR__AERIAL_DIST_H: 'astar_aerial_dist',
+    ASTAR__DIJKSTRA_H: 'astar_dijkstra',
+    ASTAR__COMBINATION_H: 'astar_combination',
+    ASTAR__NONADMISSIBLE_H: 'astar_nonadmissible',
+    QLEARNING: 'qlearning',
+    DSTAR_LITE: 'dstar_lite',
+    ASTAR__LANDMARK_H: 'astar_landmark',
+    CONTRACTION_HIERARCHY: 'contraction_hierarchy',
+    CSGRAPH_DIJKSTRA: 'csgraph_dijkstra',
+}
+
+# the counters of SearchStats
+SEARCH_STATS = ('expansions', 'pushes', 'pops', 'peak_open_set', 'heuristic_evaluations', 'qlearning_steps',
+                'episodes')
+
+
+class SearchStats:
+    def __init__(self):
+        """
+        The work of a search, filled by every engine - a counter the engine has no such work for stays 0.
+
+        expansions - nodes expanded (settled), pushes / pops - open set (heap) pushes and pops, stale entries
+        included, peak_open_set - the largest size of the open set, heuristic_evaluations - calls of the
+        heuristic, qlearning_steps / episodes - Q-learning training steps and episodes.
+        """
+        self.reset()
+
+    def reset(self):
+        for name in SEARCH_STATS:
+            setattr(self, name, 0)
+
+    def add(self, other):
+        # accumulate the work of another search, the peak is the larger of the two
+        peak_open_set = max(self.peak_open_set, other.peak_open_set)
+        for name in SEARCH_STATS:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        self.peak_open_set = peak_open_set
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in SEARCH_STATS}
+
 
 class Agent:
-    def __init__(self, goal_node, edges, nodes_positions, max_speed_limit):
+    def __init__(self, goal_node, graph, nodes_positions, max_speed_limit):
         """
         Initialize the agent.
+
+        :param graph: The RoadGraph adjacency index, shared by all the agents.
         """
         self.goal_node = goal_node
         self.path = []
-        self.edges = edges
+        self.graph = graph
+        self.edges = graph.edges
         self.nodes_positions = nodes_positions
         self.max_speed_limit = max_speed_limit
+        # the work of the last find_path
+        self.stats = SearchStats()
 
 
     def find_path(self, start_node, edge_costs):
         """
         Find best path from start node to dest node taking the cost into account
         :param start_node: The source node the agent starts from.
-        :param edge_costs: A dictionary of with edges as keys and the time cost to cross the edge as values..
+        :param edge_costs: An array with the time cost to cross every edge, indexed by the edge id in the graph.
         """
         return None
 
@@ -0,0 +1,94 @@
+import random
+import numpy as np
+import pytest
+from agents.agent import ASTAR__ZERO_H, ASTAR__AERIAL_DIST_H, ASTAR__DIJKSTRA_H, ASTAR__COMBINATION_H, \
+    ASTAR__LANDMARK_H, DSTAR_LITE, CONTRACTION_HIERARCHY, CSGRAPH_DIJKSTRA, AGENT_NAMES
+from agents.HeuristicCache import compute_dijkstra_costs
+from Benchmark import benchmark_graph, benchmark_queries, clear_preprocessing_caches
+from GraphGenerator import run_random_graph, spring_positions, ROAD_FAMILIES
+from NavigationLogics import NavigationLogics, MIN_TRAFFIC_INDEX, MAX_TRAFFIC_INDEX
+
+# the engines that find shortest paths, the nonadmissible heuristic and Q-learning don't promise it
+OPTIMAL_AGENTS = (ASTAR__ZERO_H, ASTAR__AERIAL_DIST_H, ASTAR__DIJKSTRA_H, ASTAR__COMBINATION_H, ASTAR__LANDMARK_H,
+                  DSTAR_LITE, CONTRACTION_HIERARCHY, CSGRAPH_DIJKSTRA)
+SEEDS = (0, 1, 2)
+
+
+@pytest.fixture(autouse=True)
+def fresh_caches():
+    # the preprocessing is cached per graph, every test builds its own
+    clear_preprocessing_caches()
+    yield
+    clear_preprocessing_caches()
+
+
+def path_cost(logics, path, start, goal, edge_costs):
+    # the cost of a path, checking it's a walk from start to goal
+    if start == goal:
+        assert not path
+        return 0.0
+    assert path, f"no path from {start} to {goal}"
+    assert path[0][0] == start and path[-1][1] == goal
+    assert all(edge[1] == next_edge[0] for edge, next_edge in zip(path, path[1:]))
+    return float(sum(edge_costs[logics.graph.edge_index[edge]] for edge in path))
+
+
+def optimal_cost(logics, start, goal, edge_costs):
+    return compute_dijkstra_costs(logics.graph, goal, edge_costs)[logics.graph.node_index[start]]
+
+
+def traffic_costs(logics):
+    # the time costs of a traffic draw, like NavigationLogics.update draws them
+    index = np.clip(np.random.normal(logics.undirected_traffic_mean, logics.undirected_traffic_std),
+                    MIN_TRAFFIC_INDEX, MAX_TRAFFIC_INDEX)
+    return logics.get_time_cost(np.concatenate([index, index]))
+
+
+def random_map(seed):
+    np.random.seed(seed)
+    random.seed(seed)
+    nodes, edges, src, dest = run_random_graph()
+    return NavigationLogics(nodes, edges, src, dest, spring_positions(nodes, edges), agent_types=[],
+                            record_results=False)
+
+
+@pytest.mark.parametrize('family', ROAD_FAMILIES)
+@pytest.mark.parametrize('seed', SEEDS)
+def test_engines_find_optimal_costs_on_road_networks(family, seed):
+    logics = benchmark_graph(family, 150, seed)
+    edge_costs = traffic_costs(logics)
+    for start, goal in benchmark_queries(logics, 3, seed):
+        optimal = optimal_cost(logics, start, goal, edge_costs)
+        for agent_type in OPTIMAL_AGENTS:
+            agent = logics.create_agent(agent_type, goal)
+            cost = path_cost(logics, agent.find_path(start, edge_costs), start, goal, edge_costs)
+            assert cost == pytest.approx(optimal, rel=1e-9), AGENT_NAMES[agent_type]
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_engines_find_optimal_costs_on_random_maps(seed):
+    logics = random_map(seed)
+    start, goal = logics.src_node, logics.dest_node
+    for edge_costs in (logics.mean_time_cost, logics.min_time_cost, logics.max_time_cost, traffic_costs(logics)):
+        optimal = optimal_cost(logics, start, goal, edge_costs)
+        for agent_type in OPTIMAL_AGENTS:
+            agent = logics.create_agent(agent_type, goal)
+            cost = path_cost(logics, agent.find_path(start, edge_costs), start, goal, edge_costs)
+            assert cost == pytest.approx(optimal, rel=1e-9), AGENT_NAMES[agent_type]
+
+
+@pytest.mark.parametrize('agent_type', (DSTAR_LITE, CONTRACTION_HIERARCHY))
+@pytest.mark.parametrize('seed', SEEDS)
+def test_engines_stay_optimal_as_the_traffic_changes(agent_type, seed):
+    # D* Lite repairs its search and the contraction hierarchy is customized, on the same agent every tick
+    logics = benchmark_graph('grid', 150, seed)
+    (start, goal), = benchmark_queries(logics, 1, seed)
+    agent = logics.create_agent(agent_type, goal)
+    node = start
+    while node != goal:
+        edge_costs = traffic_costs(logics)
+        path = agent.find_path(node, edge_costs)
+        assert path_cost(logics, path, node, goal, edge_costs) == pytest.approx(
+            optimal_cost(logics, node, goal, edge_costs), rel=1e-9)
+        node = path[0][1]
+
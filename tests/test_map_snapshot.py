@@ -0,0 +1,98 @@
+import random
+import numpy as np
+import pytest
+import BatchRunner
+from agents.agent import ASTAR__ZERO_H, ASTAR__AERIAL_DIST_H, DSTAR_LITE, CSGRAPH_DIJKSTRA
+from GraphGenerator import generate_road_network, run_random_graph, spring_positions
+from MapSnapshot import save_map, load_map, EDGE_ATTRIBUTES, MAGIC, SNAPSHOT_VERSION
+from NavigationLogics import NavigationLogics
+from RoadGraph import RoadGraph
+
+
+def make_logics(seed, agent_types=()):
+    np.random.seed(seed)
+    random.seed(seed)
+    nodes, edges, src, dest, positions, speed_classes = generate_road_network('geometric', 200, seed=seed)
+    return NavigationLogics(nodes, edges, src, dest, positions, agent_types=list(agent_types), record_results=False,
+                            road_speed_classes=speed_classes)
+
+
+def test_snapshot_round_trip(tmp_path):
+    logics = make_logics(0)
+    file_path = str(tmp_path / 'map.navmap')
+    save_map(file_path, logics)
+    snapshot = load_map(file_path)
+
+    assert snapshot.nodes == list(logics.graph.nodes)
+    assert (snapshot.src_node, snapshot.dest_node) == (logics.src_node, logics.dest_node)
+    assert snapshot.undirected_edges == list(logics.undirected_edges)
+    assert snapshot.nodes_positions == pytest.approx(logics.nodes_positions)
+    for name in RoadGraph.ARRAYS:
+        np.testing.assert_array_equal(getattr(snapshot.graph, name), getattr(logics.graph, name))
+    for name in EDGE_ATTRIBUTES:
+        np.testing.assert_array_equal(snapshot.arrays[name], getattr(logics, name))
+    # memory mapped, not copied
+    assert not snapshot.arrays['road_length'].flags.writeable
+
+
+def test_simulation_from_snapshot_replays_the_map(tmp_path):
+    # the simulation of the snapshot sees the same map as the one it was saved from, so the same traffic draws
+    # give the same paths and costs
+    agent_types = [ASTAR__ZERO_H, ASTAR__AERIAL_DIST_H, DSTAR_LITE, CSGRAPH_DIJKSTRA]
+    logics = make_logics(1, agent_types)
+    file_path = str(tmp_path / 'map.navmap')
+    save_map(file_path, logics)
+    replay = NavigationLogics.from_snapshot(file_path, agent_types=agent_types, record_results=False)
+
+    for simulation in (logics, replay):
+        np.random.seed(5)
+        ticks = 0
+        while simulation.current_node != simulation.dest_node and ticks < 1000:
+            simulation.update()
+            ticks += 1
+    assert replay.current_node == replay.dest_node
+    assert replay.agent_total_path_cost == logics.agent_total_path_cost
+    assert replay.agent_current_d_paths == logics.agent_current_d_paths
+
+
+def test_batch_runs_on_a_snapshot(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    file_path = str(tmp_path / 'map.navmap')
+    save_map(file_path, make_logics(2))
+    results = [BatchRunner.run_episode(7, agent_types=[ASTAR__ZERO_H, CSGRAPH_DIJKSTRA], graph=file_path)
+               for _ in range(2)]
+    assert results[0]['arrived']
+    assert [record['cost'] for record in results[0]['records']] == \
+        [record['cost'] for record in results[1]['records']]
+
+
+def test_snapshot_of_other_node_ids(tmp_path):
+    # nodes that aren't integers are kept in the manifest
+    np.random.seed(2)
+    nodes, edges, src, dest = run_random_graph()
+    names = {node: f'n{node}' for node in nodes}
+    positions = {names[node]: tuple(position) for node, position in spring_positions(nodes, edges).items()}
+    logics = NavigationLogics([names[node] for node in nodes], [(names[n1], names[n2]) for n1, n2 in edges],
+                              names[src], names[dest], positions, agent_types=[], record_results=False)
+    file_path = str(tmp_path / 'map.navmap')
+    save_map(file_path, logics)
+    snapshot = load_map(file_path)
+    assert snapshot.nodes == list(logics.graph.nodes)
+    assert snapshot.src_node == names[src]
+    assert snapshot.nodes_positions == pytest.approx(positions)
+
+
+def test_snapshot_checks_the_file(tmp_path):
+    not_a_snapshot = tmp_path / 'other.bin'
+    not_a_snapshot.write_bytes(b'something else entirely')
+    with pytest.raises(ValueError):
+        load_map(str(not_a_snapshot))
+
+    file_path = tmp_path / 'map.navmap'
+    save_map(str(file_path), make_logics(3))
+    data = bytearray(file_path.read_bytes())
+    data[len(MAGIC):len(MAGIC) + 4] = np.array([SNAPSHOT_VERSION + 1], dtype='<u4').tobytes()
+    newer = tmp_path / 'newer.navmap'
+    newer.write_bytes(bytes(data))
+    with pytest.raises(ValueError, match='version'):
+        load_map(str(newer))
@@ -0,0 +1,132 @@
+import csv
+import math
+import sqlite3
+import pytest
+import BatchRunner
+from ResultsStore import ResultsStore, RESULTS_COLUMNS, SCHEMA_VERSION, SCENARIOS, import_results_csv, \
+    migrate_legacy_results
+
+
+def make_record(i, **columns):
+    return {'run_id': f'run{i}', 'seed': i, 'agent_type': i % 6, 'scenario': SCENARIOS[i % len(SCENARIOS)],
+            'cost': 1.5 * i, 'arrived': 1, **columns}
+
+
+def test_records_round_trip_in_order(tmp_path):
+    file_path = str(tmp_path / 'results.sqlite')
+    records = [make_record(i, expansions=10 * i) for i in range(25)]
+    with ResultsStore(file_path, flush_size=10) as store:
+        store.add(records)
+
+    with ResultsStore(file_path) as store:
+        read = list(store.read())
+    assert len(read) == len(records)
+    for record, row in zip(records, read):
+        assert set(row) == set(RESULTS_COLUMNS)
+        assert {name: row[name] for name in record} == record
+        # the columns a record doesn't have are NULL
+        assert row['running_time'] is None and row['cpu_time'] is None
+
+
+def test_read_chunks_and_where(tmp_path):
+    file_path = str(tmp_path / 'results.sqlite')
+    with ResultsStore(file_path) as store:
+        store.add(make_record(i) for i in range(10))
+        store.add([make_record(10, running_time=None)])
+        chunks = list(store.read_chunks(['seed', 'cost', 'running_time'], chunk_size=4))
+        assert [len(chunk['seed']) for chunk in chunks] == [4, 4, 3]
+        assert [seed for chunk in chunks for seed in chunk['seed'].tolist()] == list(range(11))
+        # a NULL number is nan
+        assert all(math.isnan(value) for chunk in chunks for value in chunk['running_time'])
+
+        changing = list(store.read(['seed'], where='scenario = ?', params=('changing',)))
+        assert [row['seed'] for row in changing] == [0, 4, 8]
+
+
+def test_unknown_columns_are_refused(tmp_path):
+    with ResultsStore(str(tmp_path / 'results.sqlite')) as store:
+        with pytest.raises(ValueError):
+            store.add([{'seed': 1, 'no_such_column': 2}])
+
+
+def test_older_databases_get_the_new_columns(tmp_path):
+    file_path = str(tmp_path / 'results.sqlite')
+    connection = sqlite3.connect(file_path)
+    connection.execute('CREATE TABLE results (run_id TEXT, seed INTEGER, cost REAL)')
+    connection.execute("INSERT INTO results VALUES ('old', 7, 2.5)")
+    connection.commit()
+    connection.close()
+
+    with ResultsStore(file_path) as store:
+        store.add([make_record(1, cpu_time=0.25)])
+        rows = list(store.read())
+    assert [(row['run_id'], row['seed'], row['cost'], row['cpu_time']) for row in rows] == [('old', 7, 2.5, None),
+                                                                                            ('run1', 1, 1.5, 0.25)]
+    connection = sqlite3.connect(file_path)
+    assert connection.execute('PRAGMA user_version').fetchone()[0] == SCHEMA_VERSION
+    connection.close()
+
+
+def write_legacy_csv(file_path, rows, num_of_agents=6):
+    # the costs of the agents in the four scenarios, then their running times
+    with open(file_path, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(range(5 * num_of_agents))
+        writer.writerows(rows)
+
+
+def test_legacy_csv_import(tmp_path):
+    legacy_file = str(tmp_path / 'results_recording.csv')
+    rows = [[run + column / 10 for column in range(30)] for run in range(3)]
+    write_legacy_csv(legacy_file, rows)
+
+    file_path = str(tmp_path / 'results.sqlite')
+    assert migrate_legacy_results(file_path, legacy_file)
+    with ResultsStore(file_path) as store:
+        records = list(store.read())
+    assert len(records) == 3 * 4 * 6
+    assert len({record['run_id'] for record in records}) == 3
+    for k, record in enumerate(records):
+        # the records of a run are added together, in order
+        run = k // (4 * 6)
+        scenario = SCENARIOS.index(record['scenario'])
+        assert record['cost'] == pytest.approx(rows[run][scenario * 6 + record['agent_type']])
+        if scenario == 0:
+            assert record['running_time'] == pytest.approx(rows[run][24 + record['agent_type']])
+        else:
+            assert record['running_time'] is None
+
+    # an existing store is left alone
+    write_legacy_csv(legacy_file, rows[:1])
+    assert migrate_legacy_results(file_path, legacy_file)
+    with ResultsStore(file_path) as store:
+        assert len(list(store.read(['run_id']))) == 3 * 4 * 6
+
+
+def test_no_store_without_a_legacy_csv(tmp_path):
+    file_path = str(tmp_path / 'results.sqlite')
+    assert not migrate_legacy_results(file_path, str(tmp_path / 'missing.csv'))
+    assert not (tmp_path / 'results.sqlite').exists()
+
+
+def test_import_results_csv_of_other_agents(tmp_path):
+    legacy_file = str(tmp_path / 'results.csv')
+    write_legacy_csv(legacy_file, [list(range(10))], num_of_agents=2)
+    with ResultsStore(str(tmp_path / 'results.sqlite')) as store:
+        assert import_results_csv(legacy_file, store, agent_types=(6, 9)) == 1
+        records = list(store.read(['agent', 'scenario', 'cost']))
+    assert records[:2] == [{'agent': 'dstar_lite', 'scenario': 'changing', 'cost': 0.0},
+                           {'agent': 'csgraph_dijkstra', 'scenario': 'changing', 'cost': 1.0}]
+
+
+def test_batch_records_round_trip(tmp_path, monkeypatch):
+    # the records of the simulations read back as they were recorded
+    monkeypatch.chdir(tmp_path)
+    file_path = str(tmp_path / 'results.sqlite')
+    results = BatchRunner.run_batch(3, workers=1, results_file=file_path, training_file=None)
+    recorded = [record for result in results if result['arrived'] for record in result['records']]
+    with ResultsStore(file_path) as store:
+        read = list(store.read())
+    assert len(read) == len(recorded) > 0
+    for record, row in zip(recorded, read):
+        assert {name: row[name] for name in record} == pytest.approx(record)
@@ -0,0 +1,124 @@
+import csv
+import json
+import numpy as np
+import pytest
+import BatchRunner
+from GraphGenerator import HIGHWAY, LOCAL
+from NavigationLogics import speed_limits
+from RoadImporter import import_road_network, NodeInterner, KM_PER_POSITION_UNIT
+
+
+@pytest.fixture(autouse=True)
+def in_tmp_path(tmp_path, monkeypatch):
+    # the layouts are cached in the working directory
+    monkeypatch.chdir(tmp_path)
+
+
+def write_edge_list(tmp_path, lines):
+    file_path = tmp_path / 'roads.txt'
+    file_path.write_text('\n'.join(lines) + '\n')
+    return str(file_path)
+
+
+def test_edge_list_without_coordinates_gets_admissible_positions(tmp_path):
+    file_path = write_edge_list(tmp_path, ['# u v length speed', 'a b 1200 50', 'b c 800', 'c d', 'a d 3000 90',
+                                           'd e', 'b e 500 30', 'c c 10'])
+    nodes, edges, src, dest, positions, _, speeds, lengths = import_road_network(file_path, seed=0)
+
+    assert nodes == [0, 1, 2, 3, 4]
+    assert sorted(edges) == [(0, 1), (0, 3), (1, 2), (1, 4), (2, 3), (3, 4)]
+    assert set(positions) == set(nodes)
+    assert np.all(np.isfinite(lengths)) and np.all(lengths > 0)
+    assert lengths[edges.index((0, 1))] == pytest.approx(1.2)
+    assert speeds[edges.index((0, 3))] == 90
+    for (n1, n2), length in zip(edges, lengths):
+        # the straight line is never longer than the road
+        assert KM_PER_POSITION_UNIT * np.hypot(*np.subtract(positions[n1], positions[n2])) <= length + 1e-9
+
+
+def test_edge_list_runs_end_to_end(tmp_path):
+    lines = [f'{i} {i + 1} {100 * (i % 7 + 3)}' for i in range(30)] + [f'{i} {i + 5}' for i in range(0, 26, 3)]
+    graph = import_road_network(write_edge_list(tmp_path, lines), seed=1)
+
+    result = BatchRunner.run_episode(0, graph=graph)
+
+    assert result['arrived']
+    assert {record['agent_type'] for record in result['records']} == set(BatchRunner.DEFAULT_AGENT_TYPES)
+    assert all(np.isfinite(record['cost']) for record in result['records'])
+
+
+def write_csv(file_path, header, rows):
+    with open(file_path, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(header)
+        writer.writerows(rows)
+    return str(file_path)
+
+
+def test_osm_csv_with_nodes_round_trip(tmp_path):
+    # OSM ids, meters, maxspeed strings and highway tags, a road given twice and a self loop
+    edges_path = write_csv(tmp_path / 'edges.csv', ['u', 'v', 'length', 'maxspeed', 'highway'], [
+        [9001, 9002, 1000, '50', 'residential'],
+        [9002, 9003, 2000, '30 mph', 'primary'],
+        [9003, 9001, 1500, '', 'motorway'],
+        [9003, 9004, 500, '', ''],
+        [9002, 9001, 1000, '90', 'trunk'],
+        [9004, 9004, 10, '', ''],
+    ])
+    nodes_path = write_csv(tmp_path / 'nodes.csv', ['osmid', 'x', 'y'], [
+        [9004, 34.79, 32.07], [9001, 34.78, 32.08], [9002, 34.79, 32.08], [9003, 34.785, 32.075], [9999, 0, 0]])
+    nodes, edges, src, dest, positions, speed_classes, speeds, lengths = import_road_network(edges_path, nodes_path,
+                                                                                             seed=0)
+
+    # dense ids in the order the ids are first seen
+    assert nodes == [0, 1, 2, 3]
+    assert speed_classes is None
+    roads = {edge: (speed, length) for edge, speed, length in zip(edges, speeds.tolist(), lengths.tolist())}
+    assert roads == {(0, 1): (90, 1.0), (1, 2): (pytest.approx(30 * 1.609344), 2.0),
+                     (0, 2): (speed_limits[HIGHWAY], 1.5), (2, 3): (speed_limits[LOCAL], 0.5)}
+    # north up, so the northern nodes are higher on the screen
+    assert positions[0][1] < positions[3][1]
+    assert positions[0][0] < positions[1][0]
+    assert src in nodes and dest in nodes and src != dest
+
+
+def test_chunks_and_formats_give_the_same_network(tmp_path):
+    rng = np.random.default_rng(0)
+    points = rng.uniform(0, 5000, size=(60, 2)).round(1)
+    pairs = [(i, j) for i in range(60) for j in range(i + 1, 60) if np.hypot(*(points[i] - points[j])) < 1200]
+    maxspeeds = [(20, 40, 80)[k % 3] for k in range(len(pairs))]
+    geojson = {'type': 'FeatureCollection', 'features': [
+        {'type': 'Feature', 'properties': {'maxspeed': str(speed)},
+         'geometry': {'type': 'LineString', 'coordinates': [points[i].tolist(), points[j].tolist()]}}
+        for (i, j), speed in zip(pairs, maxspeeds)]}
+    geojson_path = tmp_path / 'roads.geojson'
+    geojson_path.write_text(json.dumps(geojson))
+    lines_path = tmp_path / 'roads.geojsonl'
+    lines_path.write_text('\n'.join(json.dumps(feature) for feature in geojson['features']))
+
+    networks = [import_road_network(str(geojson_path), geographic=False, seed=0),
+                import_road_network(str(geojson_path), geographic=False, chunk_size=7, seed=0),
+                import_road_network(str(lines_path), geographic=False, chunk_size=5, seed=0)]
+    for nodes, edges, src, dest, positions, _, speeds, lengths in networks[1:]:
+        assert (nodes, edges, src, dest) == networks[0][:4]
+        # the chunks sum the coordinates in another order
+        assert positions == pytest.approx(networks[0][4])
+        np.testing.assert_array_equal(speeds, networks[0][6])
+        np.testing.assert_allclose(lengths, networks[0][7], rtol=1e-12)
+
+    nodes, edges, _, _, positions, _, speeds, lengths = networks[0]
+    assert len(edges) == len(pairs)
+    # planar meters: a road is the straight line between its ends, and positions are 100 km units
+    for (n1, n2), length in zip(edges, lengths):
+        assert length == pytest.approx(KM_PER_POSITION_UNIT * np.hypot(*np.subtract(positions[n1], positions[n2])))
+    assert sorted(speeds.tolist()) == sorted(maxspeeds)
+
+
+def test_node_interner_mixes_integer_and_other_ids():
+    interner = NodeInterner()
+    np.testing.assert_array_equal(interner.intern(['30', '10', '30', '20']), [0, 1, 0, 2])
+    np.testing.assert_array_equal(interner.intern(['10', '40']), [1, 3])
+    # an id that isn't an integer moves the interned ids to the dict, they keep their dense ids
+    np.testing.assert_array_equal(interner.intern(['a', '20', '50']), [4, 2, 5])
+    np.testing.assert_array_equal(interner.lookup(['50', 'b', '30']), [5, -1, 0])
+    assert len(interner) == 6